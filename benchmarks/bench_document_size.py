@@ -0,0 +1,47 @@
+"""
+Build each report section on its own and report the size of its word/document.xml,
+how many direct-formatting property blocks it carries and how long it took.
+
+Usage: python benchmarks/bench_document_size.py path/to/workbook.xlsm [--template basic_page_template.docx]
+"""
+import argparse
+import os
+import re
+import sys
+import zipfile
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_fetch import configure_image_cache
+from main_main import sections, build_part
+from workbook_loader import load_workbook
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'basic_page_template.docx')
+DIRECT_FORMATTING = re.compile(rb'<w:(rPr|pPr|tblBorders)>')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("excel_path")
+    parser.add_argument("--template", default=TEMPLATE)
+    args = parser.parse_args()
+
+    configure_image_cache(offline=True)  # Only cached images, so timings are not network bound
+    sheets = load_workbook(args.excel_path)
+
+    total_xml = total_time = 0
+    for name, builder, needed in sections:
+        name, data, elapsed = build_part(name, builder, {sheet: sheets[sheet] for sheet in needed}, args.template)
+        with zipfile.ZipFile(BytesIO(data)) as package:
+            xml = package.read('word/document.xml')
+        blocks = len(DIRECT_FORMATTING.findall(xml))
+        total_xml += len(xml)
+        total_time += elapsed
+        print(f"{name:<38} document.xml {len(xml):>10,} bytes  {blocks:>7,} property blocks  {elapsed:6.2f}s")
+
+    print(f"{'Total':<38} document.xml {total_xml:>10,} bytes  {'':>22}  {total_time:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark the bulk index row builder against the row-by-row python-docx loop it replaced.
+The bulk rows take their formatting from the report styles, so the two are compared by cell text.
+
+Usage: python benchmarks/bench_index_table.py --records 1000 10000 30000
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+from docx import Document
+from docx.shared import Inches, Pt
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.enum.table import WD_ROW_HEIGHT_RULE
+from lxml import etree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from category_index import get_category_index
+from index_table_builder import category_rows, append_grouped_rows
+from just_the_FP_index import add_hyperlink
+from report_styles import set_table_style
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'basic_page_template.docx')
+
+CATEGORIES = ['Seafloor', 'Land', 'Marine', 'Microseismic & Multiphysics',
+              'Processing', 'Reservoir', 'Geology', 'Data Management & Computing',
+              'Downhole']
+COLUMNS = ['Serial No', 'Publication No', 'Title', 'Assignee', 'Inventors']
+COLUMN_WIDTHS = [Inches(0.45), Inches(1.13), Inches(2.43), Inches(1.35), Inches(1.4)]
+
+
+def make_sheet(count):
+    """Synthetic 'First Publication' sheet spread over the index categories."""
+    return pd.DataFrame({
+        'Serial No': range(1, count + 1),
+        'Publication No': [f"US2024{i:07d}A1" if i % 11 else '' for i in range(count)],
+        'Title': [f"Seismic acquisition method {i}" for i in range(count)],
+        'Assignee': ['CGG'] * count,
+        'Inventors': ['Jane Doe; John Roe'] * count,
+        'Category': [CATEGORIES[i % len(CATEGORIES)] for i in range(count)],
+    })
+
+
+def add_rows_rowwise(table, df):
+    """The original per-row loop from just_the_FP_index.py."""
+    for category in CATEGORIES:
+        cat_row = table.add_row()
+        cat_row.height = Inches(0.24)
+        cat_row.height_rule = WD_ROW_HEIGHT_RULE.EXACTLY
+
+        cat_cell = cat_row.cells[0]
+        cat_cell.merge(cat_row.cells[-1])
+        cat_cell.text = f'> {category.upper()}'
+        paragraph = cat_cell.paragraphs[0]
+        paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
+        paragraph.runs[0].bold = True
+        paragraph.runs[0].font.size = Pt(10)
+
+        for _, row in get_category_index(df).rows(category).iterrows():
+            data_row = table.add_row()
+            data_row.cells[0].text = str(row.get('Serial No', ''))
+
+            pub_no = str(row.get('Publication No', ''))
+            cell = data_row.cells[1]
+            if pub_no:
+                add_hyperlink(cell.paragraphs[0], pub_no, pub_no.strip())
+            else:
+                cell.text = pub_no
+
+            data_row.cells[2].text = str(row.get('Title', ''))
+            data_row.cells[3].text = str(row.get('Assignee', ''))
+            data_row.cells[4].text = str(row.get('Inventors', ''))
+
+            for i, cell in enumerate(data_row.cells):
+                cell.width = COLUMN_WIDTHS[i]
+                for paragraph in cell.paragraphs:
+                    paragraph.space_after = Pt(0)
+                    paragraph.space_before = Pt(0)
+                    for run in paragraph.runs:
+                        run.font.size = Pt(10)
+
+
+def render(df, bulk):
+    document = Document(TEMPLATE)
+    table = document.add_table(rows=1, cols=len(COLUMNS))
+    start = time.perf_counter()
+    if bulk:
+        append_grouped_rows(table, category_rows(df, CATEGORIES, COLUMNS), COLUMN_WIDTHS,
+                            category_row_height=Inches(0.24), link_column=1, add_link=add_hyperlink)
+        set_table_style(table)
+    else:
+        add_rows_rowwise(table, df)
+    return document, time.perf_counter() - start
+
+
+def cell_texts(document):
+    return [[cell.text for cell in row.cells] for row in document.tables[0].rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, nargs="+", default=[1000, 10000])
+    args = parser.parse_args()
+
+    for count in args.records:
+        df = make_sheet(count)
+        legacy_doc, legacy_time = render(df, bulk=False)
+        bulk_doc, bulk_time = render(df, bulk=True)
+
+        legacy_xml, bulk_xml = etree.tostring(legacy_doc.element.body), etree.tostring(bulk_doc.element.body)
+        print(f"{count:>6} records: row-by-row {legacy_time:7.2f}s  bulk {bulk_time:7.2f}s  "
+              f"speedup {legacy_time / bulk_time:5.1f}x  body XML {len(legacy_xml):,} -> {len(bulk_xml):,} bytes  "
+              f"same text: {cell_texts(legacy_doc) == cell_texts(bulk_doc)}")
+
+
+if __name__ == "__main__":
+    main()
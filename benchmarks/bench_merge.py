@@ -0,0 +1,71 @@
+"""
+Merge synthetic report parts of growing size and count with both merge engines and
+report the time per thousand body paragraphs; a flat column means the merge is linear.
+
+Each part has text paragraphs, a bordered table every 25 paragraphs and a run of
+trailing blank paragraphs (the tail the merge trims before the next part).
+
+Usage: python benchmarks/bench_merge.py [--template basic_page_template.docx] [--trailing 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docx import Document
+from docx_merge import merge_packages
+from main_main import merge_documents
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'basic_page_template.docx')
+
+
+def synthetic_part(template_file, paragraphs, trailing):
+    """A part with `paragraphs` text paragraphs, a 2x2 table every 25 and `trailing` blank paragraphs."""
+    document = Document(template_file)
+    for i in range(paragraphs):
+        document.add_paragraph(f"Record {i} lorem ipsum dolor sit amet")
+        if i % 25 == 0:
+            table = document.add_table(rows=2, cols=2)
+            table.cell(0, 0).text = str(i)
+    for _ in range(trailing):
+        document.add_paragraph()
+    stream = BytesIO()
+    document.save(stream)
+    return stream.getvalue()
+
+
+def time_merge(merge, parts, output_file):
+    start = time.perf_counter()
+    merge(output_file, [BytesIO(part) for part in parts])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--template", default=TEMPLATE)
+    parser.add_argument("--trailing", type=int, default=200, help="Blank paragraphs at the end of each part")
+    args = parser.parse_args()
+
+    output_file = os.path.join(tempfile.mkdtemp(prefix='bench_merge_'), 'merged.docx')
+    scenarios = [(4, size) for size in (1000, 2000, 4000, 8000)] + [(count, 2000) for count in (2, 8, 16)]
+    cache = {}
+
+    print(f"{'parts':>5} {'paras/part':>10} {'total':>7}   {'merge_documents':>22}   {'merge_packages':>22}")
+    for count, size in scenarios:
+        if size not in cache:
+            cache[size] = synthetic_part(args.template, size, args.trailing)
+        parts = [cache[size]] * count
+        total = count * (size + args.trailing)
+        row = f"{count:>5} {size:>10} {total:>7}"
+        for merge in (merge_documents, merge_packages):
+            elapsed = time_merge(merge, parts, output_file)
+            row += f"   {elapsed:7.2f}s {elapsed / total * 1e6:8.1f} µs/para"
+        print(row, flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark the stamped record table renderer against the cell-by-cell python-docx path.
+
+Usage: python benchmarks/bench_record_table.py --records 1000 10000
+"""
+import argparse
+import os
+import sys
+import time
+from io import BytesIO
+
+import pandas as pd
+from docx import Document
+from docx.enum.table import WD_ALIGN_VERTICAL
+from docx.shared import Inches
+from lxml import etree
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from first_publications_pages_generator import create_patent_table, add_hyperlink, load_image, insert_image
+from image_resolver import get_image_resolver
+from memory_budget import release_image
+from record_stamp import RecordTableStamper
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'basic_page_template.docx')
+
+HEADERS = [
+    "Serial No", "Publication No", "Kind Code", "Title",
+    "Publication Date", "Earliest Priority Date", "Assignee",
+    "Inventors", "Category", "IPC", "Patent Link", "Abstract"
+]
+
+
+def download_and_insert_image(cell, image_url, images=None, writer=None):
+    """Inserts an image into a cell, reading prefetched bytes when available."""
+    content = load_image(image_url, images)
+    if content:
+        insert_image(cell, content, writer)
+    release_image(images, image_url)
+
+
+def create_patent_table_cellwise(document, record, headers, df_images, images=None):
+    """Create a table for a patent record cell by cell (reference for the stamped renderer)."""
+    # Create a table with 2 columns
+    table = document.add_table(rows=0, cols=2)
+    table.style = 'Table Grid'
+    
+    # Set column widths
+    table.columns[0].width = Inches(1.38)
+    table.columns[1].width = Inches(5.61)
+    
+    # Add rows for each field
+    for header in headers:
+        row_cells = table.add_row().cells
+        row_cells[0].text = header
+        row_cells[0].vertical_alignment = WD_ALIGN_VERTICAL.TOP
+        row_cells[1].text = str(record.get(header, "")) if pd.notna(record.get(header, "")) else ""
+        row_cells[1].vertical_alignment = WD_ALIGN_VERTICAL.TOP
+        
+        # Set fixed height for all fields except Abstract and Image
+        if header not in ["Abstract", "Image"]:
+            row_cells[0].height = Inches(0.28)  # Updated to 0.28 as requested
+            row_cells[1].height = Inches(0.28)  # Updated to 0.28 as requested
+    
+    # Add hyperlink for PDF Document/Patent Link
+    link_field = 'Patent Link'
+    if link_field in headers and pd.notna(record.get(link_field)):
+        pdf_para = table.rows[headers.index(link_field)].cells[1].paragraphs[0]
+        pdf_para.clear()
+        add_hyperlink(pdf_para, "Link", record[link_field])
+    
+    # Lookup and add image if available
+    image_url = get_image_resolver(df_images).resolve(record)
+
+    if image_url:
+        image_cells = table.add_row().cells
+        image_cells[0].text = "Image"
+        image_cells[0].vertical_alignment = WD_ALIGN_VERTICAL.TOP
+        download_and_insert_image(image_cells[1], image_url, images)
+    
+    return table
+
+
+def make_records(count, image_every=50):
+    """Synthetic First Publication rows; every image_every-th record has an image."""
+    records, families, urls = [], [], []
+    for i in range(count):
+        family = 100000 + i
+        records.append({
+            "Serial No": i + 1,
+            "Family number": family,
+            "Publication No": f"US2024{i:07d}A1",
+            "Kind Code": "A1",
+            "Title": f"Seismic acquisition method {i}",
+            "Publication Date": "2024-11-05 00:00:00",
+            "Earliest Priority Date": "2023-01-01 00:00:00",
+            "Assignee": "CGG",
+            "Inventors": "Jane Doe; John Roe",
+            "Category": "Marine, Processing",
+            "IPC": "G01V1/38",
+            "Patent Link": f"https://example.com/{i}.pdf" if i % 7 else float('nan'),
+            "Abstract": "A method for processing seismic data\tacquired offshore. " * 6,
+        })
+        if i % image_every == 0:
+            families.append(family)
+            urls.append(f"http://images.local/{i}.png")
+
+    png = BytesIO()
+    Image.new('RGB', (120, 80), (30, 90, 160)).save(png, format='PNG')
+    images = {url: png.getvalue() for url in urls}
+    return records, pd.DataFrame({"Family number": families, "Image": urls}), images
+
+
+def render(records, df_images, images, stamped):
+    document = Document(TEMPLATE)
+    start = time.perf_counter()
+    if stamped:
+        stamper = RecordTableStamper(document, HEADERS)
+        for record in records:
+            create_patent_table(document, record, HEADERS, df_images, images, stamper)
+    else:
+        for record in records:
+            create_patent_table_cellwise(document, record, HEADERS, df_images, images)
+    return document, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, nargs="+", default=[1000, 10000])
+    args = parser.parse_args()
+
+    for count in args.records:
+        records, df_images, images = make_records(count)
+        legacy_doc, legacy_time = render(records, df_images, images, stamped=False)
+        stamped_doc, stamped_time = render(records, df_images, images, stamped=True)
+
+        identical = etree.tostring(legacy_doc.element.body) == etree.tostring(stamped_doc.element.body)
+        print(f"{count:>6} records: cell-by-cell {legacy_time:7.2f}s  stamped {stamped_time:7.2f}s  "
+              f"speedup {legacy_time / stamped_time:4.1f}x  identical output: {identical}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Build the First Publications & Granted Patents pages in memory and through the
+streaming writer, each in a fresh process, and report time, peak RSS and output size.
+
+Usage: python benchmarks/bench_streaming.py path/to/workbook.xlsm [--template basic_page_template.docx]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TEMPLATE = os.path.join(ROOT, 'basic_page_template.docx')
+SHEETS = ["First Publication", "Granted", "Sheet1"]
+
+
+def run_mode(mode, excel_path, template_file, output_file):
+    """Child process: build one mode and print its measurements as JSON."""
+    from docx import Document
+    from first_publications_pages_generator import add_publication_detail_sections, stream_publication_detail_sections
+    from workbook_loader import load_workbook
+
+    sheets = load_workbook(excel_path, SHEETS)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    if mode == "stream":
+        stream_publication_detail_sections(sheets, template_file, output_file)
+    else:
+        document = Document(template_file)
+        add_publication_detail_sections(document, sheets)
+        document.save(output_file)
+    elapsed = time.perf_counter() - start
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux
+    print(json.dumps({"elapsed": elapsed, "baseline_kb": baseline, "peak_kb": peak, "bytes": os.path.getsize(output_file)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("excel_path")
+    parser.add_argument("--template", default=TEMPLATE)
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument("--mode", choices=["memory", "stream"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.excel_path, args.template, os.path.join(args.output_dir, f"bench_{args.mode}.docx"))
+        return
+
+    for mode in ("memory", "stream"):
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), args.excel_path, "--template", args.template,
+             "--output-dir", args.output_dir, "--mode", mode],
+            check=True, capture_output=True, text=True
+        )
+        stats = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f"{mode:<7} {stats['elapsed']:7.2f}s  peak RSS {stats['peak_kb'] / 1024:8.1f} MiB "
+              f"(+{(stats['peak_kb'] - stats['baseline_kb']) / 1024:7.1f} MiB over the loaded workbook)  "
+              f"output {stats['bytes']:>12,} bytes")
+
+
+if __name__ == "__main__":
+    main()
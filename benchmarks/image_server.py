@@ -0,0 +1,131 @@
+"""
+Local HTTP server that serves generated patent drawings with configurable latency, so
+image downloads can be benchmarked without the network.
+
+GET /img/<family>.<png|jpg|gif> returns a deterministic line drawing for that family
+number. Responses carry an ETag and answer If-None-Match with 304, like the real image
+hosts the image cache revalidates against. A share of requests can be made to fail.
+
+Usage: python benchmarks/image_server.py [--port 8765] [--latency 0.05] [--jitter 0.02]
+"""
+import argparse
+import hashlib
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+IMAGE_PATH = re.compile(r'^/img/(\d+)\.(png|jpg|gif)$')
+CONTENT_TYPES = {'png': 'image/png', 'jpg': 'image/jpeg', 'gif': 'image/gif'}
+PIL_FORMATS = {'png': 'PNG', 'jpg': 'JPEG', 'gif': 'GIF'}
+
+
+@lru_cache(maxsize=4096)
+def drawing(family, extension, size=(900, 700)):
+    """A patent-style line drawing: boxes, leaders and curves in black on white."""
+    rng = random.Random(family)
+    width, height = size
+    img = Image.new('L', size, 255)
+    draw = ImageDraw.Draw(img)
+    for _ in range(rng.randint(6, 14)):
+        x0, y0 = rng.randrange(width - 120), rng.randrange(height - 120)
+        x1, y1 = x0 + rng.randint(40, 300), y0 + rng.randint(30, 200)
+        shape = rng.choice(('rectangle', 'ellipse', 'line', 'arc'))
+        if shape == 'rectangle':
+            draw.rectangle((x0, y0, x1, y1), outline=0, width=3)
+        elif shape == 'ellipse':
+            draw.ellipse((x0, y0, x1, y1), outline=0, width=3)
+        elif shape == 'arc':
+            draw.arc((x0, y0, x1, y1), rng.randint(0, 180), rng.randint(180, 360), fill=0, width=3)
+        else:
+            draw.line((x0, y0, x1, y1), fill=0, width=2)
+        draw.text((x1 + 4, y0), str(rng.randint(10, 99)), fill=0)  # Reference numeral
+    draw.text((width // 2 - 20, height - 30), f"FIG. {family % 9 + 1}", fill=0)
+
+    buffer = BytesIO()
+    img.convert('RGB' if extension == 'jpg' else 'L').save(buffer, format=PIL_FORMATS[extension])
+    return buffer.getvalue()
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    jitter = 0.0
+    error_share = 0.0
+    size = (900, 700)
+    requests = 0
+
+    def do_GET(self):
+        ImageHandler.requests += 1
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        match = IMAGE_PATH.match(self.path.split('?')[0])
+        if not match or random.random() < self.error_share:
+            self.send_error(404)
+            return
+        family, extension = int(match.group(1)), match.group(2)
+        body = drawing(family, extension, self.size)
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPES[extension])
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # One line per image would drown the benchmark output
+
+
+class ImageServer:
+    """Run the image server on a background thread; use as a context manager."""
+
+    def __init__(self, port=0, latency=0.0, jitter=0.0, error_share=0.0, size=(900, 700)):
+        handler = type('ConfiguredImageHandler', (ImageHandler,),
+                       {'latency': latency, 'jitter': jitter, 'error_share': error_share, 'size': tuple(size)})
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random +/- seconds around the latency")
+    parser.add_argument("--error-share", type=float, default=0.0, help="Share of requests answered with 404")
+    parser.add_argument("--size", type=int, nargs=2, default=(900, 700), metavar=("WIDTH", "HEIGHT"))
+    args = parser.parse_args()
+
+    with ImageServer(args.port, args.latency, args.jitter, args.error_share, args.size) as server:
+        print(f"Serving generated images at {server.url}/img/<family>.<png|jpg|gif>  (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
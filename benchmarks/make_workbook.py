@@ -0,0 +1,166 @@
+"""
+Write a synthetic patent watch workbook (.xlsm) with the FP, Grant, First Publication,
+Granted and Sheet1 sheets the report generators read.
+
+Record counts, the category mix, the share of multi-category records, abstract lengths
+and the share of records with an image are configurable; the same seed gives the same
+workbook. Image URLs point at the benchmark image server (benchmarks/image_server.py).
+
+Usage: python benchmarks/make_workbook.py out.xlsm --records 1000 [--granted 400]
+           [--categories Land=3,Marine=2] [--abstract-words 60 250] [--image-url http://127.0.0.1:8765]
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import zipfile
+
+import pandas as pd
+
+CATEGORIES = ['Seafloor', 'Land', 'Marine', 'Microseismic & Multiphysics',
+              'Processing', 'Reservoir', 'Geology', 'Data Management & Computing',
+              'Downhole']
+ASSIGNEES = ['CGG', 'WESTERNGECO', 'PGS', 'ION', 'BGP/CNPC/PETROCHINA', 'CHEVRON',
+             'HALLIBURTON/LANDMARK', 'FFA GEOTERIC', 'PARADIGM', 'WEATHERFORD', 'BAKER HUGHES']
+SURNAMES = ['Smith', 'Wang', 'Garcia', 'Nguyen', 'Muller', 'Rossi', 'Kumar', 'Haugen',
+            'Li', 'Okafor', 'Dubois', 'Tanaka', 'Silva', 'Petrov', 'Andersen', 'Cohen']
+GIVEN = ['A.', 'B.', 'C.', 'D.', 'E.', 'F.', 'G.', 'H.', 'J.', 'K.', 'L.', 'M.']
+VOCABULARY = ('seismic data acquisition survey source receiver streamer node wavefield '
+              'inversion migration velocity model reservoir formation borehole sensor '
+              'signal processing noise attenuation multiple removal imaging subsurface '
+              'marine land ocean bottom cable vibrator airgun frequency amplitude '
+              'method system apparatus computer implemented determining estimating '
+              'generating using based plurality first second wherein comprising').split()
+FP_OFFICES = ['US', 'WO', 'EP', 'CN', 'GB']
+GRANT_OFFICES = ['US', 'EP', 'GB', 'NO', 'CN']
+
+# Excel's macro-enabled workbook part; openpyxl writes the plain .xlsx one
+XLSX_MAIN = b'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml'
+XLSM_MAIN = b'application/vnd.ms-excel.sheet.macroEnabled.main+xml'
+
+
+def parse_mix(text):
+    """'Land=3,Marine=2' -> {'Land': 3.0, 'Marine': 2.0}; an empty mix weighs every category equally."""
+    if not text:
+        return {category: 1.0 for category in CATEGORIES}
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        if name.strip() not in CATEGORIES:
+            raise ValueError(f"Unknown category {name.strip()!r}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def words(rng, count):
+    return ' '.join(rng.choice(VOCABULARY) for _ in range(count))
+
+
+def make_records(rng, count, number_column, offices, kind, first_family, mix, multi_share, abstract_words):
+    """One detail sheet: numbered, dated, categorised records with abstracts of varied length."""
+    names, weights = list(mix), list(mix.values())
+    rows = []
+    for i in range(count):
+        categories = rng.choices(names, weights)
+        if rng.random() < multi_share:
+            categories += [category for category in rng.choices(names, weights) if category not in categories]
+        office = rng.choice(offices)
+        number = f"{office}{2024000000 + first_family + i}{kind}"
+        rows.append({
+            'Serial No': i + 1,
+            'Family number': first_family + i,
+            number_column: number,
+            'Kind Code': kind,
+            'Title': words(rng, rng.randint(6, 18)).capitalize(),
+            'Publication Date': pd.Timestamp('2024-11-04') + pd.Timedelta(days=rng.randint(0, 11)),
+            'Earliest Priority Date': pd.Timestamp('2021-01-01') + pd.Timedelta(days=rng.randint(0, 1000)),
+            'Assignee': rng.choice(ASSIGNEES),
+            'Inventors': '; '.join(f"{rng.choice(SURNAMES)} {rng.choice(GIVEN)}" for _ in range(rng.randint(1, 6))),
+            'Category': ', '.join(categories),
+            'IPC': f"G01V {rng.randint(1, 13)}/{rng.randint(1, 99):02d}",
+            'Patent Link': f"https://patents.example.com/{number}",
+            'Abstract': words(rng, rng.randint(*abstract_words)).capitalize() + '.',
+        })
+    return pd.DataFrame(rows)
+
+
+def image_sheet(rng, records, number_column, image_url, image_share, formats):
+    """Sheet1 rows mapping each family to its drawing; some records have none."""
+    rows = []
+    if not image_url:
+        return rows
+    for record in records.to_dict('records'):
+        if rng.random() < image_share:
+            family = record['Family number']
+            rows.append({'Family number': family, number_column: record[number_column],
+                         'Image': f"{image_url}/img/{family}.{rng.choice(formats)}"})
+    return rows
+
+
+def write_workbook(path, records=1000, granted=None, mix=None, multi_share=0.25,
+                   abstract_words=(60, 250), image_url='http://127.0.0.1:8765',
+                   image_share=0.9, formats=('png', 'jpg'), seed=1):
+    """Write the workbook to `path` and return the number of First Publication and Granted records."""
+    rng = random.Random(seed)
+    mix = mix or parse_mix(None)
+    granted = records if granted is None else granted
+
+    df_fp = make_records(rng, records, 'Publication No', FP_OFFICES, 'A1', 100000, mix, multi_share, abstract_words)
+    df_granted = make_records(rng, granted, 'Patent No', GRANT_OFFICES, 'B1', 100000 + records, mix, multi_share, abstract_words)
+    df_images = pd.DataFrame(
+        image_sheet(rng, df_fp, 'Publication No', image_url, image_share, formats)
+        + image_sheet(rng, df_granted, 'Patent No', image_url, image_share, formats),
+        columns=['Family number', 'Publication No', 'Patent No', 'Image'],
+    )
+
+    # openpyxl only writes .xlsx; the content type is switched afterwards so Excel accepts the .xlsm name
+    handle, tmp_path = tempfile.mkstemp(suffix='.xlsx', dir=os.path.dirname(os.path.abspath(path)))
+    os.close(handle)
+    try:
+        with pd.ExcelWriter(tmp_path, engine='openpyxl') as writer:
+            df_fp.to_excel(writer, sheet_name='FP', index=False)
+            df_granted.to_excel(writer, sheet_name='Grant', index=False)
+            df_fp.to_excel(writer, sheet_name='First Publication', index=False)
+            df_granted.to_excel(writer, sheet_name='Granted', index=False)
+            df_images.to_excel(writer, sheet_name='Sheet1', index=False)
+        if path.lower().endswith('.xlsm'):
+            mark_macro_enabled(tmp_path, path)
+        else:
+            shutil.move(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return len(df_fp), len(df_granted)
+
+
+def mark_macro_enabled(source, target):
+    """Copy the package, declaring the workbook part macro-enabled."""
+    with zipfile.ZipFile(source) as src, zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as dst:
+        for item in src.infolist():
+            data = src.read(item.filename)
+            if item.filename == '[Content_Types].xml':
+                data = data.replace(XLSX_MAIN, XLSM_MAIN)
+            dst.writestr(item, data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--records", type=int, default=1000, help="First Publication records (100 to 50000)")
+    parser.add_argument("--granted", type=int, default=None, help="Granted records (default: same as --records)")
+    parser.add_argument("--categories", default=None, help="Category weights, e.g. Land=3,Marine=2 (default: uniform)")
+    parser.add_argument("--multi-share", type=float, default=0.25, help="Share of records listed under several categories")
+    parser.add_argument("--abstract-words", type=int, nargs=2, default=(60, 250), metavar=("MIN", "MAX"))
+    parser.add_argument("--image-url", default="http://127.0.0.1:8765", help="Image server base URL ('' for no images)")
+    parser.add_argument("--image-share", type=float, default=0.9, help="Share of records with an image")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    fp, granted = write_workbook(args.path, args.records, args.granted, parse_mix(args.categories), args.multi_share,
+                                 tuple(args.abstract_words), args.image_url or None, args.image_share, seed=args.seed)
+    print(f"Wrote {args.path}: {fp} first publications, {granted} granted patents")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Time the report entry points on generated workbooks against the local image server and
+write the results to JSON, so runs on different commits can be compared.
+
+Each scenario (benchmarks/scenarios.json) gives a workbook size and shape, the image
+server's latency and the entry points to time. Every run is a fresh process with empty
+workbook, image and record fragment caches (or image and fragment caches warmed by an
+untimed run, with "image_cache": "warm").
+
+Usage: python benchmarks/run_scenarios.py [--only small medium] [--output results.json]
+                                          [--compare previous.json]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from image_server import ImageServer
+from make_workbook import parse_mix, write_workbook
+
+TEMPLATE = os.path.join(ROOT, 'basic_page_template.docx')
+SCENARIOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scenarios.json')
+
+
+# ------------------------------
+# Entry Points (run in the child process)
+# ------------------------------
+
+def run_final_connection(excel_path, template_file, output_file, args):
+    from final_connection import create_final_document
+    create_final_document(excel_path, template_file, output_file)
+
+
+def run_main_main(excel_path, template_file, output_file, args):
+    import main_main
+    sys.argv = ['main_main.py', excel_path, '--template', template_file, '--output', output_file] + list(args)
+    main_main.main()
+
+
+def run_granted(excel_path, template_file, output_file, args):
+    from docx import Document
+    from granted_patents_pages_generator import create_granted_patents_document
+    from workbook_loader import load_workbook
+    sheets = load_workbook(excel_path, ['Granted', 'Sheet1'])
+    document = Document(template_file)
+    create_granted_patents_document(document, sheets['Granted'], sheets['Sheet1'], tempfile.mkdtemp(dir='.'))
+    document.save(output_file)
+
+
+def run_formatter(excel_path, template_file, output_file, args):
+    # Fails at the time of writing: create_patent_table calls methods the class does not define
+    from so_we_try import PatentDocumentFormatter
+    PatentDocumentFormatter(template_file).create_document(excel_path, output_file)
+
+
+ENTRY_POINTS = {
+    'create_final_document': run_final_connection,
+    'main_main': run_main_main,
+    'create_granted_patents_document': run_granted,
+    'PatentDocumentFormatter.create_document': run_formatter,
+}
+
+
+def run_entry(entry_point, excel_path, template_file, output_file, result_file, args):
+    """Child process: run one entry point and write its timing and peak memory to `result_file`."""
+    from memory_budget import peak_rss
+    start = time.perf_counter()
+    ENTRY_POINTS[entry_point](excel_path, template_file, output_file, args)
+    elapsed = time.perf_counter() - start
+    with open(result_file, 'w') as f:
+        json.dump({'seconds': elapsed, 'peak_rss': peak_rss()}, f)  # Of this process, not its workers
+
+
+# ------------------------------
+# Scenario Runner
+# ------------------------------
+
+def time_entry(entry_point, excel_path, work_dir, image_cache_dir, args, timeout):
+    """Run one entry point in a fresh process; returns a dict with status, seconds and output size."""
+    run_dir = tempfile.mkdtemp(dir=work_dir)
+    output_file = os.path.join(run_dir, 'out.docx')
+    result_file = os.path.join(run_dir, 'result.json')
+    env = dict(os.environ,
+               PATENT_WATCH_CACHE_DIR=os.path.join(run_dir, 'workbook_cache'),
+               PATENT_WATCH_IMAGE_CACHE_DIR=image_cache_dir or os.path.join(run_dir, 'image_cache'),
+               PATENT_WATCH_FRAGMENT_CACHE_DIR=os.path.join(image_cache_dir or run_dir, 'fragment_cache'))
+    command = [sys.executable, os.path.abspath(__file__), '--entry', entry_point, excel_path, TEMPLATE,
+               output_file, result_file, '--'] + list(args)
+
+    start = time.perf_counter()
+    try:
+        with open(os.path.join(run_dir, 'log.txt'), 'w') as log:
+            process = subprocess.run(command, cwd=run_dir, env=env, stdout=log, stderr=subprocess.STDOUT, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {'status': 'timeout', 'wall_seconds': time.perf_counter() - start}
+    wall = time.perf_counter() - start
+
+    if process.returncode != 0 or not os.path.exists(result_file):
+        with open(os.path.join(run_dir, 'log.txt'), errors='replace') as log:
+            tail = log.read().strip().splitlines()[-5:]
+        return {'status': 'failed', 'returncode': process.returncode, 'wall_seconds': wall, 'error': '\n'.join(tail)}
+    with open(result_file) as f:
+        result = json.load(f)
+    return {'status': 'ok', 'seconds': result['seconds'], 'peak_rss': result.get('peak_rss'), 'wall_seconds': wall,
+            'output_bytes': os.path.getsize(output_file) if os.path.exists(output_file) else None}
+
+
+def run_scenario(scenario, work_dir, timeout):
+    """Generate the scenario's workbook behind its own image server and time each entry point."""
+    name = scenario['name']
+    repeat = scenario.get('repeat', 1)
+    results = []
+    with ImageServer(latency=scenario.get('latency', 0.0), jitter=scenario.get('jitter', 0.0),
+                     error_share=scenario.get('error_share', 0.0)) as server:
+        excel_path = os.path.join(work_dir, f"{name}.xlsm")
+        records, granted = write_workbook(
+            excel_path, scenario.get('records', 1000), scenario.get('granted'),
+            parse_mix(scenario.get('categories')), scenario.get('multi_share', 0.25),
+            tuple(scenario.get('abstract_words', (60, 250))), server.url,
+            scenario.get('image_share', 0.9), seed=scenario.get('seed', 1))
+
+        for entry_point in scenario['entry_points']:
+            args = scenario.get('args', {}).get(entry_point, [])
+            image_cache_dir = None
+            if scenario.get('image_cache', 'cold') == 'warm':
+                image_cache_dir = tempfile.mkdtemp(dir=work_dir)
+                time_entry(entry_point, excel_path, work_dir, image_cache_dir, args, timeout)  # Untimed warm-up
+
+            runs = [time_entry(entry_point, excel_path, work_dir, image_cache_dir, args, timeout) for _ in range(repeat)]
+            ok = [run['seconds'] for run in runs if run['status'] == 'ok']
+            result = {
+                'scenario': name, 'entry_point': entry_point, 'args': args,
+                'records': records, 'granted': granted, 'latency': scenario.get('latency', 0.0),
+                'image_cache': scenario.get('image_cache', 'cold'),
+                'status': 'ok' if len(ok) == len(runs) else runs[-1]['status'],
+                'seconds': ok,
+                'median': statistics.median(ok) if ok else None,
+                'peak_rss': max((run['peak_rss'] for run in runs if run.get('peak_rss')), default=None),
+                'output_bytes': next((run['output_bytes'] for run in runs if run['status'] == 'ok'), None),
+            }
+            failed = [run for run in runs if run['status'] != 'ok']
+            if failed:
+                result['error'] = failed[-1].get('error', failed[-1]['status'])
+            results.append(result)
+            median = f"{result['median']:8.2f}s" if ok else f"{result['status']:>9}"
+            peak = f"{result['peak_rss'] / 2 ** 20:7.0f} MB" if result['peak_rss'] else ' ' * 10
+            print(f"{name:<22} {entry_point:<42} {median} {peak}  ({records} + {granted} records)", flush=True)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous_path, results):
+    """Print each result's median next to the same scenario and entry point in a previous run."""
+    with open(previous_path) as f:
+        previous = {(r['scenario'], r['entry_point']): r for r in json.load(f)['results']}
+    def seconds(value):
+        return '-' if value is None else f"{value:.2f}s"
+
+    print(f"\n{'scenario':<22} {'entry point':<42} {'before':>9} {'after':>9} {'change':>8}")
+    for result in results:
+        before = previous.get((result['scenario'], result['entry_point']), {}).get('median')
+        after = result['median']
+        change = f"{(after / before - 1) * 100:+.1f}%" if before and after else ''
+        print(f"{result['scenario']:<22} {result['entry_point']:<42} {seconds(before):>9} {seconds(after):>9} {change:>8}")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--entry':
+        entry_point, excel_path, template_file, output_file, result_file = sys.argv[2:7]
+        run_entry(entry_point, excel_path, template_file, output_file, result_file, sys.argv[8:])
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=SCENARIOS)
+    parser.add_argument("--only", nargs="+", help="Run only these scenarios")
+    parser.add_argument("--output", default=None, help="Results file (default: benchmark_<commit>_<time>.json)")
+    parser.add_argument("--compare", default=None, help="Earlier results file to compare against")
+    parser.add_argument("--timeout", type=float, default=3600, help="Seconds before a run is abandoned")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated workbooks, outputs and logs")
+    args = parser.parse_args()
+
+    with open(args.scenarios) as f:
+        scenarios = json.load(f)['scenarios']
+    if args.only:
+        unknown = set(args.only) - {scenario['name'] for scenario in scenarios}
+        if unknown:
+            parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+        scenarios = [scenario for scenario in scenarios if scenario['name'] in args.only]
+    for scenario in scenarios:
+        unknown = set(scenario['entry_points']) - set(ENTRY_POINTS)
+        if unknown:
+            parser.error(f"scenario {scenario['name']}: unknown entry points {', '.join(sorted(unknown))}")
+
+    commit = git_commit()
+    work_dir = tempfile.mkdtemp(prefix='patent_watch_bench_')
+    try:
+        results = []
+        for scenario in scenarios:
+            results += run_scenario(scenario, work_dir, args.timeout)
+    finally:
+        if args.keep:
+            print(f"Work files kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'results': results,
+    }
+    output = args.output or f"benchmark_{commit or 'unknown'}_{datetime.datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import logging
+import re
+import sys
+import weakref
+import zipfile
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from lxml import etree
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# Bookmark Registry
+# ------------------------------
+
+ANCHOR_PREFIX = 'pub_'
+MAX_BOOKMARK_NAME = 40  # Word drops bookmarks with longer names
+
+_UNSAFE_CHARACTERS = re.compile(r'\W')
+
+
+def anchor_name(number):
+    """
+    Canonical bookmark name for a publication or patent number, shared by the index
+    links and the detail-table bookmarks: 'pub_' plus the number with anything that
+    is not a letter, digit or underscore replaced, cut to Word's 40 characters.
+    Names that already carry the prefix are returned unchanged.
+    """
+    text = str(number).strip()
+    if text.startswith(ANCHOR_PREFIX):
+        text = text[len(ANCHOR_PREFIX):]
+    return (ANCHOR_PREFIX + _UNSAFE_CHARACTERS.sub('_', text))[:MAX_BOOKMARK_NAME]
+
+
+class BookmarkRegistry:
+    """Hands out unique w:id values for one document's bookmarks and refuses duplicate names."""
+
+    def __init__(self, element):
+        ids = [int(value) for value in element.xpath('.//w:bookmarkStart/@w:id') if value.isdigit()]
+        self._next_id = max(ids, default=-1) + 1
+        self.names = set(element.xpath('.//w:bookmarkStart/@w:name'))
+
+    def claim(self, name):
+        """
+        Reserve `name` (normalized with anchor_name) for a bookmark written by the caller.
+        Returns (name, w:id), or None when the name is already taken in this document.
+        """
+        name = anchor_name(name)
+        if name in self.names:
+            logger.warning(f"Bookmark {name} already exists; keeping the first one")
+            return None
+        self.names.add(name)
+        self._next_id += 1
+        return name, str(self._next_id - 1)
+
+    def add(self, p, name):
+        """
+        Bookmark the contents of a <w:p> element under `name` (normalized with anchor_name).
+        Returns the bookmark name, or None when the name is already taken in this document.
+        """
+        claimed = self.claim(name)
+        if claimed is None:
+            return None
+        name, bookmark_id = claimed
+
+        start = OxmlElement('w:bookmarkStart')
+        start.set(qn('w:id'), bookmark_id)
+        start.set(qn('w:name'), name)
+        end = OxmlElement('w:bookmarkEnd')
+        end.set(qn('w:id'), bookmark_id)
+
+        ppr = p.find(qn('w:pPr'))
+        if ppr is not None:
+            ppr.addnext(start)
+        else:
+            p.insert(0, start)
+        p.append(end)
+        return name
+
+
+_registries = {}
+
+
+def get_bookmark_registry(document):
+    """Return the bookmark registry for a document, scanning its existing bookmarks only once."""
+    element = document.element
+    key = id(element)
+    cached = _registries.get(key)
+    if cached is not None and cached[0]() is element:
+        return cached[1]
+
+    registry = BookmarkRegistry(element)
+    _registries[key] = (weakref.ref(element, lambda _: _registries.pop(key, None)), registry)
+    return registry
+
+
+# ------------------------------
+# Link Integrity
+# ------------------------------
+
+def _anchors_and_bookmarks(source):
+    """Internal-link anchors and bookmark names of a Document or a .docx path, in one pass."""
+    hyperlink, bookmark = qn('w:hyperlink'), qn('w:bookmarkStart')
+    anchors, names = [], set()
+
+    if hasattr(source, 'element'):
+        for el in source.element.body.iter(hyperlink, bookmark):
+            if el.tag == hyperlink:
+                anchors.append(el.get(qn('w:anchor')))
+            else:
+                names.add(el.get(qn('w:name')))
+        return anchors, names
+
+    with zipfile.ZipFile(source) as package, package.open('word/document.xml') as stream:
+        for _, el in etree.iterparse(stream, events=('end',), tag=(hyperlink, bookmark)):
+            if el.tag == hyperlink:
+                anchors.append(el.get(qn('w:anchor')))
+            else:
+                names.add(el.get(qn('w:name')))
+    return anchors, names
+
+
+def find_broken_links(source):
+    """Every internal hyperlink anchor with no matching w:bookmarkStart, as {anchor: link count}."""
+    anchors, names = _anchors_and_bookmarks(source)
+    broken = {}
+    for anchor in anchors:
+        if anchor is not None and anchor not in names:
+            broken[anchor] = broken.get(anchor, 0) + 1
+    return broken
+
+
+def report_broken_links(source, limit=10):
+    """Log the internal links that point at no bookmark; returns the broken anchors."""
+    with span("link check"):
+        broken = find_broken_links(source)
+    if broken:
+        sample = ', '.join(list(broken)[:limit])
+        logger.warning(f"{sum(broken.values())} internal links point at {len(broken)} missing bookmarks: {sample}")
+    else:
+        logger.info("Every internal link has a matching bookmark")
+    return broken
+
+
+# ------------------------------
+# Script Execution
+# ------------------------------
+
+if __name__ == "__main__":
+    # CI check: python bookmarks.py report.docx (exits 1 when a link has no bookmark)
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    broken = report_broken_links(sys.argv[1])
+    for anchor, count in broken.items():
+        print(f"{anchor}\t{count}")
+    sys.exit(1 if broken else 0)
@@ -0,0 +1,165 @@
+import hashlib
+import inspect
+import json
+import logging
+import os
+import sys
+import time
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# Dependency Digests
+# ------------------------------
+
+MANIFEST_NAME = 'build.json'
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sheet_digest(df):
+    """Content hash of a parsed sheet: column names, dtypes and every cell."""
+    digest = hashlib.sha256(json.dumps([[str(column), str(dtype)] for column, dtype in df.dtypes.items()]).encode())
+    try:
+        digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    except TypeError:  # Unhashable cells, e.g. lists
+        digest.update(df.to_csv().encode())
+    return digest.hexdigest()
+
+
+def _project_module(obj):
+    """The project module an object was defined in (or that it is), None for the standard library and packages."""
+    module = obj if inspect.ismodule(obj) else sys.modules.get(getattr(obj, '__module__', None) or '')
+    path = getattr(module, '__file__', None)
+    if path and os.path.dirname(os.path.abspath(path)) == PROJECT_DIR:
+        return module
+    return None
+
+
+def generator_digest(*functions):
+    """
+    Hash of the source files of the modules defining `functions`, and of every project
+    module they reach through their globals, so a change to a shared helper module
+    counts as a new generator version.
+    """
+    seen, pending = {}, [module for module in map(_project_module, functions) if module is not None]
+    while pending:
+        module = pending.pop()
+        if module.__name__ in seen:
+            continue
+        seen[module.__name__] = file_digest(module.__file__)
+        for value in vars(module).values():
+            reached = _project_module(value)
+            if reached is not None and reached.__name__ not in seen:
+                pending.append(reached)
+    return hashlib.sha256(json.dumps(sorted(seen.items())).encode()).hexdigest()
+
+
+# ------------------------------
+# Build Graph
+# ------------------------------
+
+class BuildTarget:
+    """One report part: its output file and what it depends on (sheet, template, generator and option digests)."""
+
+    def __init__(self, name, filename, sheets, template_file, generators, options=None):
+        self.name = name
+        self.filename = filename
+        self.dependencies = {f"sheet {sheet}": sheet_digest(df) for sheet, df in sheets.items()}
+        self.dependencies['template'] = file_digest(template_file)
+        self.dependencies['generator'] = generator_digest(*generators)
+        self.dependencies['options'] = hashlib.sha256(json.dumps(options or {}, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class BuildGraph:
+    """
+    Make-style bookkeeping for the multi-part build: a manifest in the build directory
+    records the dependency digests each part was last built from, so a part is rebuilt
+    only when one of them changed (or its file is missing) and reused otherwise.
+    """
+
+    def __init__(self, build_dir):
+        self.build_dir = build_dir
+        os.makedirs(build_dir, exist_ok=True)
+        self._manifest = self._load_manifest()
+        self.results = []  # (name, filename, 'rebuilt' | 'reused', reason)
+
+    def _manifest_path(self):
+        return os.path.join(self.build_dir, MANIFEST_NAME)
+
+    def _load_manifest(self):
+        try:
+            with open(self._manifest_path(), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self):
+        path = self._manifest_path()
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._manifest, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def path(self, target):
+        return os.path.join(self.build_dir, target.filename)
+
+    def reason(self, target, force=False):
+        """Why `target` must be rebuilt, or None when its last build is still current."""
+        if force:
+            return "forced"
+        entry = self._manifest.get(target.name)
+        if entry is None:
+            return "no previous build"
+        if not os.path.exists(self.path(target)):
+            return f"{target.filename} is missing"
+        changed = [name for name, digest in target.dependencies.items() if entry['dependencies'].get(name) != digest]
+        if changed:
+            return f"{', '.join(changed)} changed"
+        if entry.get('failed_images'):
+            # Built offline, past the deadline or while downloads failed: missing images
+            return f"{entry['failed_images']} images failed to download last time"
+        return None
+
+    def plan(self, targets, force=()):
+        """Split targets into those to rebuild (with the reason) and those to reuse."""
+        stale, current = [], []
+        for target in targets:
+            reason = self.reason(target, 'all' in force or target.name in force)
+            if reason is None:
+                current.append(target)
+                self.results.append((target.name, target.filename, 'reused', 'inputs unchanged'))
+            else:
+                stale.append((target, reason))
+        return stale, current
+
+    def built(self, target, reason, seconds, failed_images=0):
+        """
+        Record a finished rebuild; the manifest is saved straight away so an interrupted
+        build keeps it. A part built with failed image downloads is rebuilt next time.
+        """
+        self._manifest[target.name] = {
+            'filename': target.filename,
+            'dependencies': target.dependencies,
+            'built': time.time(),
+            'seconds': seconds,
+            'failed_images': failed_images,
+        }
+        self._write_manifest()
+        self.results.append((target.name, target.filename, 'rebuilt', reason))
+
+    def summary(self, order=None):
+        """Print one line per part: rebuilt or reused, and why."""
+        results = sorted(self.results, key=lambda result: order.index(result[0])) if order else self.results
+        rebuilt = sum(1 for result in results if result[2] == 'rebuilt')
+        print(f"Build directory {self.build_dir}: {rebuilt} of {len(results)} parts rebuilt")
+        for name, filename, status, reason in results:
+            print(f"  {status:<8} {filename:<13} {name:<38} {reason}")
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import weakref
+from instrumentation import span
+
+# ------------------------------
+# Category Index
+# ------------------------------
+
+# A 'Category' cell may hold several labels, e.g. 'Land, Processing'
+CATEGORY_SEPARATORS = r'\s*[,;|/\n]\s*'
+
+
+def split_categories(series):
+    """Parse multi-valued 'Category' cells into one lowercase label per row position."""
+    labels = (
+        pd.Series(series.to_numpy())
+        .fillna('')
+        .astype(str)
+        .str.lower()
+        .str.split(CATEGORY_SEPARATORS, regex=True)
+        .explode()
+        .str.strip()
+    )
+    return labels[labels != '']
+
+
+class CategoryIndex:
+    """Map each category label to the row positions of a sheet, built in one vectorized pass."""
+
+    def __init__(self, df, column='Category'):
+        self.df = df
+        labels = split_categories(df[column]) if column in df.columns else pd.Series(dtype=object)
+        positions = pd.Series(labels.index.to_numpy()).groupby(labels.to_numpy(), sort=False).unique()
+        self._positions = positions.to_dict()
+
+    def positions(self, category):
+        """Row positions whose labels include the category (exact, case-insensitive match)."""
+        return self._positions.get(category.strip().lower(), np.empty(0, dtype=np.int64))
+
+    def rows(self, category):
+        """Rows of the sheet that belong to the category, in sheet order."""
+        return self.df.iloc[self.positions(category)]
+
+    def column(self, category, column):
+        """One column's values for the category's rows, as a list."""
+        return self.df[column].iloc[self.positions(category)].tolist()
+
+
+_indexes = {}
+
+
+def get_category_index(df, column='Category'):
+    """Return the category index for a sheet, building it only once per DataFrame."""
+    key = (id(df), column)
+    cached = _indexes.get(key)
+    if cached is not None and cached[0]() is df and len(cached[1].df) == len(df):
+        return cached[1]
+
+    with span("category index", rows=len(df)):
+        index = CategoryIndex(df, column)
+    _indexes[key] = (weakref.ref(df, lambda _: _indexes.pop(key, None)), index)
+    return index
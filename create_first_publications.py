@@ -22,7 +22,7 @@ def resize_image(image_stream, fixed_height=4.5):
     aspect_ratio = original_width / original_height
     new_height = int(fixed_height * 1440)  # Convert inches to twips
     new_width = int(new_height * aspect_ratio)
-    resized_img = img.resize((new_width, new_height), Image.ANTIALIAS)
+    resized_img = img.resize((new_width, new_height), Image.LANCZOS)
     return resized_img, new_width, new_height
 
 def set_cell_margins(cell, top=20, start=20, bottom=20, end=20):
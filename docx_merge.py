@@ -0,0 +1,371 @@
+import hashlib
+import logging
+import os
+import posixpath
+import re
+import zipfile
+from copy import deepcopy
+from docx.opc.constants import RELATIONSHIP_TARGET_MODE as RTM
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from lxml import etree
+from streaming_docx import (
+    CONTENT_TYPES, CONTENT_TYPES_NS, DOCUMENT_PART, DOCUMENT_RELS, PACKAGE_RELS_NS, STYLES_PART,
+    media_compression, root_namespaces, serialize_element
+)
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# Package-Level DOCX Merge
+# ------------------------------
+
+R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+WP_DOC_PR = '{http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing}docPr'
+
+_BODY_START = re.compile(rb'<w:body(?:\s[^>]*)?>')
+_REL_ATTRIBUTES = etree.XPath('.//@*[namespace-uri()=$ns]')
+_CONTENT_ELEMENTS = (qn('w:t'), qn('w:drawing'), qn('w:pict'), qn('w:object'), qn('w:bookmarkStart'))
+_PAGE_BREAK = b'<w:p><w:r><w:br w:type="page"/></w:r></w:p>'  # w: is declared on <w:document>
+_SECTION_LEAD = (qn('w:headerReference'), qn('w:footerReference'), qn('w:footnotePr'), qn('w:endnotePr'))
+
+
+def _read_xml(package, name):
+    return etree.fromstring(package.read(name))
+
+
+def _rel_target(rel):
+    """Zip member name of an internal relationship target from word/document.xml."""
+    target = rel.get('Target')
+    if target.startswith('/'):
+        return target[1:]
+    return posixpath.normpath(posixpath.join('word', target))
+
+
+def _is_blank_paragraph(element):
+    """True for a paragraph with no text, picture or bookmark (what the old merge trimmed, minus anchors)."""
+    if element.tag != qn('w:p'):
+        return False
+    for child in element.iter(*_CONTENT_ELEMENTS):
+        if child.tag != qn('w:t') or (child.text or '').strip():
+            return False
+    return True
+
+
+def continuation_section(sectPr):
+    """
+    The base's sectPr for the sections after the first: each starts on a new page,
+    page numbering continues and a first-page header is not repeated.
+    """
+    sectPr = deepcopy(sectPr)
+    for el in sectPr.findall(qn('w:type')) + sectPr.findall(qn('w:titlePg')):
+        sectPr.remove(el)
+    pg_num = sectPr.find(qn('w:pgNumType'))
+    if pg_num is not None:
+        pg_num.attrib.pop(qn('w:start'), None)
+    index = 0
+    while index < len(sectPr) and sectPr[index].tag in _SECTION_LEAD:
+        index += 1
+    sectPr.insert(index, OxmlElement('w:type', {qn('w:val'): 'nextPage'}))
+    return sectPr
+
+
+def section_break(sectPr):
+    """A paragraph ending the section that `sectPr` describes (a sectPr applies to the section before it)."""
+    paragraph = OxmlElement('w:p')
+    pPr = OxmlElement('w:pPr')
+    pPr.append(deepcopy(sectPr))
+    paragraph.append(pPr)
+    return paragraph
+
+
+class PackageMerger:
+    """
+    Merges .docx parts at the OPC package level, in one pass over each part.
+
+    The first part is the base: its package is copied as-is and its document body,
+    section properties and relationships are kept. Each appended part has its
+    document.xml parsed once with lxml and spliced into the base body, which is
+    streamed straight into the output zip. Relationship IDs the body references are
+    renumbered into the base, external hyperlinks are shared per URL and media/other
+    internal parts are copied once per distinct content (SHA-256). Bookmark and
+    drawing IDs are renumbered so they stay unique, a bookmark name already used by an
+    earlier part is dropped, and styles missing from the base are copied across.
+    Headers, footers and numbering come from the base; each part's own sectPr is dropped.
+
+    Only the tail of the body is examined between parts: trailing blank paragraphs
+    are held back and discarded when another part follows, and parts are separated by
+    section breaks (not page-break runs). The break after the base keeps its sectPr
+    unchanged; later sections, including the body's final sectPr, use a next-page
+    copy without the first-page header or page number restart.
+    """
+
+    def __init__(self, output_file, base, compression=zipfile.ZIP_DEFLATED):
+        self.output_file = output_file
+        self.parts_merged = 0
+        self.bytes_written = 0
+
+        self._base = zipfile.ZipFile(base)
+        self._zip = zipfile.ZipFile(output_file, 'w', compression=compression)
+        self._sources = []  # Open part packages, read again at close() when media is copied
+
+        self._rels = _read_xml(self._base, DOCUMENT_RELS)
+        self._types = _read_xml(self._base, CONTENT_TYPES)
+        self._styles = _read_xml(self._base, STYLES_PART)
+        self._style_ids = {style.get(qn('w:styleId')) for style in self._styles.iter(qn('w:style'))}
+        self._table_style = 'TableGrid' if 'TableGrid' in self._style_ids else None
+
+        used_ids = [int(rel.get('Id')[3:]) for rel in self._rels if re.fullmatch(r'rId\d+', rel.get('Id', ''))]
+        self._next_rid = max(used_ids, default=0) + 1
+        self._names = set(self._base.namelist())
+        self._renamed = 0
+        self._hyperlinks = {}  # (type, url) -> rId
+        self._copied = {}  # sha256 -> rId of the part in the output
+        self._pending_copies = []  # (source package, member, output member)
+        self._defaults = {
+            el.get('Extension', '').lower(): el.get('ContentType')
+            for el in self._types if el.tag == f'{{{CONTENT_TYPES_NS}}}Default'
+        }
+        self._overrides = {
+            el.get('PartName'): el.get('ContentType')
+            for el in self._types if el.tag == f'{{{CONTENT_TYPES_NS}}}Override'
+        }
+
+        # Seed the hash table with the base's own body media so parts reuse it
+        for rel in self._rels:
+            if rel.get('TargetMode') != RTM.EXTERNAL and rel.get('Type') == RT.IMAGE:
+                member = _rel_target(rel)
+                if member in self._names:
+                    self._copied.setdefault(hashlib.sha256(self._base.read(member)).hexdigest(), rel.get('Id'))
+
+        self._bookmark_names = set()
+        self._bookmark_ids = 0
+        self._shape_ids = 0
+        self._held = []  # Trailing blank paragraphs, written only if no part follows
+
+        for info in self._base.infolist():
+            if info.filename not in (DOCUMENT_PART, DOCUMENT_RELS, STYLES_PART, CONTENT_TYPES):
+                self._zip.writestr(info, self._base.read(info.filename))
+
+        xml = self._base.read(DOCUMENT_PART)
+        body_start = _BODY_START.search(xml)
+        if body_start is None:
+            raise ValueError(f"Base document has no <w:body> in {DOCUMENT_PART}")
+        document = etree.fromstring(xml)
+        self._root_ns = root_namespaces(document)
+        body = document.find(qn('w:body'))
+        self._sectPr = body.find(qn('w:sectPr'))
+        self._breaks = 0
+        if self._sectPr is not None:
+            self._continuation = continuation_section(self._sectPr)
+            self._first_break = serialize_element(section_break(self._sectPr), self._root_ns)
+            self._section_break = serialize_element(section_break(self._continuation), self._root_ns)
+        else:
+            self._first_break = self._section_break = _PAGE_BREAK
+
+        self._stream = self._zip.open(DOCUMENT_PART, 'w', force_zip64=True)
+        self._write(xml[:body_start.end()])
+        self._splice(body, self._base, rel_map={})
+
+    # ------------------------------
+    # Relationships and parts
+    # ------------------------------
+
+    def _add_rel(self, reltype, target, external=False):
+        rId = f'rId{self._next_rid}'
+        self._next_rid += 1
+        rel = etree.SubElement(self._rels, f'{{{PACKAGE_RELS_NS}}}Relationship', Id=rId, Type=reltype, Target=target)
+        if external:
+            rel.set('TargetMode', RTM.EXTERNAL)
+        return rId
+
+    def _content_type(self, types, member):
+        ext = posixpath.splitext(member)[1][1:].lower()
+        for el in types:
+            if el.tag == f'{{{CONTENT_TYPES_NS}}}Override' and el.get('PartName') == f'/{member}':
+                return ext, el.get('ContentType'), True
+        for el in types:
+            if el.tag == f'{{{CONTENT_TYPES_NS}}}Default' and el.get('Extension', '').lower() == ext:
+                return ext, el.get('ContentType'), False
+        raise ValueError(f"No content type for {member}")
+
+    def _output_name(self, member):
+        folder, basename = posixpath.split(member)
+        name = member
+        while name in self._names:
+            self._renamed += 1
+            name = posixpath.join(folder, f'merged{self._renamed}_{basename}')
+        self._names.add(name)
+        return name
+
+    def _import_rel(self, package, types, rel):
+        """Return the output rId for a relationship of an appended part's document."""
+        reltype = rel.get('Type')
+        if rel.get('TargetMode') == RTM.EXTERNAL:
+            key = (reltype, rel.get('Target'))
+            if key not in self._hyperlinks:
+                self._hyperlinks[key] = self._add_rel(reltype, rel.get('Target'), external=True)
+            return self._hyperlinks[key]
+
+        member = _rel_target(rel)
+        digest = hashlib.sha256(package.read(member)).hexdigest()
+        if digest in self._copied:
+            return self._copied[digest]
+
+        try:
+            package.getinfo(f'{posixpath.dirname(member)}/_rels/{posixpath.basename(member)}.rels')
+            logger.warning(f"{member} has relationships of its own; they are not carried into the merged document")
+        except KeyError:
+            pass
+        output = self._output_name(member)
+        ext, content_type, override = self._content_type(types, member)
+        if override or self._defaults.get(ext, content_type) != content_type:
+            self._overrides[f'/{output}'] = content_type
+        else:
+            self._defaults.setdefault(ext, content_type)
+        self._pending_copies.append((package, member, output))
+        self._copied[digest] = self._add_rel(reltype, posixpath.relpath(output, 'word'))
+        return self._copied[digest]
+
+    def _merge_styles(self, package):
+        for style in _read_xml(package, STYLES_PART).iter(qn('w:style')):
+            style_id = style.get(qn('w:styleId'))
+            if style_id not in self._style_ids:
+                self._styles.append(style)
+                self._style_ids.add(style_id)
+
+    # ------------------------------
+    # Body splicing
+    # ------------------------------
+
+    def _write(self, data):
+        self._stream.write(data)
+        self.bytes_written += len(data)
+
+    def _splice(self, body, package, rel_map, rels=None, types=None):
+        """Renumber IDs in one part's body and stream its elements (all but the sectPr)."""
+        dropped = set()
+        renumbered = {}
+        for el in body.iter(qn('w:bookmarkStart'), qn('w:bookmarkEnd'), WP_DOC_PR, qn('w:tblPr')):
+            if el.tag == qn('w:bookmarkStart'):
+                name = el.get(qn('w:name'))
+                if name in self._bookmark_names:
+                    dropped.add(el.get(qn('w:id')))
+                    el.getparent().remove(el)
+                    continue
+                self._bookmark_names.add(name)
+                renumbered[el.get(qn('w:id'))] = str(self._bookmark_ids)
+                el.set(qn('w:id'), str(self._bookmark_ids))
+                self._bookmark_ids += 1
+            elif el.tag == qn('w:bookmarkEnd'):
+                old_id = el.get(qn('w:id'))
+                if old_id in dropped or old_id not in renumbered:
+                    el.getparent().remove(el)
+                else:
+                    el.set(qn('w:id'), renumbered[old_id])
+            elif el.tag == WP_DOC_PR:
+                self._shape_ids += 1
+                el.set('id', str(self._shape_ids))
+            elif self._table_style and el.find(qn('w:tblStyle')) is None:
+                # Tables the builders left unstyled get the grid, as the old merge did
+                el.insert(0, etree.Element(qn('w:tblStyle'), {qn('w:val'): self._table_style}))
+
+        if rels is not None:
+            by_id = {rel.get('Id'): rel for rel in rels}
+            for value in _REL_ATTRIBUTES(body, ns=R_NS):
+                if value not in rel_map:
+                    rel = by_id.get(value)
+                    if rel is None:
+                        logger.warning(f"Dropping dangling relationship reference {value}")
+                        value.getparent().attrib.pop(value.attrname)
+                        continue
+                    rel_map[value] = self._import_rel(package, types, rel)
+                value.getparent().set(value.attrname, rel_map[value])
+
+        elements = [el for el in body if el.tag != qn('w:sectPr')]
+        if self.parts_merged and elements:
+            # Earlier trailing blanks are dropped, then each part starts a new section
+            self._held = []
+            self._write(self._section_break if self._breaks else self._first_break)
+            self._breaks += 1
+        end = len(elements)
+        while end and _is_blank_paragraph(elements[end - 1]):
+            end -= 1  # Walks back over the k trailing blanks only
+        for el in elements[:end]:
+            self._write(serialize_element(el, self._root_ns))
+        self._held = elements[end:]
+
+    def append(self, part):
+        """Splice another .docx (path or file-like) onto the end of the merged body."""
+        package = zipfile.ZipFile(part)
+        self._sources.append(package)
+        self._merge_styles(package)
+        body = _read_xml(package, DOCUMENT_PART).find(qn('w:body'))
+        sectPr = body.find(qn('w:sectPr'))
+        if sectPr is not None:
+            body.remove(sectPr)  # Keeps its header/footer references from being imported
+        self.parts_merged += 1
+        self._splice(body, package, rel_map={}, rels=_read_xml(package, DOCUMENT_RELS),
+                     types=_read_xml(package, CONTENT_TYPES))
+
+    # ------------------------------
+    # Package completion
+    # ------------------------------
+
+    def close(self):
+        """Finish document.xml, copy the new parts, then write relationships, styles and content types."""
+        for el in self._held:
+            self._write(serialize_element(el, self._root_ns))
+        if self._sectPr is not None:
+            # The last section is a continuation once a break has ended the base's
+            final = self._continuation if self._breaks else self._sectPr
+            self._write(serialize_element(final, self._root_ns))
+        self._write(b'</w:body></w:document>')
+        self._stream.close()
+
+        for package, member, output in self._pending_copies:
+            self._zip.writestr(output, package.read(member), compress_type=media_compression(output, self._zip.compression))
+
+        for ext, content_type in self._defaults.items():
+            if not any(el.get('Extension', '').lower() == ext for el in self._types
+                       if el.tag == f'{{{CONTENT_TYPES_NS}}}Default'):
+                self._types.insert(0, etree.Element(f'{{{CONTENT_TYPES_NS}}}Default', Extension=ext, ContentType=content_type))
+        known = {el.get('PartName') for el in self._types if el.tag == f'{{{CONTENT_TYPES_NS}}}Override'}
+        for partname, content_type in self._overrides.items():
+            if partname not in known:
+                etree.SubElement(self._types, f'{{{CONTENT_TYPES_NS}}}Override', PartName=partname, ContentType=content_type)
+
+        self._zip.writestr(DOCUMENT_RELS, etree.tostring(self._rels, xml_declaration=True, encoding='UTF-8', standalone=True))
+        self._zip.writestr(STYLES_PART, etree.tostring(self._styles, xml_declaration=True, encoding='UTF-8', standalone=True))
+        self._zip.writestr(CONTENT_TYPES, etree.tostring(self._types, xml_declaration=True, encoding='UTF-8', standalone=True))
+
+        self._zip.close()
+        for package in [self._base] + self._sources:
+            package.close()
+        logger.info(f"Merged {self.parts_merged + 1} parts ({self.bytes_written} bytes of document.xml, "
+                    f"{len(self._pending_copies)} parts copied) into {self.output_file}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._stream.close()
+            self._zip.close()
+            for package in [self._base] + self._sources:
+                package.close()
+
+
+def merge_packages(output_file, parts):
+    """Merge .docx parts (paths or file-like objects) in order into output_file."""
+    with span("merge", parts=len(parts)) as timing:
+        with PackageMerger(output_file, parts[0]) as merger:
+            for part in parts[1:]:
+                merger.append(part)
+        if isinstance(output_file, (str, os.PathLike)):
+            timing.add(bytes=os.path.getsize(output_file))
+    print(f"Final document '{output_file}' created successfully!")
@@ -1,4 +1,3 @@
-import pandas as pd
 from docx import Document
 from docx.shared import Pt, Inches, RGBColor
 from docx.oxml import OxmlElement, parse_xml
@@ -7,36 +6,32 @@ from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_UNDERLINE, WD_PARAGRAPH_ALIGNM
 from docx.enum.table import WD_ALIGN_VERTICAL, WD_CELL_VERTICAL_ALIGNMENT
 from datetime import datetime
 from io import BytesIO
-import requests
+from image_fetch import get_image_bytes
 import math
+from workbook_loader import load_workbook
+from category_index import get_category_index
+from index_table_builder import category_rows, append_grouped_rows
+from report_styles import ensure_report_styles, set_table_style, REPORT_TABLE, CELL_CENTERED, TABLE_HEADER, INTERNAL_LINK
+from image_resolver import get_image_resolver
+from bookmarks import anchor_name, get_bookmark_registry
+from memory_budget import check_memory
+from fragment_cache import RecordFragments
 
 # -----------------------------
 # Helper Functions (for tables and formatting)
 # -----------------------------
 
-# Function to set table borders
+# Function to set table borders (black single borders come from the bordered table style)
 def set_table_borders(table):
-    tbl = table._tbl
-    tblPr = tbl.tblPr
-    borders = OxmlElement('w:tblBorders')
-    for border_name in ['top', 'left', 'bottom', 'right', 'insideH', 'insideV']:
-        border = OxmlElement(f'w:{border_name}')
-        border.set(qn('w:val'), 'single')
-        border.set(qn('w:sz'), '4')  # Border thickness
-        border.set(qn('w:space'), '0')
-        border.set(qn('w:color'), '000000')  # Black color for the border
-        borders.append(border)
-    tblPr.append(borders)
-
-# Function to set cell size and alignment
+    set_table_style(table, REPORT_TABLE)
+
+# Function to set cell size and vertical alignment (text is centered by its paragraph style)
 def set_cell_size_and_alignment(table, set_width=True):
     for row in table.rows:
         for cell in row.cells:
             if set_width:
                 cell.width = Inches(1.38)  # Set width if specified
             cell.vertical_alignment = WD_ALIGN_VERTICAL.CENTER
-            for paragraph in cell.paragraphs:
-                paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
     table.alignment = WD_ALIGN_PARAGRAPH.RIGHT
 
 
@@ -48,6 +43,7 @@ def add_detailed_table(document, row_data, headings):
         table.cell(i, 0).text = heading
         table.cell(i, 1).text = str(row_data.get(heading, ''))
     set_table_borders(table)
+    return table
 
 # Function to add hyperlinks to publication numbers
 def add_hyperlinked_value(cell, publication_no):
@@ -55,13 +51,11 @@ def add_hyperlinked_value(cell, publication_no):
 
     # Create hyperlink pointing to the bookmark
     hyperlink = OxmlElement('w:hyperlink')
-    hyperlink.set(qn('w:anchor'), f'pub_{publication_no}')  # Link to the bookmark
+    hyperlink.set(qn('w:anchor'), anchor_name(publication_no))  # Link to the bookmark
 
-    # Display publication number as hyperlink
+    # Display publication number as hyperlink (blue underline from the hyperlink style, set by ID)
     run = paragraph.add_run(publication_no)
-    run.font.size = Pt(10)
-    run.font.color.rgb = RGBColor(0, 0, 255)
-    run.underline = True
+    run._r.style = INTERNAL_LINK
 
     # Append hyperlink to paragraph
     hyperlink.append(run._r)
@@ -165,7 +159,7 @@ def format_date(date_str):
 # Part 2: Adding the First Two Pages (Patent Watch)
 # -----------------------------
 
-def add_first_two_pages(document, excel_path):
+def add_first_two_pages(document, sheets):
     # Add the main title
     title_paragraph = document.add_paragraph('2445_2446 - PATENT WATCH – (04-NOV-2024 to 15-NOV-2024)')
     title_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
@@ -214,14 +208,9 @@ def add_first_two_pages(document, excel_path):
 
     document.add_paragraph()  # Line break
 
-    # Load the FP and Grant worksheets
-    df_fp = pd.read_excel(excel_path, sheet_name='FP')
-    df_fp.columns = df_fp.columns.str.strip()
-    df_fp['Category'] = df_fp['Category'].astype(str).str.strip()
-
-    df_grant = pd.read_excel(excel_path, sheet_name='Grant')
-    df_grant.columns = df_grant.columns.str.strip()
-    df_grant['Category'] = df_grant['Category'].astype(str).str.strip()
+    # FP and Grant worksheets (already cleaned by the loader)
+    df_fp = sheets['FP']
+    df_grant = sheets['Grant']
 
     # Define categories
     categories = ['Seafloor', 'Land', 'Marine', 'Microseismic & Multiphysics',
@@ -261,13 +250,13 @@ def set_row_height_exact(row, height_in_inches):
 # Helper function to create the company table
 def create_company_table(document, first_row_data, second_row_data):
     table = document.add_table(rows=2, cols=6)
+    centered = document.styles[CELL_CENTERED]
 
     # First row
     for i, company in enumerate(first_row_data):
         cell = table.rows[0].cells[i]
         cell.text = company
-        cell.paragraphs[0].alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-        cell.paragraphs[0].runs[0].font.size = Pt(10)
+        cell.paragraphs[0].style = centered
 
     # Merge extra cell if fewer than 6 companies
     if len(first_row_data) < 6:
@@ -277,8 +266,7 @@ def create_company_table(document, first_row_data, second_row_data):
     for i, company in enumerate(second_row_data):
         cell = table.rows[1].cells[i]
         cell.text = company
-        cell.paragraphs[0].alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-        cell.paragraphs[0].runs[0].font.size = Pt(10)
+        cell.paragraphs[0].style = centered
 
     set_table_borders(table)
     table.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
@@ -302,8 +290,8 @@ def add_category_with_values(document, category, df_fp, df_grant):
     bullet_run.bold = True
 
     # Extract Publication No from FP and Patent No from Grant for the category
-    fp_values = df_fp[df_fp['Category'].str.lower().str.contains(category.lower())]['Publication No'].tolist()
-    grant_values = df_grant[df_grant['Category'].str.lower().str.contains(category.lower())]['Patent No'].tolist()
+    fp_values = get_category_index(df_fp).column(category, 'Publication No')
+    grant_values = get_category_index(df_grant).column(category, 'Patent No')
 
     values = fp_values + grant_values
 
@@ -312,13 +300,13 @@ def add_category_with_values(document, category, df_fp, df_grant):
         num_rows = math.ceil(len(values) / 4)
         value_table = document.add_table(rows=num_rows, cols=4)
         value_table.autofit = True
+        centered_id = document.styles[CELL_CENTERED].style_id
 
-        for idx, value in enumerate(values):
-            row_idx = idx // 4
-            col_idx = idx % 4
-            cell = value_table.rows[row_idx].cells[col_idx]
-            add_hyperlinked_value(cell, str(value))  # Add hyperlinks to publication numbers
-            cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
+        # Read each row's cells once and point the paragraphs at the centered style by ID
+        for row_idx, row in enumerate(value_table.rows):
+            for cell, value in zip(row.cells, values[row_idx * 4:row_idx * 4 + 4]):
+                cell.paragraphs[0]._p.style = centered_id
+                add_hyperlinked_value(cell, str(value))  # Add hyperlinks to publication numbers
 
         set_table_borders(value_table)
         set_cell_size_and_alignment(value_table)
@@ -333,11 +321,9 @@ def add_category_with_values(document, category, df_fp, df_grant):
 # Part 3: Adding the First Publications Section
 # -----------------------------
 
-def add_first_publications_section(document, excel_path):
-    # Load data from the 'FP' worksheet
-    df_fp = pd.read_excel(excel_path, sheet_name='FP')
-    df_fp.columns = df_fp.columns.str.strip()
-    df_fp['Category'] = df_fp['Category'].astype(str).str.strip()
+def add_first_publications_section(document, sheets):
+    # Data from the 'FP' worksheet
+    df_fp = sheets['FP']
 
     # Define categories
     categories = [
@@ -360,9 +346,8 @@ def add_first_publications_section(document, excel_path):
 
     for i, category in enumerate(categories):
         paragraph = index_row[i].paragraphs[0]
-        run = paragraph.add_run(category)
-        run.font.size = Pt(10)
-        paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        paragraph.style = CELL_CENTERED
+        paragraph.add_run(category)
 
     set_table_borders(index_table)
     # Set alignment to center
@@ -402,54 +387,20 @@ def create_fp_data_table(document, df_fp, categories):
         cell = header_row[i]
         cell.text = header
         cell.width = width
-        paragraph = cell.paragraphs[0]
-        paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        paragraph.runs[0].bold = True
-        paragraph.runs[0].font.size = Pt(10)
-
-    # Process each category and add corresponding data
-    for category in categories:
-        # Add category heading row
-        cat_row = table.add_row()
-        cat_cell = cat_row.cells[0]
-        cat_cell.merge(cat_row.cells[-1])
-        cat_cell.text = f'> {category.upper()}'
-        paragraph = cat_cell.paragraphs[0]
-        paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        paragraph.runs[0].bold = True
-        paragraph.runs[0].font.size = Pt(10)
-
-        # Filter data for the category
-        cat_data = df_fp[df_fp['Category'].str.lower().str.contains(category.lower())]
-
-        # Add rows for the data
-        for _, row in cat_data.iterrows():
-            data_row = table.add_row()
-            data_row.cells[0].text = str(row.get('Serial No', ''))
-            data_row.cells[1].text = str(row.get('Publication No', ''))
-            data_row.cells[2].text = str(row.get('Title', ''))
-            data_row.cells[3].text = str(row.get('Assignee', ''))
-            data_row.cells[4].text = str(row.get('Inventors', ''))
-
-            # Set column widths and font size for data rows
-            for i, cell in enumerate(data_row.cells):
-                cell.width = column_widths[i]
-                for paragraph in cell.paragraphs:
-                    paragraph.space_after = Pt(0)
-                    paragraph.space_before = Pt(0)
-                    for run in paragraph.runs:
-                        run.font.size = Pt(10)
+        cell.paragraphs[0].style = TABLE_HEADER  # Bold, centered, no spacing
+
+    # Category headings and data rows, built from prototypes and appended in one pass
+    rows = category_rows(df_fp, categories, ['Serial No', 'Publication No', 'Title', 'Assignee', 'Inventors'])
+    append_grouped_rows(table, rows, column_widths)
 
     set_table_borders(table)
 # -----------------------------
 # Part 4: Adding the Granted Patents Section
 # -----------------------------
 
-def add_granted_patents_section(document, excel_path):
-    # Load data from the 'Grant' worksheet
-    df_grant = pd.read_excel(excel_path, sheet_name='Grant')
-    df_grant.columns = df_grant.columns.str.strip()
-    df_grant['Category'] = df_grant['Category'].astype(str).str.strip()
+def add_granted_patents_section(document, sheets):
+    # Data from the 'Grant' worksheet
+    df_grant = sheets['Grant']
 
     # Define categories
     categories = [
@@ -481,13 +432,10 @@ def add_granted_patents_section(document, excel_path):
         tcPr = tc.get_or_add_tcPr()
         tcPr.append(OxmlElement('w:noWrap'))  # Disable noWrap to allow text wrapping
 
-        # Add the category text
+        # Add the category text, centered by the cell style
         paragraph = cell.paragraphs[0]
-        run = paragraph.add_run(category)
-        run.font.size = Pt(10)
-        
-        # Center-align the text inside the cell
-        paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        paragraph.style = CELL_CENTERED
+        paragraph.add_run(category)
 
     set_table_borders(index_table)
 
@@ -528,63 +476,39 @@ def create_granted_patents_data_table(document, df_grant, categories):
         cell = header_row[i]
         cell.text = header
         cell.width = width
-        paragraph = cell.paragraphs[0]
-        paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        paragraph.runs[0].bold = True
-        paragraph.runs[0].font.size = Pt(10)
-
-    # Process each category and add corresponding data
-    for category in categories:
-        # Add category heading row
-        cat_row = table.add_row()
-        cat_cell = cat_row.cells[0]
-        cat_cell.merge(cat_row.cells[-1])
-        cat_cell.text = f'> {category.upper()}'
-        paragraph = cat_cell.paragraphs[0]
-        paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        paragraph.runs[0].bold = True
-        paragraph.runs[0].font.size = Pt(10)
-
-        # Filter data for the category
-        cat_data = df_grant[df_grant['Category'].str.lower().str.contains(category.lower())]
-
-        # Add rows for the data
-        for _, row in cat_data.iterrows():
-            data_row = table.add_row()
-            data_row.cells[0].text = str(row.get('Serial No', ''))
-            data_row.cells[1].text = str(row.get('Patent No', ''))
-            data_row.cells[2].text = str(row.get('Title', ''))
-            data_row.cells[3].text = str(row.get('Assignee', ''))
-            data_row.cells[4].text = str(row.get('Inventors', ''))
-
-            # Set column widths and font size for data rows
-            for i, cell in enumerate(data_row.cells):
-                cell.width = column_widths[i]
-                for paragraph in cell.paragraphs:
-                    paragraph.space_after = Pt(0)
-                    paragraph.space_before = Pt(0)
-                    for run in paragraph.runs:
-                        run.font.size = Pt(10)
+        cell.paragraphs[0].style = TABLE_HEADER  # Bold, centered, no spacing
+
+    # Category headings and data rows, built from prototypes and appended in one pass
+    rows = category_rows(df_grant, categories, ['Serial No', 'Patent No', 'Title', 'Assignee', 'Inventors'])
+    append_grouped_rows(table, rows, column_widths)
 
     set_table_borders(table)
 # -----------------------------
 # Part 5: Adding Detailed Publication Records
 # -----------------------------
 
-def add_detailed_publication_records_with_bookmarks(document, excel_path):
-    df_fp = pd.read_excel(excel_path, sheet_name='FP')
-    df_grant = pd.read_excel(excel_path, sheet_name='Grant')
-    sheet1_df = pd.read_excel(excel_path, sheet_name='Sheet1')  # Load Sheet1 for images or other details
+def add_detailed_publication_records_with_bookmarks(document, sheets):
+    df_fp = sheets['FP']
+    df_grant = sheets['Grant']
+    sheet1_df = sheets['Sheet1']  # Sheet1 for images or other details
     
     headings = ['Serial No', 'Family number', 'Publication No', 'Kind Code', 'Title', 'Publication Date', 
                 'Earliest Priority Date', 'Assignee', 'Inventors', 'Category', 'IPC', 'Patent Link', 'Abstract']
 
+    # Unchanged records are replayed from the fragment cache
+    fragments = RecordFragments(document, ["Detailed publication records", headings])
+
     # Pass sheet1_df to the function
     for _, row in df_fp.iterrows():
-        add_detailed_table_with_bookmark(document, row, headings, sheet1_df)
+        add_detailed_table_with_bookmark(document, row, headings, sheet1_df, fragments)
+        check_memory("Detailed publication records")
 
     for _, row in df_grant.iterrows():
-        add_detailed_table_with_bookmark(document, row, headings, sheet1_df)
+        add_detailed_table_with_bookmark(document, row, headings, sheet1_df, fragments)
+        check_memory("Detailed publication records")
+
+    fragments.flush()
+    fragments.summary("Detailed publication records")
 
 
 # Helper function to add section headings
@@ -629,12 +553,10 @@ def process_records(df, doc, sheet1_df, headings, section_title):
 
         # Fetch image using Publication No instead of Family Number
         publication_no = row_data.get('Publication No', '')
-        if publication_no and not sheet1_df[sheet1_df['Publication No'] == publication_no].empty:
-            image_link = sheet1_df.loc[sheet1_df['Publication No'] == publication_no, 'Image'].values[0]
+        image_link = get_image_resolver(sheet1_df).resolve(row_data, keys=('Publication No',))
+        if image_link:
             try:
-                response = requests.get(image_link)
-                response.raise_for_status()
-                image_stream = BytesIO(response.content)
+                image_stream = BytesIO(get_image_bytes(image_link))  # Served from the image cache when fresh
                 p = image_cell.add_paragraph()
                 p.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
                 run = p.add_run()
@@ -644,29 +566,29 @@ def process_records(df, doc, sheet1_df, headings, section_title):
 
         image_cell.add_paragraph()  # Add space after image
         doc.add_page_break()
+        check_memory(section_title)
 
 
 
 # Helper function to add detailed records with bookmarks
-def add_detailed_table_with_bookmark(document, row_data, headings, sheet1_df):
+def add_detailed_table_with_bookmark(document, row_data, headings, sheet1_df, fragments=None):
     publication_no = str(row_data.get('Publication No', row_data.get('Patent No', '')))
-    bookmark_name = f'pub_{publication_no}'
 
-    # Add a bookmark at the start of the detailed section
+    # Replay the bookmark paragraph and table if this record was rendered before
+    key = None
+    if fragments is not None:
+        key = fragments.key([publication_no] + [str(row_data.get(heading, '')) for heading in headings])
+        if fragments.replay(key):
+            return
+
+    # Add a bookmark (with a document-unique id) just before the detailed section
     paragraph = document.add_paragraph()
-    run = paragraph.add_run()
-    bookmark_start = OxmlElement('w:bookmarkStart')
-    bookmark_start.set(qn('w:id'), '0')
-    bookmark_start.set(qn('w:name'), bookmark_name)
-    run._r.append(bookmark_start)
+    get_bookmark_registry(document).add(paragraph._p, publication_no)
 
     # Add the detailed table
-    add_detailed_table(document, row_data, headings)
-
-    # Close the bookmark after the detailed section
-    bookmark_end = OxmlElement('w:bookmarkEnd')
-    bookmark_end.set(qn('w:id'), '0')
-    run._r.append(bookmark_end)
+    table = add_detailed_table(document, row_data, headings)
+    if fragments is not None:
+        fragments.capture(key, [paragraph._p, table._tbl], bookmark=publication_no)
 
 
 # Helper to set the width of the table
@@ -700,12 +622,10 @@ def add_image_to_cell(image_title_cell, image_cell, family_number, sheet1_df, ri
     set_paragraph_font(image_title_cell.paragraphs[0])
 
     # Check if image is available for the Family number
-    if family_number and not sheet1_df[sheet1_df['Family number'] == family_number].empty:
-        image_link = sheet1_df.loc[sheet1_df['Family number'] == family_number, 'Image'].values[0]
+    image_link = get_image_resolver(sheet1_df).lookup('Family number', family_number)
+    if image_link:
         try:
-            response = requests.get(image_link)
-            response.raise_for_status()
-            image_stream = BytesIO(response.content)
+            image_stream = BytesIO(get_image_bytes(image_link))  # Served from the image cache when fresh
 
             # Add image to the cell
             p = image_cell.paragraphs[0]
@@ -723,23 +643,26 @@ def add_image_to_cell(image_title_cell, image_cell, family_number, sheet1_df, ri
 # -----------------------------
 
 def create_final_document(excel_path, template_path, output_path):
-    # Initialize the document using the provided template
-    document = Document(template_path)
+    # Initialize the document using the provided template, with the report styles registered
+    document = ensure_report_styles(Document(template_path))
+
+    # Open the workbook once and share the parsed sheets with every section
+    sheets = load_workbook(excel_path, ['FP', 'Grant', 'Sheet1'])
 
     # 1. Add the First Two Pages (Patent Watch)
-    add_first_two_pages(document, excel_path)
+    add_first_two_pages(document, sheets)
     document.add_page_break()  # Page break after the first two pages
 
     # 2. Add the First Publications Section
-    add_first_publications_section(document, excel_path)
+    add_first_publications_section(document, sheets)
     document.add_page_break()  # Page break after First Publications
 
     # 3. Add the Granted Patents Section
-    add_granted_patents_section(document, excel_path)
+    add_granted_patents_section(document, sheets)
     document.add_page_break()  # Page break after Granted Patents
 
     # 4. Add Detailed Publication Records (First Publications & Granted Patents)
-    add_detailed_publication_records_with_bookmarks(document, excel_path)
+    add_detailed_publication_records_with_bookmarks(document, sheets)
 
     # Save the final document
     document.save(output_path)
@@ -750,8 +673,9 @@ def create_final_document(excel_path, template_path, output_path):
 # Usage Example
 # -----------------------------
 
-create_final_document(
-    'C:/Users/Ayman/Documents/Abhijit_mail_attachments/Test_PW.xlsm',  # Excel file path
-    'basic_page_template.docx',                                        # Template document
-    'final_patent_watch.docx'                                          # Output document
-)
+if __name__ == "__main__":
+    create_final_document(
+        'C:/Users/Ayman/Documents/Abhijit_mail_attachments/Test_PW.xlsm',  # Excel file path
+        'basic_page_template.docx',                                        # Template document
+        'final_patent_watch.docx'                                          # Output document
+    )
@@ -1,24 +1,43 @@
+import numpy as np
 import pandas as pd
 from docx import Document
 from docx.shared import Pt, Inches
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
 from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_BREAK
-from docx.enum.table import WD_ALIGN_VERTICAL
 import sys
 import logging
-import requests
+from functools import partial
 from io import BytesIO
-from PIL import Image
+from workbook_loader import load_workbook
+from image_fetch import collect_image_urls, fetch_image, prefetch_images, get_image_dimensions, ImageWindow
+from image_resolver import get_image_resolver
+from record_stamp import RecordTableStamper, LEFT_COLUMN_WIDTH, RIGHT_COLUMN_WIDTH
+from page_packing import pack_records, ONE_PER_PAGE, PACKING_MODES
+from text_metrics import measure_table_heights, paragraph_height
+from report_styles import ensure_report_styles
+from streaming_docx import StreamingDocxWriter
+from image_processing import normalize_images, prepare_image, shutdown_image_pool
+from instrumentation import span
+from memory_budget import bounded_memory, check_memory, release_columns, release_image
+from fragment_cache import RecordFragments
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def add_hyperlink(paragraph, text, url):
-    """Add a hyperlink to a paragraph."""
-    part = paragraph.part
-    r_id = part.relate_to(url, 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/hyperlink', is_external=True)
+IMAGE_WIDTH = 2.0  # Inches; record pictures are embedded at this width
+
+# Long free-text columns nothing reads after the detail pages, released in bounded-memory mode
+DETAIL_TEXT_COLUMNS = ["Abstract", "Title", "Inventors"]
+
+def add_hyperlink(paragraph, text, url, writer=None):
+    """Add a hyperlink to a paragraph (related through the streaming writer when given)."""
+    if writer is not None:
+        r_id = writer.relate_hyperlink(url)
+    else:
+        part = paragraph.part
+        r_id = part.relate_to(url, 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/hyperlink', is_external=True)
     
     hyperlink = OxmlElement('w:hyperlink')
     hyperlink.set(qn('r:id'), r_id)
@@ -26,15 +45,10 @@ def add_hyperlink(paragraph, text, url):
     run = OxmlElement('w:r')
     rPr = OxmlElement('w:rPr')
     
-    # Add underline
-    underline = OxmlElement('w:u')
-    underline.set(qn('w:val'), 'single')
-    rPr.append(underline)
-    
-    # Add blue color
-    color = OxmlElement('w:color')
-    color.set(qn('w:val'), '0000FF')
-    rPr.append(color)
+    # Blue underline from the shared hyperlink character style
+    rStyle = OxmlElement('w:rStyle')
+    rStyle.set(qn('w:val'), 'Hyperlink')
+    rPr.append(rStyle)
     
     run.append(rPr)
     t = OxmlElement('w:t')
@@ -43,21 +57,28 @@ def add_hyperlink(paragraph, text, url):
     hyperlink.append(run)
     paragraph._element.append(hyperlink)
 
-def download_and_insert_image(cell, image_url):
-    """Downloads an image from a URL and inserts it into a cell."""
+def load_image(image_url, images=None):
+    """An image's bytes as embedded, read from the prefetched images when available; None on failure."""
     try:
-        response = requests.get(image_url, stream=True)
-        if response.status_code == 200:
-            img = Image.open(BytesIO(response.content))
-            temp_img = BytesIO()
-            img.save(temp_img, format='PNG')
-            temp_img.seek(0)
-            img_para = cell.add_paragraph()
-            img_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            run = img_para.add_run()
-            run.add_picture(temp_img, width=Inches(2))
+        content = images.get(image_url) if images is not None and image_url in images else fetch_image(image_url)
+        # Already normalized when prefetched, in which case this only reads the header
+        return prepare_image(content, IMAGE_WIDTH) if content else None
     except Exception as e:
         logger.error(f"Error downloading image: {e}")
+        return None
+
+def insert_image(cell, content, writer=None):
+    """Insert image bytes into a cell at the record picture width."""
+    try:
+        img_para = cell.add_paragraph()
+        img_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        run = img_para.add_run()
+        if writer is not None:
+            writer.add_picture(run, content, width=Inches(IMAGE_WIDTH))
+        else:
+            run.add_picture(BytesIO(content), width=Inches(IMAGE_WIDTH))
+    except Exception as e:
+        logger.error(f"Error inserting image: {e}")
 
 def add_section_header(document, title):
     """Add a section header to the document."""
@@ -74,52 +95,108 @@ def add_section_header(document, title):
     index_run = index_para.add_run("<<INDEX")
     index_run.font.size = Pt(10)
 
-def create_patent_table(document, record, headers, df_images):
-    """Create a table for a patent record."""
-    # Create a table with 2 columns
-    table = document.add_table(rows=0, cols=2)
-    table.style = 'Table Grid'
-    
-    # Set column widths
-    table.columns[0].width = Inches(1.38)
-    table.columns[1].width = Inches(5.61)
-    
-    # Add rows for each field
-    for header in headers:
-        row_cells = table.add_row().cells
-        row_cells[0].text = header
-        row_cells[0].vertical_alignment = WD_ALIGN_VERTICAL.TOP
-        row_cells[1].text = str(record.get(header, "")) if pd.notna(record.get(header, "")) else ""
-        row_cells[1].vertical_alignment = WD_ALIGN_VERTICAL.TOP
+# How each detail section packs its records onto pages (page_packing.PACKING_MODES)
+DETAIL_PACKING = {"FIRST PUBLICATIONS": ONE_PER_PAGE, "GRANTED PATENTS": ONE_PER_PAGE}
+
+def configure_detail_packing(first_publications=None, granted_patents=None):
+    """Choose the page packing of each detail section; None keeps the current mode."""
+    for title, mode in (("FIRST PUBLICATIONS", first_publications), ("GRANTED PATENTS", granted_patents)):
+        if mode is not None:
+            if mode not in PACKING_MODES:
+                raise ValueError(f"Unknown packing mode {mode!r}; expected one of {', '.join(PACKING_MODES)}")
+            DETAIL_PACKING[title] = mode
+
+def detail_packing_settings():
+    """(first_publications, granted_patents) packing modes, for handing the configuration to worker processes."""
+    return DETAIL_PACKING["FIRST PUBLICATIONS"], DETAIL_PACKING["GRANTED PATENTS"]
+
+def record_image_heights(df, df_images, images=None, width=IMAGE_WIDTH):
+    """Inserted image height (inches) per record at the 2" picture width; 0 when there is no image."""
+    resolver = get_image_resolver(df_images)
+    heights = np.zeros(len(df))
+    for position, record in enumerate(df.to_dict('records')):
+        image_url = resolver.find(record)  # Misses are reported when the table is built
+        if image_url is None:
+            continue
+        size = get_image_dimensions(image_url, images)
+        heights[position] = width * size[1] / size[0] if size and size[0] else width
+    return heights
+
+def plan_detail_pages(document, title, df, headers, df_images, images=None, leading_paragraphs=2):
+    """Measure every record table of a section and pack the records onto pages."""
+    with span("page plan", rows=len(df)):
+        section = document.sections[-1]
+        usable = (section.page_height - section.top_margin - section.bottom_margin) / 914400  # EMU -> inches
+        paragraph = paragraph_height()
+
+        # The link cell shows "Link", not the URL behind it
+        measured = df.assign(**{field: "Link" for field in ("Patent Link", "PDF Document") if field in df.columns})
+        heights = measure_table_heights(
+            measured, headers, LEFT_COLUMN_WIDTH.inches, RIGHT_COLUMN_WIDTH.inches, row_padding=0.5 / 72,
+            image_heights=record_image_heights(df, df_images, images)
+        )
+        categories = df["Category"].fillna("").astype(str).tolist() if "Category" in df.columns else None
+        # A new page carries the page-break paragraph's mark and the <<INDEX line; records
+        # sharing a page are kept apart by one empty paragraph
+        plan = pack_records(heights, usable, DETAIL_PACKING[title], categories,
+                            first_page_used=leading_paragraphs * paragraph, page_header=2 * paragraph, gap=paragraph)
+        logger.info(plan.summary(title.title()))
+        return plan
+
+def start_record_page(document, plan, position):
+    """Open a new page with its <<INDEX line, or separate the record from the one above it."""
+    if position == 0:
+        return
+    if plan.breaks[position]:
+        document.add_page_break()
         
-        # Set fixed height for all fields except Abstract and Image
-        if header not in ["Abstract", "Image"]:
-            row_cells[0].height = Inches(0.28)  # Updated to 0.28 as requested
-            row_cells[1].height = Inches(0.28)  # Updated to 0.28 as requested
+        # Add index at the top of each new page
+        index_para = document.add_paragraph()
+        index_para.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+        index_run = index_para.add_run("<<INDEX")
+        index_run.font.size = Pt(10)
+    else:
+        document.add_paragraph()  # Keeps the two tables from merging into one
+
+def create_patent_table(document, record, headers, df_images, images=None, stamper=None, writer=None, fragments=None):
+    """
+    Create a table for a patent record by stamping the compiled record layout.
+    With `fragments`, a record whose values and image are unchanged since an earlier
+    run is appended from the fragment cache instead, and None is returned.
+    """
+    stamper = stamper or RecordTableStamper(document, headers)
+    
+    # Lookup the image first, as its bytes are part of the fragment key
+    image_url = get_image_resolver(df_images).resolve(record)
+    content = load_image(image_url, images) if image_url else None
+    release_image(images, image_url)
+    
+    links = [record[stamper.link_field]] if stamper.link_row is not None and pd.notna(record.get(stamper.link_field)) else []
+    key = None
+    if fragments is not None:
+        key = fragments.key(stamper.values(record) + [stamper.bookmark(record), bool(image_url)], content)
+        if fragments.replay(key, content):
+            return None
+    
+    table = stamper.stamp(record)
     
     # Add hyperlink for PDF Document/Patent Link
-    link_field = 'Patent Link'
-    if link_field in headers and pd.notna(record.get(link_field)):
-        pdf_para = table.rows[headers.index(link_field)].cells[1].paragraphs[0]
+    if links:
+        pdf_para = stamper.link_paragraph(table)
         pdf_para.clear()
-        add_hyperlink(pdf_para, "Link", record[link_field])
+        add_hyperlink(pdf_para, "Link", links[0], writer)
     
-    # Lookup and add image if available
-    image_url = None
-    if "Family number" in record and pd.notna(record["Family number"]):
-        image_row = df_images[df_images['Family number'] == record['Family number']]
-        if not image_row.empty and 'Image' in image_row.iloc[0] and pd.notna(image_row.iloc[0]['Image']):
-            image_url = image_row.iloc[0]['Image']
-
+    # Add the image row, left empty when the image could not be downloaded
     if image_url:
-        image_cells = table.add_row().cells
-        image_cells[0].text = "Image"
-        image_cells[0].vertical_alignment = WD_ALIGN_VERTICAL.TOP
-        download_and_insert_image(image_cells[1], image_url)
+        image_cell = stamper.add_image_row(table)
+        if content:
+            insert_image(image_cell, content, writer)
     
+    if fragments is not None and (content or not image_url):
+        fragments.capture(key, [table._tbl], links, stamper.bookmark(record))
     return table
 
-def create_first_publications_section(document, df, df_images):
+def create_first_publications_section(document, df, df_images, images=None, writer=None):
     """Create the First Publications section in the document."""
     # Add section header
     add_section_header(document, "FIRST PUBLICATIONS")
@@ -131,25 +208,29 @@ def create_first_publications_section(document, df, df_images):
         "Inventors", "Category", "IPC", "Patent Link", "Abstract"
     ]
     
+    # Compile the record table layout once for the whole section (bookmarked for the FP index)
+    stamper = RecordTableStamper(document, headers, bookmark_field="Publication No")
+    
+    # Decide up front which records start a new page
+    plan = plan_detail_pages(document, "FIRST PUBLICATIONS", df, headers, df_images, images)
+    
+    # Unchanged records are replayed from the fragment cache
+    fragments = RecordFragments(document, ["FIRST PUBLICATIONS", headers, "Publication No", IMAGE_WIDTH], writer)
+    
     # Iterate over each record in the DataFrame
-    first_record = True
-    for _, row in df.iterrows():
-        # Only add page break after the first record
-        if not first_record:
-            document.add_page_break()
-            
-            # Add index at the top of each new page
-            index_para = document.add_paragraph()
-            index_para.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-            index_run = index_para.add_run("<<INDEX")
-            index_run.font.size = Pt(10)
-        
-        first_record = False
+    for position, (_, row) in enumerate(df.iterrows()):
+        start_record_page(document, plan, position)
         
         # Create table for this record
-        create_patent_table(document, row.to_dict(), headers, df_images)
+        create_patent_table(document, row.to_dict(), headers, df_images, images, stamper, writer, fragments)
+        if writer is not None:
+            writer.flush()  # Stream the record out before building the next one
+        check_memory("First Publications tables")
+    
+    fragments.flush()
+    fragments.summary("First Publications")
 
-def create_granted_patents_section(document, df_granted, df_images):
+def create_granted_patents_section(document, df_granted, df_images, images=None, writer=None):
     """Create the Granted Patents section in the document."""
     # Insert page break before granted patents section
     document.add_page_break()
@@ -164,41 +245,72 @@ def create_granted_patents_section(document, df_granted, df_images):
         "Inventors", "Category", "IPC", "Patent Link", "Abstract"
     ]
     
+    # Compile the record table layout once for the whole section (bookmarked for the GP index)
+    stamper = RecordTableStamper(document, headers, bookmark_field="Patent No")
+    
+    # Decide up front which records start a new page (after the break, heading and index)
+    plan = plan_detail_pages(document, "GRANTED PATENTS", df_granted, headers, df_images, images, leading_paragraphs=3)
+    
+    # Unchanged records are replayed from the fragment cache
+    fragments = RecordFragments(document, ["GRANTED PATENTS", headers, "Patent No", IMAGE_WIDTH], writer)
+    
     # Process each granted patent record
-    first_record = True
-    for _, row in df_granted.iterrows():
-        # Only add page break after the first record
-        if not first_record:
-            document.add_page_break()
-            
-            # Add index at the top of each new page
-            index_para = document.add_paragraph()
-            index_para.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-            index_run = index_para.add_run("<<INDEX")
-            index_run.font.size = Pt(10)
-        
-        first_record = False
+    for position, (_, row) in enumerate(df_granted.iterrows()):
+        start_record_page(document, plan, position)
         
         # Create table for this record
-        create_patent_table(document, row.to_dict(), headers, df_images)
+        create_patent_table(document, row.to_dict(), headers, df_images, images, stamper, writer, fragments)
+        if writer is not None:
+            writer.flush()  # Stream the record out before building the next one
+        check_memory("Granted Patents tables")
+    
+    fragments.flush()
+    fragments.summary("Granted Patents")
+
+def add_publication_detail_sections(document, sheets, writer=None):
+    """Append the First Publications and Granted Patents detail pages to a document."""
+    ensure_report_styles(document)
+    df_images = sheets["Sheet1"]
+    df_fp, df_granted = sheets["First Publication"], sheets["Granted"]
+    urls = collect_image_urls(df_images, df_fp) + collect_image_urls(df_images, df_granted)
+
+    if writer is None:
+        # Download every image up front and shrink it to its embedded size in the process pool
+        images = normalize_images(prefetch_images(urls), IMAGE_WIDTH)
+    else:
+        # Streaming keeps memory bounded, so only a window of images is held at a time
+        images = ImageWindow(urls, window=16 if bounded_memory() else 64,
+                             transform=partial(normalize_images, width_in=IMAGE_WIDTH))
+
+    try:
+        with span("First Publications tables", tables=len(df_fp)):
+            create_first_publications_section(document, df_fp, df_images, images, writer)
+        release_columns(df_fp, DETAIL_TEXT_COLUMNS)
+        with span("Granted Patents tables", tables=len(df_granted)):
+            create_granted_patents_section(document, df_granted, df_images, images, writer)
+        release_columns(df_granted, DETAIL_TEXT_COLUMNS)
+    finally:
+        # A report-part worker would otherwise wait on the pool's processes when it exits
+        shutdown_image_pool()
+    get_image_resolver(df_images).report_missing()
+
+def stream_publication_detail_sections(sheets, template_file, output_file):
+    """Write the detail pages straight to a .docx, holding one record in memory at a time."""
+    with StreamingDocxWriter(template_file, output_file) as writer:
+        add_publication_detail_sections(writer.document, sheets, writer)
 
 def main():
     try:
         # Load Excel sheets
         excel_path = sys.argv[1] if len(sys.argv) > 1 else r'C:\Users\Ayman\Documents\Abhijit_mail_attachments\Test_PW.xlsm'
-        df_fp = pd.read_excel(excel_path, sheet_name="First Publication")
-        df_granted = pd.read_excel(excel_path, sheet_name="Granted")
-        df_images = pd.read_excel(excel_path, sheet_name="Sheet1")
+        sheets = load_workbook(excel_path, ["First Publication", "Granted", "Sheet1"])
         
         # Load the template document
         template_file = "basic_page_template.docx"
         document = Document(template_file)
         
-        # Create the First Publications section
-        create_first_publications_section(document, df_fp, df_images)
-        
-        # Create the Granted Patents section
-        create_granted_patents_section(document, df_granted, df_images)
+        # Create the First Publications and Granted Patents sections
+        add_publication_detail_sections(document, sheets)
         
         # Save the final document
         output_path = "part_4.docx"
@@ -0,0 +1,281 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from io import BytesIO
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml import parse_xml
+from docx.oxml.ns import qn
+from lxml import etree
+from bookmarks import get_bookmark_registry
+from streaming_docx import root_namespaces, serialize_element
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# Cache Settings
+# ------------------------------
+
+DEFAULT_CACHE_DIR = os.environ.get('PATENT_WATCH_FRAGMENT_CACHE_DIR', '.fragment_cache')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 256 MB of serialized XML
+DATABASE_NAME = 'fragments.sqlite'
+
+# Bump whenever record rendering changes, so fragments from older code are not replayed
+RENDERER_VERSION = 1
+
+# Placeholders standing in for the document-specific IDs inside a cached fragment
+LINK_ID = '@link{}@'
+IMAGE_ID = '@image@'
+SHAPE_ID = '@shape@'
+BOOKMARK_ID = '@bookmark@'
+
+_BOOKMARK_TAGS = re.compile(rb'<w:bookmark(?:Start|End) [^>]*/>')
+
+
+class FragmentStore:
+    """
+    Rendered record fragments on disk, keyed by a hash of everything that shaped them.
+    One SQLite file holds the serialized XML; the least recently used entries are
+    evicted past `max_bytes`. Writes are batched until flush().
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.pid = os.getpid()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(cache_dir, DATABASE_NAME))
+        self._db.execute('CREATE TABLE IF NOT EXISTS fragments '
+                         '(key TEXT PRIMARY KEY, xml BLOB NOT NULL, meta TEXT NOT NULL, used REAL NOT NULL)')
+        self._pending = []
+        self._used = set()
+
+    def get(self, key):
+        """(xml bytes, metadata dict) for a key, or None."""
+        row = self._db.execute('SELECT xml, meta FROM fragments WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        self._used.add(key)
+        return row[0], json.loads(row[1])
+
+    def put(self, key, xml, meta):
+        self._pending.append((key, xml, json.dumps(meta), time.time()))
+        if len(self._pending) >= 1000:
+            self.flush()
+
+    def flush(self):
+        """Write pending fragments, mark the ones read as used and evict past the size limit."""
+        if not self._pending and not self._used:
+            return
+        now = time.time()
+        with self._db:
+            self._db.executemany('INSERT OR REPLACE INTO fragments VALUES (?, ?, ?, ?)', self._pending)
+            self._db.executemany('UPDATE fragments SET used = ? WHERE key = ?', ((now, key) for key in self._used))
+            self._evict()
+        self._pending, self._used = [], set()
+
+    def _evict(self):
+        total = self._db.execute('SELECT COALESCE(SUM(LENGTH(xml)), 0) FROM fragments').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale = []
+        for key, size in self._db.execute('SELECT key, LENGTH(xml) FROM fragments ORDER BY used'):
+            if total <= self.max_bytes * 0.9:
+                break
+            stale.append((key,))
+            total -= size
+        self._db.executemany('DELETE FROM fragments WHERE key = ?', stale)
+        logger.info(f"Evicted {len(stale)} record fragments from {self.cache_dir}")
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+
+_fragment_store = None
+_fragment_cache_enabled = True
+
+
+def configure_fragment_cache(enabled=True, **store_options):
+    """Enable, disable or relocate the shared record fragment cache."""
+    global _fragment_store, _fragment_cache_enabled
+    if _fragment_store is not None and _fragment_store.pid == os.getpid():
+        _fragment_store.close()
+    _fragment_cache_enabled = enabled
+    _fragment_store = FragmentStore(**store_options) if enabled else None
+    return _fragment_store
+
+
+def fragment_cache_settings():
+    """(enabled, store options), for handing the configuration to worker processes."""
+    if _fragment_store is None:
+        return _fragment_cache_enabled, {}
+    return _fragment_cache_enabled, {'cache_dir': _fragment_store.cache_dir, 'max_bytes': _fragment_store.max_bytes}
+
+
+def get_fragment_store():
+    """Return the shared fragment store, opening it on first use in each process (None when disabled)."""
+    global _fragment_store
+    if not _fragment_cache_enabled:
+        return None
+    if _fragment_store is None or _fragment_store.pid != os.getpid():
+        # A connection inherited from a forking parent must not be used
+        store_options = {'cache_dir': _fragment_store.cache_dir, 'max_bytes': _fragment_store.max_bytes} if _fragment_store else {}
+        _fragment_store = FragmentStore(**store_options)
+        atexit.register(_fragment_store.flush)
+    return _fragment_store
+
+
+def template_version(document):
+    """Hash of what a template contributes to rendered records: root namespaces, styles and page setup."""
+    digest = hashlib.sha256(json.dumps(sorted((k or '', v) for k, v in document.element.nsmap.items())).encode())
+    digest.update(etree.tostring(document.styles.element))
+    sectPr = document.element.body.sectPr
+    if sectPr is not None:
+        digest.update(etree.tostring(sectPr))
+    return digest.hexdigest()
+
+
+# ------------------------------
+# Record Fragments
+# ------------------------------
+
+class RecordFragments:
+    """
+    Replays rendered record fragments (the body elements of one record) from the fragment
+    store when the record is unchanged since an earlier run.
+
+    A record's key hashes the renderer version, the template, the section's `scope` (its
+    headers and anything else fixed for the section), the record's rendered values and
+    its image bytes. Cached XML carries placeholders for the hyperlink and image
+    relationship IDs, the drawing ID and the bookmark ID; replay() relates the links and
+    image in the target package (python-docx document or streaming writer) and fills them in.
+    """
+
+    def __init__(self, document, scope, writer=None, store=None):
+        self.document = document
+        self.writer = writer
+        self.store = store if store is not None else get_fragment_store()
+        self.reused = 0
+        self.rendered = 0
+        self._root_ns = root_namespaces(document.element)
+        if self.store is not None:
+            self._prefix = hashlib.sha256(
+                json.dumps([RENDERER_VERSION, template_version(document), scope], default=str).encode()
+            ).digest()
+
+    def key(self, values, image=None):
+        """Cache key for one record's rendered values and image bytes; None when caching is off."""
+        if self.store is None:
+            return None
+        digest = hashlib.sha256(self._prefix)
+        digest.update(json.dumps(values, default=str).encode())
+        if image:
+            digest.update(hashlib.sha256(image).digest())
+        return digest.hexdigest()
+
+    def replay(self, key, image=None):
+        """Append the fragment cached under `key` to the document; False when there is none."""
+        if key is None:
+            return False
+        cached = self.store.get(key)
+        if cached is None or (cached[1].get('image') and not image):
+            return False
+        xml, meta = cached
+
+        for i, url in enumerate(meta['links']):
+            xml = xml.replace(LINK_ID.format(i).encode(), self._relate_hyperlink(url).encode())
+        if meta.get('image'):
+            xml = xml.replace(IMAGE_ID.encode(), self._relate_image(image).encode())
+            xml = xml.replace(SHAPE_ID.encode(), str(self._next_shape_id()).encode())
+        if meta.get('bookmark'):
+            claimed = get_bookmark_registry(self.document).claim(meta['bookmark'])
+            if claimed is None:
+                xml = _BOOKMARK_TAGS.sub(b'', xml)  # Taken by an earlier record in this document
+            else:
+                xml = xml.replace(BOOKMARK_ID.encode(), claimed[1].encode())
+
+        if self.writer is not None:
+            self.writer.write_fragment(xml)
+        else:
+            self._insert(xml)
+        self.reused += 1
+        return True
+
+    def capture(self, key, elements, links=(), bookmark=None):
+        """
+        Store the body elements just rendered for a record under `key`. `links` are the
+        URLs of its external hyperlinks in document order; `bookmark` is the number it
+        should be bookmarked under, if any. Records whose bookmark was refused as a
+        duplicate are not stored, as that depends on the other records.
+        """
+        self.rendered += 1
+        if key is None:
+            return
+        hyperlinks = [el for element in elements for el in element.iter(qn('w:hyperlink')) if el.get(qn('r:id'))]
+        blips = [el for element in elements for el in element.iter(qn('a:blip'))]
+        doc_prs = [el for element in elements for el in element.iter(qn('wp:docPr'))]
+        bookmarks = [el for element in elements for el in element.iter(qn('w:bookmarkStart'), qn('w:bookmarkEnd'))]
+        names = [el.get(qn('w:name')) for el in bookmarks if el.tag == qn('w:bookmarkStart')]
+        if len(hyperlinks) != len(links) or len(blips) > 1 or len(names) > 1 or (bookmark is not None and not names):
+            return
+
+        # Swap the IDs for placeholders while serializing, then put them back
+        swaps = [(el, qn('r:id'), LINK_ID.format(i)) for i, el in enumerate(hyperlinks)]
+        swaps += [(el, qn('r:embed'), IMAGE_ID) for el in blips]
+        swaps += [(el, attr, value) for el in doc_prs for attr, value in (('id', SHAPE_ID), ('name', f'Picture {SHAPE_ID}'))]
+        swaps += [(el, qn('w:id'), BOOKMARK_ID) for el in bookmarks]
+        saved = [(el, attr, el.get(attr)) for el, attr, _ in swaps]
+        for el, attr, placeholder in swaps:
+            el.set(attr, placeholder)
+        try:
+            xml = b''.join(serialize_element(element, self._root_ns) for element in elements)
+        finally:
+            for el, attr, value in saved:
+                el.set(attr, value)
+
+        self.store.put(key, xml, {'links': list(links), 'image': bool(blips), 'bookmark': names[0] if names else None})
+
+    def flush(self):
+        if self.store is not None:
+            self.store.flush()
+
+    def summary(self, label):
+        if self.store is not None:
+            logger.info(f"{label}: {self.reused} record tables reused from the fragment cache, {self.rendered} rendered")
+
+    # ------------------------------
+    # Target package
+    # ------------------------------
+
+    def _relate_hyperlink(self, url):
+        if self.writer is not None:
+            return self.writer.relate_hyperlink(url)
+        return self.document.part.relate_to(url, RT.HYPERLINK, is_external=True)
+
+    def _relate_image(self, image):
+        if self.writer is not None:
+            return self.writer.relate_image(image)[0]
+        return self.document.part.get_or_add_image(BytesIO(image))[0]
+
+    def _next_shape_id(self):
+        if self.writer is not None:
+            return self.writer.next_shape_id()
+        return self.document.part.next_id
+
+    def _insert(self, xml):
+        declarations = b''.join(
+            b' xmlns' + (b':' + prefix if prefix else b'') + b'="' + uri + b'"' for prefix, uri in self._root_ns.items()
+        )
+        wrapper = parse_xml(b'<w:body' + declarations + b'>' + xml + b'</w:body>')
+        body = self.document.element.body
+        sectPr = body.sectPr
+        for element in list(wrapper):
+            if sectPr is not None:
+                sectPr.addprevious(element)
+            else:
+                body.append(element)
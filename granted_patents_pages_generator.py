@@ -8,16 +8,35 @@ from docx.enum.table import WD_ALIGN_VERTICAL
 from docx.oxml.shared import OxmlElement
 import sys
 import logging
-import requests
-from io import BytesIO
 from PIL import Image
 import os
 import datetime
+from workbook_loader import load_workbook
+from image_fetch import collect_image_urls, fetch_image, prefetch_images, get_image_dimensions
+from image_probe import probe_image, probe_path
+from image_processing import normalize_images, prepare_image
+from image_resolver import get_image_resolver
+from memory_budget import check_memory, release_columns, release_image
+from first_publications_pages_generator import DETAIL_TEXT_COLUMNS
+from report_styles import ensure_report_styles
+from text_metrics import measure_table_heights, fitted_image_height
+import numpy as np
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Record table layout (inches): column widths, image cap and the 0.5pt row border
+LABEL_WIDTH = 1.38
+VALUE_WIDTH = 5.61
+IMAGE_MAX_HEIGHT = 3.0
+ROW_BORDER = 0.5 / 72
+
+GRANTED_FIELDS = [
+    "Serial No", "Family number", "Patent No", "Kind Code", "Title", "Publication Date",
+    "Earliest Priority", "Assignee", "Inventors", "Category", "IPC", "Patent Link", "Abstract"
+]
+
 class PageTracker:
     """Enhanced page tracking with element measurement"""
     def __init__(self, document):
@@ -45,14 +64,32 @@ class PageTracker:
         header_para.runs[0].font.size = Pt(10)
         self.current_page_height = self.header_height
 
-def estimate_table_height(table_data, has_image):
-    """Calculate approximate table height in inches"""
-    base_height = len(table_data) * 0.28  # Regular rows
-    abstract_text = next((v for (k, v) in table_data if k == "Abstract"), "")
-    abstract_lines = max(1, len(str(abstract_text)) // 100)  # 100 chars/line
-    abstract_height = abstract_lines * 0.2
-    image_height = 3.0 if has_image else 0.0  # Max image height
-    return base_height + abstract_height + image_height + 0.2  # Padding
+def measured_values(df):
+    """Cell texts as rendered: the Patent Link cell shows 'Link', not the URL"""
+    if "Patent Link" not in df.columns:
+        return df
+    return df.assign(**{"Patent Link": np.where(df["Patent Link"].notna(), "Link", "")})
+
+def estimate_table_height(table_data, has_image, image_height=IMAGE_MAX_HEIGHT):
+    """Table height in inches, wrapping each cell with font metrics at its real width"""
+    record = measured_values(pd.DataFrame([dict(table_data)]))
+    return measure_table_heights(record, [k for k, _ in table_data], LABEL_WIDTH, VALUE_WIDTH,
+                                 row_padding=ROW_BORDER, image_heights=[image_height if has_image else 0.0])[0]
+
+def measure_record_heights(df_granted, df_images, images=None):
+    """Every record's table height, measured column by column before rendering"""
+    resolver = get_image_resolver(df_images)
+    image_heights = np.zeros(len(df_granted))
+    for position, record in enumerate(df_granted.to_dict('records')):
+        image_url = resolver.find(record)  # Misses are reported when the table is built
+        if image_url is None:
+            continue
+        # Real aspect ratio from the cache metadata or image header; unknown images keep the old 3" allowance
+        size = get_image_dimensions(image_url, images)
+        image_heights[position] = fitted_image_height(size, VALUE_WIDTH, IMAGE_MAX_HEIGHT)
+
+    return measure_table_heights(measured_values(df_granted), GRANTED_FIELDS, LABEL_WIDTH, VALUE_WIDTH,
+                                 row_padding=ROW_BORDER, image_heights=image_heights)
 
 def add_hyperlink(paragraph, text, url):
     """Add a hyperlink to a paragraph."""
@@ -65,13 +102,10 @@ def add_hyperlink(paragraph, text, url):
     run = OxmlElement('w:r')
     rPr = OxmlElement('w:rPr')
     
-    underline = OxmlElement('w:u')
-    underline.set(qn('w:val'), 'single')
-    rPr.append(underline)
-    
-    color = OxmlElement('w:color')
-    color.set(qn('w:val'), '0000FF')
-    rPr.append(color)
+    # Blue underline from the shared hyperlink character style
+    rStyle = OxmlElement('w:rStyle')
+    rStyle.set(qn('w:val'), 'Hyperlink')
+    rPr.append(rStyle)
     
     run.append(rPr)
     t = OxmlElement('w:t')
@@ -80,17 +114,22 @@ def add_hyperlink(paragraph, text, url):
     hyperlink.append(run)
     paragraph._element.append(hyperlink)
 
-def download_image(image_url, folder_path, family_number):
-    """Download and save image."""
+def download_image(image_url, folder_path, family_number, images=None):
+    """Save image, reading prefetched bytes when available."""
     try:
-        response = requests.get(image_url, stream=True)
-        response.raise_for_status()
+        content = images.get(image_url) if images is not None and image_url in images else fetch_image(image_url)
+        if not content:
+            return None
         
-        filename = f"patent_{family_number}.png"
-        img_path = os.path.join(folder_path, filename)
+        content = prepare_image(content, VALUE_WIDTH, IMAGE_MAX_HEIGHT)
+        probed = probe_image(content)
+        extension = {'PNG': 'png', 'JPEG': 'jpg', 'GIF': 'gif'}[probed[0]] if probed else 'img'
         
-        img = Image.open(BytesIO(response.content))
-        img.save(img_path, format='PNG')
+        # Written as embedded, in the format normalization kept
+        filename = f"patent_{family_number}.{extension}"
+        img_path = os.path.join(folder_path, filename)
+        with open(img_path, 'wb') as f:
+            f.write(content)
         return img_path
     except Exception as e:
         logger.error(f"Failed to download image: {e}")
@@ -99,17 +138,18 @@ def download_image(image_url, folder_path, family_number):
 def insert_image(cell, img_path):
     """Insert image into cell maintaining aspect ratio."""
     try:
-        img = Image.open(img_path)
-        aspect_ratio = img.height / img.width
-        
-        # Target width is cell width (5.61 inches)
-        target_width = 5.61
-        target_height = target_width * aspect_ratio
+        # The header gives the size; only formats it cannot read are opened with PIL
+        probed = probe_path(img_path)
+        if probed:
+            size = probed[1:]
+        else:
+            with Image.open(img_path) as img:
+                size = img.size
+        aspect_ratio = size[1] / size[0]
         
-        # If height exceeds 3 inches, scale down
-        if target_height > 3:
-            target_height = 3
-            target_width = target_height / aspect_ratio
+        # Target width is cell width (5.61 inches), scaled down if taller than 3 inches
+        target_height = fitted_image_height(size, VALUE_WIDTH, IMAGE_MAX_HEIGHT)
+        target_width = target_height / aspect_ratio
         
         paragraph = cell.add_paragraph()
         paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
@@ -122,33 +162,18 @@ def insert_image(cell, img_path):
         logger.error(f"Error inserting image: {e}")
         return False
 
-def create_patent_table(document, record, df_images, folder_path, page_tracker):
+def create_patent_table(document, record, df_images, folder_path, page_tracker, images=None, required_height=None):
     """Create table with proactive page management"""
     # Define table data
-    table_data = [
-        ("Serial No", record.get('Serial No', "")),
-        ("Family number", record.get('Family number', "")),
-        ("Patent No", record.get('Patent No', "")),
-        ("Kind Code", record.get('Kind Code', "")),
-        ("Title", record.get('Title', "")),
-        ("Publication Date", record.get('Publication Date', "")),
-        ("Earliest Priority", record.get('Earliest Priority', "")),
-        ("Assignee", record.get('Assignee', "")),
-        ("Inventors", record.get('Inventors', "")),
-        ("Category", record.get('Category', "")),
-        ("IPC", record.get('IPC', "")),
-        ("Patent Link", record.get('Patent Link', "")),
-        ("Abstract", record.get('Abstract', ""))
-    ]
+    table_data = [(field, record.get(field, "")) for field in GRANTED_FIELDS]
     
     # Check if record has image
-    has_image = False
-    if pd.notna(record.get("Family number")):
-        image_row = df_images[df_images['Family number'] == record['Family number']]
-        has_image = not image_row.empty and pd.notna(image_row.iloc[0].get('Image'))
+    image_url = get_image_resolver(df_images).resolve(record)
+    has_image = image_url is not None
     
-    # Calculate required space
-    required_height = estimate_table_height(table_data, has_image)
+    # Calculate required space (precomputed for the whole sheet by measure_record_heights)
+    if required_height is None:
+        required_height = estimate_table_height(table_data, has_image)
     
     # Check space and add page break if needed
     if not page_tracker.check_space(required_height):
@@ -175,7 +200,8 @@ def create_patent_table(document, record, df_images, folder_path, page_tracker):
     
     # Handle image if exists
     if has_image:
-        img_path = download_image(image_row.iloc[0]['Image'], folder_path, record['Family number'])
+        img_path = download_image(image_url, folder_path, record['Family number'], images)
+        release_image(images, image_url)  # Read back from the saved file from here on
         if img_path:
             image_cells = table.add_row().cells
             image_cells[0].text = "Image"
@@ -186,10 +212,15 @@ def create_patent_table(document, record, df_images, folder_path, page_tracker):
     page_tracker.current_page_height += required_height
     return table
 
-def create_granted_patents_document(document, df_granted, df_images, folder_path):
+def create_granted_patents_document(document, df_granted, df_images, folder_path, images=None):
     """Main document creation flow with proper page tracking"""
+    ensure_report_styles(document)
     page_tracker = PageTracker(document)
     
+    # Download all images concurrently before any table is built
+    if images is None:
+        images = normalize_images(prefetch_images(collect_image_urls(df_images, df_granted)), VALUE_WIDTH, IMAGE_MAX_HEIGHT)
+    
     # Add heading
     heading = document.add_paragraph("GRANTED PATENTS")
     heading.alignment = WD_ALIGN_PARAGRAPH.CENTER
@@ -208,18 +239,26 @@ def create_granted_patents_document(document, df_granted, df_images, folder_path
     index.paragraph_format.space_after = Pt(0)
     page_tracker.current_page_height += page_tracker.header_height
     
+    # Measure every table up front so each page decision is a lookup
+    heights = measure_record_heights(df_granted, df_images, images)
+    
     # Process each record
-    for idx, row in df_granted.iterrows():
+    for position, (idx, row) in enumerate(df_granted.iterrows()):
         if idx > 0 and not page_tracker.check_space(0.3):  # Check space for new record
             page_tracker.add_page_break()
         
-        create_patent_table(document, row.to_dict(), df_images, folder_path, page_tracker)
+        create_patent_table(document, row.to_dict(), df_images, folder_path, page_tracker, images, heights[position])
+        check_memory("Granted Patents tables")
+    
+    release_columns(df_granted, DETAIL_TEXT_COLUMNS)
+    get_image_resolver(df_images).report_missing()
 
 def main():
     try:
         excel_path = sys.argv[1] if len(sys.argv) > 1 else r'C:\Users\Ayman\Documents\Abhijit_mail_attachments\Test_PW.xlsm'
-        df_granted = pd.read_excel(excel_path, sheet_name="Granted")
-        df_images = pd.read_excel(excel_path, sheet_name="Sheet1")
+        sheets = load_workbook(excel_path, ["Granted", "Sheet1"])
+        df_granted = sheets["Granted"]
+        df_images = sheets["Sheet1"]
         
         document = Document("basic_page_template.docx")
         
@@ -0,0 +1,188 @@
+import logging
+import threading
+import time
+import requests
+from collections import defaultdict
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# Client Settings
+# ------------------------------
+
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5  # 0.5s, 1s, 2s ... between retries
+DEFAULT_BACKOFF_MAX = 10
+DEFAULT_PER_HOST_LIMIT = 4
+DEFAULT_FAILURE_THRESHOLD = 5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class HostUnavailableError(Exception):
+    """Raised when a host has failed too many times in a row and is no longer fetched."""
+
+
+class DeadlineExceededError(Exception):
+    """Raised when the run's global fetch deadline has passed."""
+
+
+class FetchClient:
+    """
+    Shared HTTP client for image downloads.
+    Pools keep-alive connections per host, applies connect/read timeouts and bounded
+    exponential-backoff retries, caps concurrent requests per host, stops fetching hosts
+    that keep failing and enforces an overall deadline.
+    """
+
+    def __init__(self, connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 retries=DEFAULT_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR,
+                 per_host_limit=DEFAULT_PER_HOST_LIMIT, failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+                 deadline=None):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.per_host_limit = per_host_limit
+        self.failure_threshold = failure_threshold
+        self.deadline = time.monotonic() + deadline if deadline is not None else None
+
+        # Retries are done in get(), so the deadline is checked before every attempt and wait
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=per_host_limit)
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._lock = threading.Lock()
+        self._host_slots = defaultdict(lambda: threading.BoundedSemaphore(self.per_host_limit))
+        self._host_failures = defaultdict(int)
+
+    def _remaining(self):
+        if self.deadline is None:
+            return None
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceededError("Global fetch deadline exceeded")
+        return remaining
+
+    def settings(self):
+        """Constructor options reproducing this client, with the time left until its deadline."""
+        remaining = None if self.deadline is None else max(self.deadline - time.monotonic(), 0)
+        return {
+            'connect_timeout': self.connect_timeout,
+            'read_timeout': self.read_timeout,
+            'retries': self.retries,
+            'backoff_factor': self.backoff_factor,
+            'per_host_limit': self.per_host_limit,
+            'failure_threshold': self.failure_threshold,
+            'deadline': remaining,
+        }
+
+    def _timeout(self):
+        remaining = self._remaining()
+        if remaining is None:
+            return self.connect_timeout, self.read_timeout
+        return min(self.connect_timeout, remaining), min(self.read_timeout, remaining)
+
+    def _backoff(self, attempt, response=None):
+        """Seconds to wait before retry number `attempt` + 1, honouring a numeric Retry-After."""
+        delay = self.backoff_factor * 2 ** attempt
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.strip().isdigit():
+            delay = max(delay, int(retry_after))
+        delay = min(delay, DEFAULT_BACKOFF_MAX)
+        remaining = self._remaining()
+        if remaining is not None and delay >= remaining:
+            raise DeadlineExceededError("Global fetch deadline exceeded while waiting to retry")
+        return delay
+
+    def _get_with_retries(self, url, headers):
+        for attempt in range(self.retries + 1):
+            response = None
+            try:
+                response = self.session.get(url, headers=headers, timeout=self._timeout())
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if self.deadline is not None and time.monotonic() >= self.deadline:
+                    # The timeout was cut short by the deadline, not the host being slow
+                    raise DeadlineExceededError("Global fetch deadline exceeded during a request") from e
+                if attempt == self.retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    return response
+                response.close()
+            time.sleep(self._backoff(attempt, response))
+
+    def _record(self, host, ok):
+        with self._lock:
+            if ok:
+                self._host_failures[host] = 0
+                return
+            self._host_failures[host] += 1
+            if self._host_failures[host] == self.failure_threshold:
+                logger.warning(f"Host {host} failed {self.failure_threshold} times in a row; skipping it")
+
+    def get(self, url, headers=None):
+        """
+        GET a URL through the pooled session, retrying connection errors and 429/5xx responses
+        with backoff; raises on those failures, disabled hosts and the deadline.
+        """
+        host = urlsplit(url).netloc
+        with self._lock:
+            if self._host_failures[host] >= self.failure_threshold:
+                raise HostUnavailableError(f"Host {host} disabled after repeated failures")
+            slot = self._host_slots[host]
+
+        with slot:
+            try:
+                response = self._get_with_retries(url, headers)
+                if response.status_code in RETRY_STATUSES:
+                    response.raise_for_status()
+            except DeadlineExceededError:
+                raise  # Not the host's fault
+            except Exception:
+                self._record(host, ok=False)
+                raise
+
+        self._record(host, ok=True)
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+# ------------------------------
+# Shared Client
+# ------------------------------
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def configure_fetch_client(**options):
+    """Replace the shared client, e.g. configure_fetch_client(deadline=600, per_host_limit=2)."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = FetchClient(**options)
+        return _client
+
+
+def fetch_client_settings():
+    """Options for the shared client, for handing the configuration to worker processes."""
+    with _client_lock:
+        return _client.settings() if _client is not None else {}
+
+
+def get_fetch_client():
+    """Return the shared client used for every image download."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = FetchClient()
+        return _client
@@ -0,0 +1,238 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from http_client import get_fetch_client
+from image_probe import probe_image, probe_path
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# Cache Settings
+# ------------------------------
+
+DEFAULT_CACHE_DIR = os.environ.get('PATENT_WATCH_IMAGE_CACHE_DIR', '.image_cache')
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024  # 1 GB of image blobs
+DEFAULT_MAX_AGE = 24 * 3600  # Serve without revalidating for a day
+INDEX_NAME = 'index.json'
+ORPHAN_GRACE = 3600  # Unindexed blobs younger than this may belong to a run that has not flushed yet
+
+
+class ImageCache:
+    """
+    Persistent image cache keyed by URL.
+    Bytes are stored once per content hash; each URL keeps its ETag/Last-Modified
+    so stale entries are revalidated with conditional requests.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                 max_age=DEFAULT_MAX_AGE, offline=False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.offline = offline
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._index = self._load_index()
+
+    # ------------------------------
+    # Index and blob storage
+    # ------------------------------
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, INDEX_NAME)
+
+    def _blob_path(self, digest):
+        return os.path.join(self.cache_dir, 'blobs', digest[:2], digest)
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _read_blob(self, digest):
+        try:
+            with open(self._blob_path(digest), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_blob(self, content):
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        return digest
+
+    def _merge_index(self):
+        """
+        Take in entries other processes flushed since this index was loaded, so writing it
+        does not drop them; for a URL both know, the more recently used entry wins.
+        """
+        for url, entry in self._load_index().items():
+            ours = self._index.get(url)
+            if ours is None:
+                if os.path.exists(self._blob_path(entry['digest'])):  # Not evicted since
+                    self._index[url] = entry
+            elif entry['last_used'] > ours['last_used']:
+                self._index[url] = entry
+
+    def flush(self):
+        """Merge the on-disk index, apply the size cap and write the URL index."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._merge_index()
+            self._evict()
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = self._index_path() + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._index, f)
+            os.replace(tmp_path, self._index_path())
+            self._dirty = False
+
+    def _remove_orphans(self, referenced):
+        """Delete blobs no index entry points at, e.g. left by a run killed before its flush."""
+        removed = 0
+        cutoff = time.time() - ORPHAN_GRACE
+        try:
+            shards = list(os.scandir(os.path.join(self.cache_dir, 'blobs')))
+        except OSError:
+            return
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            for blob in os.scandir(shard.path):
+                if blob.name in referenced:
+                    continue
+                try:
+                    if blob.stat().st_mtime < cutoff:
+                        os.remove(blob.path)
+                        removed += 1
+                except OSError:
+                    pass
+        if removed:
+            logger.info(f"Removed {removed} unindexed cached images")
+
+    def _evict(self):
+        """
+        Remove unindexed blobs, then drop least recently used blobs (and every URL
+        pointing at them) until under max_bytes.
+        """
+        self._remove_orphans({entry['digest'] for entry in self._index.values()})
+        blobs = {}
+        for entry in self._index.values():
+            size, last_used = blobs.get(entry['digest'], (entry['size'], 0))
+            blobs[entry['digest']] = (size, max(last_used, entry['last_used']))
+
+        total = sum(size for size, _ in blobs.values())
+        if total <= self.max_bytes:
+            return
+
+        evicted = set()
+        for digest, (size, _) in sorted(blobs.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._blob_path(digest))
+            except OSError:
+                pass
+            evicted.add(digest)
+            total -= size
+
+        self._index = {url: entry for url, entry in self._index.items() if entry['digest'] not in evicted}
+        logger.info(f"Evicted {len(evicted)} cached images")
+
+    def _store(self, url, content, response):
+        digest = self._write_blob(content)
+        probed = probe_image(content)
+        now = time.time()
+        with self._lock:
+            self._index[url] = {
+                'digest': digest,
+                'size': len(content),
+                'format': probed[0] if probed else None,
+                'width': probed[1] if probed else None,
+                'height': probed[2] if probed else None,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'checked': now,
+                'last_used': now,
+            }
+            self._dirty = True
+
+    def _touch(self, url, checked=False):
+        with self._lock:
+            entry = self._index[url]
+            entry['last_used'] = time.time()
+            if checked:
+                entry['checked'] = entry['last_used']
+            self._dirty = True
+
+    # ------------------------------
+    # Lookup
+    # ------------------------------
+
+    def dimensions(self, url):
+        """
+        (width, height) of a cached image from the index, without reading the blob.
+        Entries cached before sizes were recorded are probed once from the blob's header.
+        """
+        with self._lock:
+            entry = self._index.get(url)
+            if entry is None:
+                return None
+            if 'width' in entry:
+                return (entry['width'], entry['height']) if entry['width'] else None
+            digest = entry['digest']
+        probed = probe_path(self._blob_path(digest))
+        with self._lock:
+            entry = self._index.get(url)
+            if entry is not None and entry['digest'] == digest:
+                entry['format'], entry['width'], entry['height'] = probed or (None, None, None)
+                self._dirty = True
+        return probed[1:] if probed else None
+
+    def get(self, url, headers=None):
+        """Return image bytes for the URL, downloading or revalidating only when needed."""
+        with self._lock:
+            entry = dict(self._index.get(url) or {})
+        cached = self._read_blob(entry['digest']) if entry else None
+
+        if cached is not None and (self.offline or time.time() - entry['checked'] < self.max_age):
+            self._touch(url)
+            return cached
+        if self.offline:
+            logger.warning(f"Offline mode: image not cached: {url}")
+            return None
+
+        request_headers = dict(headers or {})
+        if cached is not None:
+            if entry.get('etag'):
+                request_headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                request_headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            response = get_fetch_client().get(url, headers=request_headers)
+            if response.status_code == 304 and cached is not None:
+                self._touch(url, checked=True)
+                return cached
+            response.raise_for_status()
+        except Exception as e:
+            if cached is not None:
+                logger.warning(f"Revalidation failed, serving cached image {url}: {e}")
+                self._touch(url)
+                return cached
+            raise
+
+        self._store(url, response.content, response)
+        return response.content
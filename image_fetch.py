@@ -0,0 +1,206 @@
+import atexit
+import logging
+import threading
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from http_client import get_fetch_client
+from image_cache import ImageCache
+from image_resolver import get_image_resolver
+from image_probe import image_dimensions
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# Image Download Helpers
+# ------------------------------
+
+DEFAULT_MAX_WORKERS = 8
+
+_image_cache = None
+_image_cache_enabled = True
+_failed_downloads = 0
+_failed_lock = threading.Lock()
+
+
+def configure_image_cache(enabled=True, **cache_options):
+    """Enable, disable or reconfigure the shared on-disk image cache (e.g. offline=True)."""
+    global _image_cache, _image_cache_enabled
+    if _image_cache is not None:
+        _image_cache.flush()
+    _image_cache_enabled = enabled
+    _image_cache = ImageCache(**cache_options) if enabled else None
+    return _image_cache
+
+
+def image_cache_settings():
+    """(enabled, cache options), for handing the configuration to worker processes."""
+    if _image_cache is None:
+        return _image_cache_enabled, {}
+    return _image_cache_enabled, {
+        'cache_dir': _image_cache.cache_dir,
+        'max_bytes': _image_cache.max_bytes,
+        'max_age': _image_cache.max_age,
+        'offline': _image_cache.offline,
+    }
+
+
+def get_image_cache():
+    """Return the shared image cache, creating it on first use (None when disabled)."""
+    global _image_cache
+    if _image_cache is None and _image_cache_enabled:
+        _image_cache = ImageCache()
+    return _image_cache
+
+
+atexit.register(lambda: _image_cache and _image_cache.flush())
+
+
+def get_image_bytes(image_url, headers=None):
+    """Return one image's bytes from the cache or the shared HTTP client; raises on failure."""
+    cache = get_image_cache()
+    if cache is not None:
+        content = cache.get(image_url, headers=headers)
+        if content is None:
+            raise LookupError(f"Image not available offline: {image_url}")
+        return content
+
+    response = get_fetch_client().get(image_url, headers=headers)
+    response.raise_for_status()
+    return response.content
+
+
+def fetch_image(image_url, headers=None):
+    """Return one image's bytes, or None on failure."""
+    try:
+        return get_image_bytes(image_url, headers=headers)
+    except Exception as e:
+        logger.error(f"Error downloading image {image_url}: {e}")
+        global _failed_downloads
+        with _failed_lock:
+            _failed_downloads += 1
+        return None
+
+
+def take_failed_downloads():
+    """Return and reset the number of failed image downloads in this process."""
+    global _failed_downloads
+    with _failed_lock:
+        failed, _failed_downloads = _failed_downloads, 0
+    return failed
+
+
+def get_image_dimensions(image_url, images=None):
+    """
+    (width, height) of an image without decoding it: from the image cache's metadata, else
+    from the header of bytes already in `images`. None when neither knows the image.
+    """
+    cache = get_image_cache()
+    if cache is not None:
+        size = cache.dimensions(image_url)
+        if size:
+            return size
+    # A streaming window is not read here, as that would download the image early
+    content = images.get(image_url) if isinstance(images, dict) else None
+    return image_dimensions(content) if content else None
+
+
+def collect_image_urls(df_images, records):
+    """
+    Collect the Sheet1 image URLs for the records about to be rendered, found the way the
+    renderers find them (family number, then publication or patent number).
+    """
+    resolver = get_image_resolver(df_images)
+    urls = (resolver.find(record) for record in records.to_dict('records'))
+    return list(dict.fromkeys(url for url in urls if url))
+
+
+def prefetch_images(urls, max_workers=DEFAULT_MAX_WORKERS, headers=None):
+    """
+    Download every URL concurrently with a bounded thread pool (per-host limits and
+    timeouts come from the shared HTTP client).
+    Returns a dict of URL -> bytes (None for failed downloads) that renderers read from.
+    """
+    urls = list(dict.fromkeys(urls))  # De-duplicate, keep order
+    if not urls:
+        return {}
+
+    with span("image downloads", images=len(urls)) as timing:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as pool:
+            contents = pool.map(lambda url: fetch_image(url, headers=headers), urls)
+            images = dict(zip(urls, contents))
+
+        cache = get_image_cache()
+        if cache is not None:
+            cache.flush()
+
+        failed = sum(1 for content in images.values() if content is None)
+        timing.add(failed=failed, bytes=sum(len(content) for content in images.values() if content))
+    logger.info(f"Prefetched {len(images) - failed}/{len(images)} images")
+    return images
+
+
+class ImageWindow:
+    """
+    Read-only stand-in for the prefetched images dict when memory must stay bounded.
+    URLs are given in rendering order (a URL may appear more than once, e.g. a granted
+    patent sharing a first publication's image) and downloaded a window at a time.
+    A URL is looked up at its first occurrence at or after the last one served, so
+    reading moves forward through the windows and never reloads an earlier one; a URL
+    with no such occurrence is not served, and the reader falls back to fetch_image().
+    `transform`, if given, maps each downloaded window dict before it is served.
+    Popped occurrences are no longer served either.
+    """
+
+    def __init__(self, urls, window=64, max_workers=DEFAULT_MAX_WORKERS, headers=None, transform=None):
+        self.urls = list(urls)
+        self.window = window
+        self.max_workers = max_workers
+        self.headers = headers
+        self.transform = transform
+        self._positions = {}  # url -> sorted positions in self.urls
+        for i, url in enumerate(self.urls):
+            self._positions.setdefault(url, []).append(i)
+        self._cursor = 0
+        self._start = None
+        self._images = {}
+        self._released = set()  # Positions whose image was popped
+
+    def _position(self, url):
+        positions = self._positions.get(url)
+        if positions is None:
+            return None
+        i = bisect_left(positions, self._cursor)
+        return positions[i] if i < len(positions) else None
+
+    def _load(self, index):
+        start = index - index % self.window
+        if start != self._start:
+            self._images = {}  # Release the previous window first
+            urls = list(dict.fromkeys(self.urls[start:start + self.window]))
+            self._images = prefetch_images(urls, self.max_workers, self.headers)
+            if self.transform is not None:
+                self._images = self.transform(self._images)
+            self._start = start
+
+    def __contains__(self, url):
+        index = self._position(url)
+        if index is None or index in self._released:
+            return False
+        self._cursor = index
+        self._load(index)
+        return True
+
+    def get(self, url, default=None):
+        return self._images.get(url, default) if url in self else default
+
+    def pop(self, url, default=None):
+        index = self._position(url)
+        if index is None:
+            return default
+        self._released.add(index)
+        positions = self._positions[url]
+        following = positions[bisect_left(positions, index + 1):]
+        if following and self._start is not None and following[0] < self._start + self.window:
+            return self._images.get(url, default)  # Read again later in this window
+        return self._images.pop(url, default)
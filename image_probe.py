@@ -0,0 +1,90 @@
+import logging
+import struct
+from io import BytesIO
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# Header Probing
+# ------------------------------
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+GIF_SIGNATURES = (b'GIF87a', b'GIF89a')
+JPEG_SOI = b'\xff\xd8'
+# Start-of-frame markers carry the frame size; C4 (DHT), C8 (JPG) and CC (DAC) share the range
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+JPEG_STANDALONE_MARKERS = set(range(0xD0, 0xDA)) | {0x01}  # RSTn, SOI, EOI, TEM: no length
+
+
+def _probe_jpeg(f):
+    """Walk the JPEG segments, skipping each by its length, up to the first SOF marker."""
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        while byte and byte != b'\xff':
+            byte = f.read(1)  # Tolerate garbage between segments
+        while byte == b'\xff':
+            byte = f.read(1)  # Markers may be padded with extra 0xFF bytes
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        if marker == 0xDA:  # Start of scan: no frame header before the image data
+            return None
+        length = f.read(2)
+        if len(length) < 2:
+            return None
+        segment_length = struct.unpack('>H', length)[0]
+        if marker in JPEG_SOF_MARKERS:
+            frame = f.read(5)
+            if len(frame) < 5:
+                return None
+            height, width = struct.unpack('>HH', frame[1:5])
+            return ('JPEG', width, height) if width and height else None
+        f.seek(segment_length - 2, 1)
+
+
+def probe_file(f):
+    """
+    (format, width, height) read from the header of an open binary file, or None when
+    the format is not PNG/JPEG/GIF or the header is cut short. Only header bytes are read:
+    24 for PNG, 10 for GIF, and the segment headers before the frame for JPEG.
+    """
+    head = f.read(24)
+    if head.startswith(PNG_SIGNATURE):
+        if len(head) < 24 or head[12:16] != b'IHDR':
+            return None
+        width, height = struct.unpack('>II', head[16:24])
+        return ('PNG', width, height)
+    if head[:6] in GIF_SIGNATURES:
+        if len(head) < 10:
+            return None
+        width, height = struct.unpack('<HH', head[6:10])
+        return ('GIF', width, height)
+    if head.startswith(JPEG_SOI):
+        return _probe_jpeg(f)
+    return None
+
+
+def probe_image(content):
+    """(format, width, height) from image bytes, which may be only the first part of the file."""
+    if not content:
+        return None
+    return probe_file(BytesIO(content))
+
+
+def probe_path(path):
+    """(format, width, height) of an image file on disk, or None if it cannot be probed."""
+    try:
+        with open(path, 'rb') as f:
+            return probe_file(f)
+    except OSError as e:
+        logger.warning(f"Could not probe image {path}: {e}")
+        return None
+
+
+def image_dimensions(content):
+    """(width, height) in pixels from image bytes, or None."""
+    probed = probe_image(content)
+    return probed[1:] if probed else None
@@ -0,0 +1,158 @@
+import atexit
+import hashlib
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from PIL import Image
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# Image Normalization
+# ------------------------------
+
+DEFAULT_DPI = 220  # Word's default target resolution when it compresses pictures
+JPEG_QUALITY = 90
+EMBED_FORMATS = {'PNG', 'JPEG', 'GIF'}  # Embedded as they are when no resize is needed
+LOSSY_FORMATS = {'JPEG', 'MPO', 'WEBP'}  # Re-encoded as JPEG; anything else becomes PNG
+MIN_REDUCTION = 0.9  # Widths within 10% of the target are not worth a resample and re-encode
+SERIAL_BATCH = 4  # Batches this small are not worth a round trip to the pool
+
+_dpi = DEFAULT_DPI
+_max_workers = None
+_enabled = True
+_pool = None
+_normalized = set()  # (digest, width_in, max_height_in, dpi) of bytes this process already normalized
+
+
+def configure_image_processing(dpi=None, max_workers=None, enabled=True):
+    """Set the embed resolution and pool size, or turn normalization off (images embed as downloaded)."""
+    global _dpi, _max_workers, _enabled
+    shutdown_image_pool()
+    if dpi is not None:
+        _dpi = dpi
+    if max_workers is not None:
+        _max_workers = max_workers
+    _enabled = enabled
+
+
+def image_processing_settings():
+    """(dpi, max_workers, enabled), for handing the configuration to worker processes."""
+    return _dpi, _max_workers, _enabled
+
+
+def get_image_pool():
+    """Return the shared process pool, starting it on first use."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=_max_workers or min(4, os.cpu_count() or 1))
+        atexit.register(shutdown_image_pool)
+    return _pool
+
+
+def shutdown_image_pool():
+    """Stop the pool's processes; the next batch starts a new pool."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def target_size(size, width_in, max_height_in=None, dpi=DEFAULT_DPI):
+    """Pixel size of an image shown `width_in` wide (capped at `max_height_in` tall); never upscaled."""
+    width, height = size
+    display_width = width_in
+    if max_height_in is not None:
+        display_width = min(display_width, max_height_in * width / height)
+    target_width = min(width, max(1, round(display_width * dpi)))
+    return target_width, max(1, round(height * target_width / width))
+
+
+def normalize_image(content, width_in, max_height_in=None, dpi=None):
+    """
+    Return bytes ready to embed at `width_in` inches: downscaled to the pixel size for that
+    width at `dpi`, RGB instead of CMYK, and in the source format when Word can show it.
+    Images that already fit come back unchanged, so normalizing twice is cheap.
+    """
+    dpi = dpi or _dpi
+    with Image.open(BytesIO(content)) as img:
+        source_format, source_mode = img.format, img.mode
+        size = target_size(img.size, width_in, max_height_in, dpi)
+        resize = size[0] < img.size[0] * MIN_REDUCTION
+        if not resize and source_format in EMBED_FORMATS and img.mode != 'CMYK':
+            return content
+
+        has_alpha = img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info)
+        lossy = source_format in LOSSY_FORMATS and not has_alpha
+        if lossy:
+            out = img.convert('RGB') if img.mode != 'RGB' else img
+        elif img.mode in ('L', 'RGB', 'RGBA'):
+            out = img
+        elif img.mode == '1':
+            out = img.convert('L')  # Bilevel drawings only resample with nearest neighbour
+        else:
+            # Palette, CMYK and 16-bit images resample badly; PNG keeps any transparency
+            out = img.convert('RGBA' if has_alpha else 'RGB')
+        if resize:
+            out = out.resize(size, Image.LANCZOS)
+
+        buffer = BytesIO()
+        if lossy:
+            out.save(buffer, format='JPEG', quality=JPEG_QUALITY, optimize=True, dpi=(dpi, dpi))
+        else:
+            out.save(buffer, format='PNG', dpi=(dpi, dpi))  # optimize=True triples the time for a few percent
+    data = buffer.getvalue()
+    # A resize that re-encodes bigger than the source is not worth it for a supported format
+    if source_format in EMBED_FORMATS and source_mode != 'CMYK' and len(data) >= len(content):
+        return content
+    return data
+
+
+def _normalized_key(content, width_in, max_height_in, dpi):
+    """Identifies bytes normalized for one display size at one resolution."""
+    return hashlib.sha1(content).digest(), width_in, max_height_in, dpi
+
+
+def _normalize_or_keep(content, width_in, max_height_in, dpi):
+    try:
+        return normalize_image(content, width_in, max_height_in, dpi)
+    except Exception as e:
+        logger.warning(f"Embedding image as downloaded, could not normalize it: {e}")
+        return content
+
+
+def normalize_images(images, width_in, max_height_in=None):
+    """Normalize a {url: bytes} dict in the process pool; undecodable images are kept as they are."""
+    if not _enabled or not images:
+        return images
+    urls = [url for url, content in images.items() if content]
+    args = ([images[url] for url in urls], [width_in] * len(urls), [max_height_in] * len(urls), [_dpi] * len(urls))
+    with span("image normalization", images=len(urls)) as timing:
+        if len(urls) <= SERIAL_BATCH:
+            results = map(_normalize_or_keep, *args)
+        else:
+            results = get_image_pool().map(_normalize_or_keep, *args, chunksize=max(1, len(urls) // 32))
+        normalized = dict(images)
+        before = after = 0
+        for url, data in zip(urls, results):
+            before += len(images[url])
+            after += len(data)
+            normalized[url] = data
+            _normalized.add(_normalized_key(data, width_in, max_height_in, _dpi))
+        timing.add(bytes_in=before, bytes_out=after)
+    logger.info(f"Normalized {len(urls)} images for {width_in}\" at {_dpi} dpi: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+    return normalized
+
+
+def prepare_image(content, width_in, max_height_in=None):
+    """Normalize one image on the calling thread, for images fetched outside a prefetched batch."""
+    if not _enabled or not content:
+        return content
+    # Kept-as-is images would otherwise be decoded and resized again, only to be kept again
+    if _normalized_key(content, width_in, max_height_in, _dpi) in _normalized:
+        return content
+    data = _normalize_or_keep(content, width_in, max_height_in, _dpi)
+    _normalized.add(_normalized_key(data, width_in, max_height_in, _dpi))
+    return data
@@ -0,0 +1,106 @@
+import pandas as pd
+import logging
+import weakref
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# Image Resolver
+# ------------------------------
+
+# Sheet1 columns that can identify a record's image
+FAMILY_KEY = 'Family number'
+NUMBER_KEYS = ['Publication No', 'Patent No']
+
+
+def normalize_key(value):
+    """Normalize a lookup key so 1234, 1234.0 and ' 1234 ' all match; blanks become None."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+
+class ImageResolver:
+    """
+    Hashed lookup of Sheet1 image URLs, built once per sheet.
+    Records resolve by 'Family number' or by 'Publication No'/'Patent No' (one shared
+    number space). When a key appears on several Sheet1 rows, the first row with a
+    non-empty image wins and the duplicate is counted.
+    """
+
+    def __init__(self, df_images, image_column='Image'):
+        self.df_images = df_images
+        self.duplicates = {}
+        self.missing = []
+        self._maps = {}
+
+        images = df_images[image_column] if image_column in df_images.columns else pd.Series(dtype=object)
+        number_map = {}
+        for column in [FAMILY_KEY] + NUMBER_KEYS:
+            if column not in df_images.columns:
+                continue
+            target = {} if column == FAMILY_KEY else number_map
+            duplicates = 0
+            for key, url in zip(df_images[column].tolist(), images.tolist()):
+                key, url = normalize_key(key), normalize_key(url)
+                if key is None or url is None:
+                    continue
+                if key in target:
+                    duplicates += target[key] != url
+                    continue
+                target[key] = url
+            self._maps[column] = target
+            self.duplicates[column] = duplicates
+
+        for column in NUMBER_KEYS:
+            self._maps[column] = number_map
+
+        for column, count in self.duplicates.items():
+            if count:
+                logger.warning(f"{count} duplicate '{column}' keys in Sheet1 with different images; using the first")
+
+    def lookup(self, column, value):
+        """Return the image URL for one key column and value, or None."""
+        return self._maps.get(column, {}).get(normalize_key(value))
+
+    def find(self, record, keys=(FAMILY_KEY, 'Publication No', 'Patent No')):
+        """Return the image URL for a record, trying each key in order, without recording misses."""
+        for column in keys:
+            url = self.lookup(column, record.get(column))
+            if url is not None:
+                return url
+        return None
+
+    def resolve(self, record, keys=(FAMILY_KEY, 'Publication No', 'Patent No')):
+        """Return the image URL for a record, trying each key in order; records without one are remembered."""
+        url = self.find(record, keys)
+        if url is not None:
+            return url
+
+        label = next((normalize_key(record.get(c)) for c in NUMBER_KEYS + [FAMILY_KEY] if normalize_key(record.get(c))), None)
+        self.missing.append(label or '<unnamed record>')
+        return None
+
+    def report_missing(self):
+        """Log every record resolved so far that has no image, and return them."""
+        if self.missing:
+            logger.info(f"{len(self.missing)} records have no image: {', '.join(self.missing)}")
+        return list(self.missing)
+
+
+_resolvers = {}
+
+
+def get_image_resolver(df_images):
+    """Return the image resolver for a Sheet1 DataFrame, building it only once."""
+    key = id(df_images)
+    cached = _resolvers.get(key)
+    if cached is not None and cached[0]() is df_images:
+        return cached[1]
+
+    resolver = ImageResolver(df_images)
+    _resolvers[key] = (weakref.ref(df_images, lambda _: _resolvers.pop(key, None)), resolver)
+    return resolver
@@ -0,0 +1,121 @@
+import copy
+from collections import namedtuple
+from docx.oxml.ns import qn
+from docx.enum.table import WD_ROW_HEIGHT_RULE
+from category_index import get_category_index
+from report_styles import ensure_report_styles, CATEGORY_ROW
+from bookmarks import anchor_name
+
+# ------------------------------
+# Bulk Index Table Rows
+# ------------------------------
+
+# A merged '> CATEGORY' heading row inside an index table
+CategoryHeading = namedtuple('CategoryHeading', ['label'])
+
+
+def category_rows(df, categories, columns):
+    """
+    Flatten a sheet into index table rows: a CategoryHeading per category followed by
+    one list of cell texts per record in that category.
+    """
+    index = get_category_index(df)
+    rows = []
+    for category in categories:
+        rows.append(CategoryHeading(category))
+        values = [
+            index.column(category, column) if column in df.columns else [''] * len(index.positions(category))
+            for column in columns
+        ]
+        rows.extend([str(value) for value in record] for record in zip(*values))
+    return rows
+
+
+class GroupedRowBuilder:
+    """
+    Appends category-grouped rows to an index table in one pass.
+    One heading row and one data row are formatted with python-docx as prototypes;
+    every other row is a deep copy with only the text (and link anchor) filled in.
+    Text size comes from the report table style and headings use the category row
+    style, so the rows carry no per-run properties.
+    """
+
+    def __init__(self, table, column_widths, category_row_height=None, link_column=None, add_link=None):
+        self.table = table
+        self.link_column = link_column if add_link is not None else None
+        styles = ensure_report_styles(table.part.document).styles
+
+        # Heading prototype: one merged cell in the category row style
+        cat_row = table.add_row()
+        if category_row_height is not None:
+            cat_row.height = category_row_height
+            cat_row.height_rule = WD_ROW_HEIGHT_RULE.EXACTLY  # Ensures the row height is fixed
+        cat_cell = cat_row.cells[0]
+        cat_cell.merge(cat_row.cells[-1])
+        cat_cell.text = '> '
+        cat_cell.paragraphs[0].style = styles[CATEGORY_ROW]
+        self._heading_tr = self._detach(cat_row._tr)
+
+        # Data prototype: plain text cells, then the same row with a linked cell
+        data_row = table.add_row()
+        cells = data_row.cells
+        for cell in cells:
+            cell.text = ''
+        self._format_cells(cells, column_widths)
+        self._data_tr = self._detach(data_row._tr)
+
+        self._link_tc = None
+        if self.link_column is not None:
+            link_row = table.add_row()
+            cells = link_row.cells
+            add_link(cells[self.link_column].paragraphs[0], '', '')
+            self._format_cells(cells, column_widths)
+            self._link_tc = self._detach(link_row._tr).tc_lst[self.link_column]
+
+    @staticmethod
+    def _detach(tr):
+        tr.getparent().remove(tr)
+        return tr
+
+    @staticmethod
+    def _format_cells(cells, column_widths):
+        # Column widths stay on the cells; the 10pt text size comes from the table style
+        for i, cell in enumerate(cells):
+            cell.width = column_widths[i]
+
+    @staticmethod
+    def _value_run(tc):
+        return next(tc.iter(qn('w:r')))
+
+    def heading_tr(self, label):
+        tr = copy.deepcopy(self._heading_tr)
+        self._value_run(tr).text = f'> {label.upper()}'
+        return tr
+
+    def data_tr(self, values):
+        tr = copy.deepcopy(self._data_tr)
+        tcs = tr.tc_lst
+        for i, (tc, value) in enumerate(zip(tcs, values)):
+            if i == self.link_column and value:
+                link_tc = copy.deepcopy(self._link_tc)
+                self._value_run(link_tc).text = value
+                next(link_tc.iter(qn('w:hyperlink'))).set(qn('w:anchor'), anchor_name(value))
+                tr.replace(tc, link_tc)
+            else:
+                self._value_run(tc).text = value
+        return tr
+
+    def append_rows(self, rows):
+        """Build the <w:tr> for every row and append them to the table in one go."""
+        trs = [
+            self.heading_tr(row.label) if isinstance(row, CategoryHeading) else self.data_tr(row)
+            for row in rows
+        ]
+        self.table._tbl.extend(trs)
+        return len(trs)
+
+
+def append_grouped_rows(table, rows, column_widths, category_row_height=None, link_column=None, add_link=None):
+    """Append category headings and data rows (see category_rows) to an index table."""
+    builder = GroupedRowBuilder(table, column_widths, category_row_height, link_column, add_link)
+    return builder.append_rows(rows)
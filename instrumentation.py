@@ -0,0 +1,323 @@
+import cProfile
+import functools
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+import time
+import tracemalloc
+from memory_budget import MB, memory_usage
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# Spans
+# ------------------------------
+
+
+class _NoSpan:
+    """What span() returns while instrumentation is off: entering, leaving and counting do nothing."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add(self, **counts):
+        pass
+
+
+NO_SPAN = _NoSpan()
+
+
+class Span:
+    """A named, timed stage with item and byte counts; nested spans are recorded under their parent's path."""
+    __slots__ = ('recorder', 'name', 'path', 'counts', '_start', '_cpu_start', '_started_at', '_profile', '_memory', '_trace')
+
+    def __init__(self, recorder, name, counts):
+        self.recorder = recorder
+        self.name = name
+        self.path = name
+        self.counts = dict(counts)
+        self._profile = None
+        self._memory = None
+        self._trace = None
+
+    def add(self, **counts):
+        """Add to this span's counts, e.g. span.add(rows=len(df), bytes=len(data))."""
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + value
+
+    def __enter__(self):
+        stack = self.recorder._stack()
+        if stack:
+            self.path = f"{stack[-1].path}/{self.name}"
+        stack.append(self)
+        self._profile = self.recorder._start_profile()
+        self._trace = self.recorder._start_trace()
+        self._memory = memory_usage() if self.recorder.memory else None
+        self._started_at = time.time()  # Comparable across processes, for ordering merged spans
+        self._start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self._start
+        cpu = time.process_time() - self._cpu_start
+        self.recorder._stack().pop()
+        self.recorder._finish(self, wall, cpu, self._started_at)
+        return False
+
+
+class Recorder:
+    """
+    Collects finished spans; with a profile directory, the outermost span on the main thread
+    is profiled. With `memory`, each span also records resident memory and how far it raised
+    the process high-water mark; with `trace_top`, the outermost span on the main thread is
+    traced with tracemalloc and keeps its peak and its top allocating lines.
+    """
+
+    def __init__(self, profile_dir=None, memory=False, trace_top=0):
+        self.profile_dir = profile_dir
+        self.memory = memory or trace_top > 0
+        self.trace_top = trace_top
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.records = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._profiling = None  # The span being profiled; cProfile allows one profiler at a time
+        self._tracing = False
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+        if trace_top and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _start_profile(self):
+        if not self.profile_dir or self._profiling is not None or threading.current_thread() is not threading.main_thread():
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return None  # Another profiler (e.g. python -m cProfile) is already active
+        self._profiling = profile
+        return profile
+
+    def _start_trace(self):
+        if not self.trace_top or self._tracing or threading.current_thread() is not threading.main_thread():
+            return None
+        self._tracing = True
+        tracemalloc.reset_peak()
+        return _snapshot()
+
+    def _memory_record(self, span):
+        (rss_before, peak_before), (rss, peak) = span._memory, memory_usage()
+        record = {'rss': rss, 'peak_rss': peak}
+        if rss is not None:
+            record['rss_change'] = rss - rss_before
+        if peak is not None:
+            record['peak_rise'] = peak - peak_before
+        if span._trace is not None:
+            record['traced_peak'] = tracemalloc.get_traced_memory()[1]
+            stats = _snapshot().compare_to(span._trace, 'lineno')
+            record['allocations'] = [
+                {'where': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                 'size': stat.size_diff, 'count': stat.count_diff}
+                for stat in stats[:self.trace_top] if stat.size_diff > 0
+            ]
+            span._trace = None
+            self._tracing = False
+        return record
+
+    def _finish(self, span, wall, cpu, start):
+        record = {'path': span.path, 'wall': wall, 'cpu': cpu, 'start': start, 'counts': span.counts}
+        if span._memory is not None:
+            record['memory'] = self._memory_record(span)
+        if span._profile is not None:
+            span._profile.disable()
+            self._profiling = None
+            filename = os.path.join(self.profile_dir, f"{os.getpid()}_{next(_profile_numbers):03d}_{slug(span.path)}.pstats")
+            span._profile.dump_stats(filename)
+            record['profile'] = filename
+        with self._lock:
+            self.records.append(record)
+
+
+def slug(text):
+    return re.sub(r'[^A-Za-z0-9]+', '_', text).strip('_')[:80]
+
+
+def _snapshot():
+    """A tracemalloc snapshot without tracemalloc's own and the import system's allocations."""
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    ))
+
+
+_recorder = None
+_profile_numbers = itertools.count()
+
+
+def configure_instrumentation(enabled=True, profile_dir=None, memory=False, trace_top=0):
+    """
+    Turn span recording on or off, optionally dumping a pstats file per top-level stage,
+    recording resident memory per span and tracing the top `trace_top` allocating lines
+    per top-level stage.
+    """
+    global _recorder
+    if _recorder is not None and _recorder.trace_top and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _recorder = Recorder(profile_dir, memory, trace_top) if enabled or profile_dir or memory or trace_top else None
+    return _recorder
+
+
+def instrumentation_settings():
+    """(enabled, profile_dir, memory, trace_top), for handing the configuration to worker processes."""
+    if _recorder is None:
+        return False, None, False, 0
+    return True, _recorder.profile_dir, _recorder.memory, _recorder.trace_top
+
+
+def span(name, **counts):
+    """Context manager timing a named stage; a shared no-op when instrumentation is off."""
+    if _recorder is None:
+        return NO_SPAN
+    return Span(_recorder, name, counts)
+
+
+def instrument(name=None):
+    """Decorator wrapping every call of a function in a span (named after the function by default)."""
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return func(*args, **kwargs)
+            with Span(_recorder, label, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def take_spans():
+    """Return and clear the recorded spans, e.g. to send them back from a worker process."""
+    if _recorder is None:
+        return []
+    with _recorder._lock:
+        records, _recorder.records = _recorder.records, []
+    return records
+
+
+def merge_spans(records):
+    """Add spans recorded in another process under the current span (their times overlap the parent's)."""
+    if _recorder is None:
+        return
+    stack = _recorder._stack()
+    prefix = f"{stack[-1].path}/" if stack else ''
+    with _recorder._lock:
+        _recorder.records.extend(dict(record, path=prefix + record['path']) for record in records)
+
+
+# ------------------------------
+# Summary
+# ------------------------------
+
+def summary():
+    """Spans aggregated by path as a JSON-ready dict, each stage listed under its parent in start order."""
+    if _recorder is None:
+        return None
+    stages = {}
+    for record in sorted(_recorder.records, key=lambda r: r['start']):
+        stage = stages.setdefault(record['path'], {'path': record['path'], 'start': record['start'] - _recorder.started_at,
+                                                   'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'counts': {}})
+        stage['calls'] += 1
+        stage['wall'] += record['wall']
+        stage['cpu'] += record['cpu']
+        for key, value in record['counts'].items():
+            stage['counts'][key] = stage['counts'].get(key, 0) + value
+        if 'profile' in record:
+            stage.setdefault('profiles', []).append(record['profile'])
+        if 'memory' in record:
+            merge_memory(stage.setdefault('memory', {}), record['memory'], _recorder.trace_top or 10)
+    def tree_order(path):
+        parts = path.split('/')
+        prefixes = ('/'.join(parts[:i + 1]) for i in range(len(parts)))
+        return tuple(stages[prefix]['start'] if prefix in stages else stages[path]['start'] for prefix in prefixes)
+
+    return {
+        'pid': os.getpid(),
+        'started': _recorder.started_at,
+        'elapsed': time.perf_counter() - _recorder.started,
+        'stages': [stages[path] for path in sorted(stages, key=tree_order)],
+    }
+
+
+def merge_memory(total, memory, top):
+    """Fold one span's memory record into a stage's: peaks are maxima, changes add up."""
+    for key in ('peak_rss', 'traced_peak'):
+        if memory.get(key) is not None:
+            total[key] = max(total.get(key) or 0, memory[key])
+    for key in ('rss_change', 'peak_rise'):
+        if key in memory:
+            total[key] = total.get(key, 0) + memory[key]
+    total['rss'] = memory.get('rss')  # Records arrive in start order, so this is the latest
+    if 'allocations' in memory:
+        allocations = {item['where']: dict(item) for item in total.get('allocations', [])}
+        for item in memory['allocations']:
+            merged = allocations.setdefault(item['where'], {'where': item['where'], 'size': 0, 'count': 0})
+            merged['size'] += item['size']
+            merged['count'] += item['count']
+        total['allocations'] = sorted(allocations.values(), key=lambda item: -item['size'])[:top]
+
+
+def megabytes(value):
+    return '?' if value is None else f"{value / MB:,.0f} MB"
+
+
+def log_summary():
+    """Log one line per stage: wall and CPU seconds, its counts and memory, then the top allocations."""
+    result = summary()
+    if result is None:
+        return
+    logger.info(f"Timings ({result['elapsed']:.2f}s elapsed):")
+    for stage in result['stages']:
+        depth = stage['path'].count('/')
+        label = '  ' * depth + stage['path'].rsplit('/', 1)[-1]
+        calls = f" x{stage['calls']}" if stage['calls'] > 1 else ''
+        counts = ', '.join(f"{key}={value:,}" for key, value in stage['counts'].items())
+        memory = stage.get('memory')
+        if memory:
+            rise = f" (+{megabytes(memory['peak_rise'])})" if memory.get('peak_rise') else ''
+            counts = f"peak {megabytes(memory.get('peak_rss'))}{rise}" + (f", {counts}" if counts else '')
+        logger.info(f"  {label + calls:<48} {stage['wall']:8.2f}s wall {stage['cpu']:8.2f}s cpu  {counts}")
+
+    for stage in result['stages']:
+        memory = stage.get('memory') or {}
+        if memory.get('allocations'):
+            logger.info(f"Top allocations in {stage['path']} (traced peak {megabytes(memory.get('traced_peak'))}):")
+            for item in memory['allocations']:
+                logger.info(f"  {item['size'] / MB:9.1f} MB {item['count']:>9,} blocks  {item['where']}")
+
+
+def write_summary(path):
+    """Write the summary as JSON to `path`."""
+    result = summary()
+    if result is None:
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    logger.info(f"Timing summary written to {path}")
@@ -1,33 +1,21 @@
-import pandas as pd
 from docx import Document
 from docx.shared import Inches, Pt
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
 from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.enum.table import WD_ROW_HEIGHT_RULE
 import sys
-from docx.shared import RGBColor
+from workbook_loader import load_workbook
+from index_table_builder import category_rows, append_grouped_rows
+from report_styles import ensure_report_styles, set_table_style, REPORT_TABLE, CELL_CENTERED, TABLE_HEADER, INTERNAL_LINK
 
-# Function to set table borders
+# Function to set table borders (black single borders come from the bordered table style)
 def set_table_borders(table):
-    tbl = table._tbl
-    tblPr = tbl.tblPr
-    borders = OxmlElement('w:tblBorders')
-    for border_name in ['top', 'left', 'bottom', 'right', 'insideH', 'insideV']:
-        border = OxmlElement(f'w:{border_name}')
-        border.set(qn('w:val'), 'single')
-        border.set(qn('w:sz'), '4')  # Size of the border
-        border.set(qn('w:space'), '0')
-        border.set(qn('w:color'), '000000')  # Black color for the border
-        borders.append(border)
-    tblPr.append(borders)
+    set_table_style(table, REPORT_TABLE)
 
 
 def add_hyperlink(paragraph, text, bookmark_name):
     """Add an internal hyperlink (bookmark link) in a Word document."""
-    run = paragraph.add_run(text)
-    run.font.color.rgb = RGBColor(0, 0, 255)  # Blue color for hyperlink
-    run.underline = True
+    run = paragraph.add_run(text, style=INTERNAL_LINK)  # Blue underlined hyperlink style
 
     hyperlink = OxmlElement("w:hyperlink")
     hyperlink.set(qn("w:anchor"), bookmark_name)  # Reference the bookmark name
@@ -35,18 +23,23 @@ def add_hyperlink(paragraph, text, bookmark_name):
     paragraph._element.append(hyperlink)
 
 
-def create_first_publications_doc(excel_path, output_path, template_path):
-    # Read Excel data from the 'First Publication' worksheet
-    df = pd.read_excel(excel_path, sheet_name='First Publication')
-    
-    # Clean column names and ensure there are no extra spaces
-    df.columns = df.columns.str.strip()
-    
-    # Clean the 'Category' column values
-    df['Category'] = df['Category'].astype(str).str.strip()
+def create_first_publications_doc(excel_path, output_path, template_path, sheets=None):
+    # Read Excel data from the 'First Publication' worksheet (columns and 'Category' are cleaned by the loader)
+    if sheets is None:
+        sheets = load_workbook(excel_path, ['First Publication'])
 
     # Load the template document
     document = Document(template_path)
+    add_first_publications_index(document, sheets)
+
+    # Save document
+    document.save(output_path)
+
+
+def add_first_publications_index(document, sheets):
+    """Append the First Publications index tables to an existing document."""
+    ensure_report_styles(document)
+    df = sheets['First Publication']
 
     # Define categories and their corresponding widths as two lists
     categories_list = ['Seafloor', 'Land', 'Marine', 'Microseismic & Multiphysics',
@@ -68,9 +61,8 @@ def create_first_publications_doc(excel_path, output_path, template_path):
     for i, (category, width) in enumerate(zip(categories_list, widths_list)):
         cell = index_row[i]
         paragraph = cell.paragraphs[0]
-        run = paragraph.add_run(category)
-        run.font.size = Pt(10)
-        paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        paragraph.style = CELL_CENTERED
+        paragraph.add_run(category)
 
         # Set column width
         cell.width = Inches(width)
@@ -112,78 +104,21 @@ def create_first_publications_doc(excel_path, output_path, template_path):
     for i, (header, width) in enumerate(zip(headers, column_widths)):
         cell = header_row.cells[i]
         cell.text = header
-
-        paragraph = cell.paragraphs[0]
-        paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER  # Center align headers
-
-        run = paragraph.runs[0] if paragraph.runs else paragraph.add_run()
-        run.bold = True
-        run.font.size = Pt(10)
+        cell.paragraphs[0].style = TABLE_HEADER  # Bold, centered, no spacing
 
         # Apply width using cell._tc XML
         cell._tc.get_or_add_tcPr().append(OxmlElement("w:tcW"))
         cell._tc.get_or_add_tcPr().find(qn("w:tcW")).set(qn("w:w"), str(int(width.inches * 1440)))  # Convert inches to twips
         cell._tc.get_or_add_tcPr().find(qn("w:tcW")).set(qn("w:type"), "dxa")
 
-
-        paragraph = cell.paragraphs[0]
-        paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        paragraph.runs[0].bold = True
-        paragraph.runs[0].font.size = Pt(10)
-        paragraph.space_after = Pt(0)
-        paragraph.space_before = Pt(0)
-
-    # Process each category
-    for category in categories_list:
-        # Add category heading row
-        cat_row = table.add_row()
-        cat_row.height = Inches(0.24) 
-        cat_row.height_rule = WD_ROW_HEIGHT_RULE.EXACTLY  # Ensures the row height is fixed
-
-        cat_cell = cat_row.cells[0]
-        cat_cell.merge(cat_row.cells[-1])
-        cat_cell.text = f'> {category.upper()}'
-        paragraph = cat_cell.paragraphs[0]
-        paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        paragraph.runs[0].bold = True
-        paragraph.runs[0].font.size = Pt(10)
-
-        # Filter the DataFrame for rows matching the current category (case-insensitive)
-        cat_data = df[df['Category'].str.lower().str.contains(category.lower())]
-
-        # Add rows for the data
-        for _, row in cat_data.iterrows():
-            data_row = table.add_row()
-            data_row.cells[0].text = str(row.get('Serial No', ''))
-
-            pub_no = str(row.get('Publication No', ''))
-            cell = data_row.cells[1]  # Assuming Patent No is in the second column
-            
-            if pub_no:
-                p = cell.paragraphs[0]
-                add_hyperlink(p, pub_no, pub_no.strip())  # Use Publication No as the bookmark name
-            else:
-                cell.text = pub_no  # Just display the text if no number exists
-
-            data_row.cells[2].text = str(row.get('Title', ''))
-            data_row.cells[3].text = str(row.get('Assignee', ''))
-            data_row.cells[4].text = str(row.get('Inventors', ''))
-
-            # Set column widths and font size for data rows
-            for i, cell in enumerate(data_row.cells):
-                cell.width = column_widths[i]
-                for paragraph in cell.paragraphs:
-                    paragraph.space_after = Pt(0)
-                    paragraph.space_before = Pt(0)
-                    for run in paragraph.runs:
-                        run.font.size = Pt(10)
+    # Category headings and data rows, built from prototypes and appended in one pass
+    rows = category_rows(df, categories_list, ['Serial No', 'Publication No', 'Title', 'Assignee', 'Inventors'])
+    append_grouped_rows(table, rows, column_widths, category_row_height=Inches(0.24),
+                        link_column=1, add_link=add_hyperlink)  # Publication No links to its bookmark
 
     # Set table borders for main data table
     set_table_borders(table)
 
-    # Save document
-    document.save(output_path)
-
 # Usage example:
 # create_first_publications_doc(
 #     'C:/Users/Ayman/Documents/Abhijit_mail_attachments/Test_PW.xlsm',
@@ -199,6 +134,7 @@ if __name__ == "__main__":
     template_file = sys.argv[3]
 
     create_first_publications_doc(excel_path, output_file, template_file)
+    print(f"First Publications index has been generated: {output_file}")
 
 # # Run the function directly to generate output
 # excel_path = r"C:\Users\Ayman\Documents\Abhijit_mail_attachments\Test_PW.xlsm"
@@ -207,4 +143,3 @@ if __name__ == "__main__":
 
 # create_first_publications_doc(excel_path, output_file, template_file)
 
-print(f"First Publications index has been generated: {output_file}")
@@ -1,29 +1,215 @@
-import subprocess
-import shutil
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
 from docx import Document
-from docxcompose.composer import Composer
 from docx.oxml.ns import qn
+from docx.text.paragraph import Paragraph
+from workbook_loader import load_workbook
+from report_styles import ensure_report_styles
+from docx_merge import merge_packages
+from build_graph import BuildGraph, BuildTarget
+from bookmarks import report_broken_links
+from image_fetch import configure_image_cache, image_cache_settings, take_failed_downloads
+from fragment_cache import configure_fragment_cache, fragment_cache_settings
+from image_processing import configure_image_processing, image_processing_settings, DEFAULT_DPI
+from http_client import configure_fetch_client, fetch_client_settings
+from instrumentation import (
+    configure_instrumentation, instrumentation_settings, log_summary, merge_spans, span, take_spans, write_summary
+)
+from memory_budget import (
+    MemoryCeilingExceeded, bounded_memory, check_memory, configure_memory_budget, current_rss, memory_budget_settings
+)
+from the_first_2_pages import add_patent_watch_pages
+from just_the_FP_index import add_first_publications_index
+from just_the_GP_index import add_granted_patents_index
+from first_publications_pages_generator import (
+    add_publication_detail_sections, stream_publication_detail_sections, configure_detail_packing, detail_packing_settings
+)
+from page_packing import PACKING_MODES
 
 # Paths
 excel_path = "C:/Users/Ayman/Documents/Abhijit_mail_attachments/Test_PW.xlsm"
 output_file = "final_patent_watch.docx"
 template_file = "basic_page_template.docx"
 
-# List of script and output document pairs
-scripts = [
-    ("the_first_2_pages.py", "part_1.docx"),
-    ("just_the_FP_index.py", "part_2.docx"),
-    ("just_the_GP_index.py", "part_3.docx"),
-    ("first_publications_pages_generator.py", "part_4.docx")
+# Report sections in order, each appended to the shared document, with the sheets they read
+sections = [
+    ("Title pages", add_patent_watch_pages, ["FP", "Grant"]),
+    ("FP index", add_first_publications_index, ["First Publication"]),
+    ("GP index", add_granted_patents_index, ["Grant"]),
+    ("First Publications & Granted Patents", add_publication_detail_sections, ["First Publication", "Granted", "Sheet1"]),
 ]
 
-# Run each script to generate its document
-for script, part_file in scripts:
+# Sections that can be written straight to disk by the streaming writer (--stream)
+streaming_builders = {
+    add_publication_detail_sections: stream_publication_detail_sections,
+}
+
+# Command-line options that change what a section renders, for deciding --build-dir rebuilds
+section_options = {
+    add_publication_detail_sections: ("stream", "packing", "image_dpi", "image_processing"),
+}
+
+# Build every section in this process against one document and one parsed workbook
+def build_report(excel_path, template_file, output_file, use_cache=True):
+    sheets = load_workbook(excel_path, use_cache=use_cache)
+    document = Document(template_file)
+
+    for i, (name, builder, _) in enumerate(sections):
+        if i > 0:
+            document.add_page_break()  # Each section starts on a new page
+        print(f"Building {name}...")
+        with span(name):
+            builder(document, sheets)
+        check_memory(name)
+
+    with span("save") as timing:
+        document.save(output_file)
+        timing.add(bytes=os.path.getsize(output_file))
+    print(f"Final document '{output_file}' created successfully!")
+    report_broken_links(output_file)
+
+# Temporary .docx a part is left in for the merge, so its bytes never pass through memory
+def spool_file():
+    handle, path = tempfile.mkstemp(prefix="patent_watch_part_", suffix=".docx")
+    os.close(handle)
+    return path
+
+# Worker entry point: build one section as its own document and return it as bytes, or write it
+# to `path` (in bounded-memory mode, to a temporary file the caller removes) and return the path.
+# A part that fails leaves no file behind.
+def build_part(name, builder, sheets, template_file, stream=False, path=None):
+    path = path or (spool_file() if bounded_memory() else None)
+    try:
+        return write_part(name, builder, sheets, template_file, stream, path)
+    except BaseException:
+        if path and os.path.exists(path):
+            os.remove(path)
+        raise
+
+def write_part(name, builder, sheets, template_file, stream, path):
+    start = time.perf_counter()
+    if stream and builder in streaming_builders:
+        if path:
+            with span(name):
+                streaming_builders[builder](sheets, template_file, path)
+            return name, path, time.perf_counter() - start
+        # Stream the section to a temporary file so the document tree never holds it whole
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "part.docx")
+            with span(name):
+                streaming_builders[builder](sheets, template_file, path)
+            with open(path, "rb") as f:
+                return name, f.read(), time.perf_counter() - start
+
+    document = Document(template_file)
+    with span(name):
+        builder(document, sheets)
+
+        with span("save") as timing:
+            target = path or BytesIO()
+            document.save(target)
+            timing.add(bytes=os.path.getsize(path) if path else target.tell())
+    return name, path or target.getvalue(), time.perf_counter() - start
+
+# Settings made in main() that pool workers must apply themselves: module globals are
+# only inherited under fork, while Windows (and macOS) start workers with spawn
+def worker_settings():
+    return {
+        "instrumentation": instrumentation_settings(),
+        "memory": memory_budget_settings(),
+        "image processing": image_processing_settings(),
+        "detail packing": detail_packing_settings(),
+        "image cache": image_cache_settings(),
+        "fetch client": fetch_client_settings(),
+        "fragment cache": fragment_cache_settings(),
+    }
+
+def apply_worker_settings(settings):
+    configure_instrumentation(*settings["instrumentation"])
+    configure_memory_budget(*settings["memory"])
+    configure_image_processing(*settings["image processing"])
+    configure_detail_packing(*settings["detail packing"])
+    # The caches are already set up when inherited under fork
+    if image_cache_settings() != settings["image cache"]:
+        enabled, cache_options = settings["image cache"]
+        configure_image_cache(enabled, **cache_options)
+    configure_fetch_client(**settings["fetch client"])
+    if fragment_cache_settings() != settings["fragment cache"]:
+        enabled, store_options = settings["fragment cache"]
+        configure_fragment_cache(enabled, **store_options)
+
+# Pool worker: apply the parent's settings, build the part and send back its spans and failed image downloads
+def build_part_with_spans(settings, name, builder, sheets, template_file, stream=False, path=None):
+    apply_worker_settings(settings)
+    take_failed_downloads()  # Only count this part's
+    return build_part(name, builder, sheets, template_file, stream, path) + (take_spans(), take_failed_downloads())
+
+# What each part of a --build-dir build depends on: its sheets, the template, its generator code and its options
+def build_targets(sheets, template_file, stream=False, options=None):
+    options = dict(options or {}, stream=stream)
+    targets = {}
+    for number, (name, builder, needed) in enumerate(sections, 1):
+        generators = [builder] + ([streaming_builders[builder]] if stream and builder in streaming_builders else [])
+        part_options = {key: options.get(key) for key in section_options.get(builder, ())}
+        targets[name] = BuildTarget(name, f"part_{number}.docx", {sheet: sheets[sheet] for sheet in needed},
+                                    template_file, generators, part_options)
+    return targets
+
+# Build the sections as separate documents in a worker pool, then merge them in report order.
+# With a build directory, parts whose inputs are unchanged since the last build are reused from it.
+def build_report_parts(excel_path, template_file, output_file, workers=None, use_cache=True, stream=False,
+                       build_dir=None, options=None, rebuild=()):
+    start = time.perf_counter()
+    sheets = load_workbook(excel_path, use_cache=use_cache)
+
+    parts, spooled, reasons = {}, [], {}
+    graph = BuildGraph(build_dir) if build_dir else None
+    if graph is not None:
+        targets = build_targets(sheets, template_file, stream, options)
+        stale, current = graph.plan(targets.values(), rebuild)
+        reasons = {target.name: reason for target, reason in stale}
+        parts.update((target.name, graph.path(target)) for target in current)
+    pending = [section for section in sections if section[0] not in parts]
+
+    # Bounded-memory mode builds one part at a time unless told otherwise
+    workers = workers or (1 if bounded_memory() else min(len(pending), os.cpu_count() or 1) or 1)
+    settings = worker_settings()
     try:
-        print(f"Running {script} to generate {part_file}...")
-        subprocess.run(["python", script, excel_path, part_file, template_file], check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error running {script}: {e}")
+        with span("build parts", parts=len(pending)), ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(build_part_with_spans, settings, name, builder,
+                            {sheet: sheets[sheet] for sheet in needed}, template_file, stream,
+                            graph.path(targets[name]) + ".tmp" if graph is not None else None)
+                for name, builder, needed in pending
+            ]
+            for future in as_completed(futures):
+                name, data, elapsed, spans, failed_images = future.result()
+                if graph is not None:
+                    # Only a finished part replaces the previous build's file
+                    os.replace(data, graph.path(targets[name]))
+                    data = graph.path(targets[name])
+                    graph.built(targets[name], reasons[name], elapsed, failed_images)
+                elif isinstance(data, str):
+                    spooled.append(data)
+                parts[name] = data
+                merge_spans(spans)
+                size = os.path.getsize(data) if isinstance(data, str) else len(data)
+                print(f"Built {name} in {elapsed:.2f}s ({size} bytes)")
+                check_memory("build parts")
+
+        merge_packages(output_file, [parts[name] if isinstance(parts[name], str) else BytesIO(parts[name])
+                                     for name, _, _ in sections])
+    finally:
+        for path in spooled:
+            os.remove(path)
+    report_broken_links(output_file)
+    if graph is not None:
+        graph.summary([name for name, _, _ in sections])
+    print(f"Total time with {workers} workers: {time.perf_counter() - start:.2f}s")
 
 # # Ensure we use the correctly formatted output from `so_we_cry.py`
 # print("Running so_we_cry.py to generate part4.docx...")
@@ -32,53 +218,165 @@ for script, part_file in scripts:
 # except subprocess.CalledProcessError as e:
 #     print(f"Error running so_we_cry.py: {e}")
 
+# Last body-level paragraph, found by walking back from the end of the body
+def last_paragraph_element(body):
+    for element in reversed(body):
+        if element.tag == qn('w:p'):
+            return element
+    return None
+
 # Function to check if the document ends at the top of a new page
 def is_cursor_at_top_of_page(doc):
-    if not doc.paragraphs:
+    last_p = last_paragraph_element(doc.element.body)
+    if last_p is None:
         return True  # Empty document = start of new page
 
-    last_para = doc.paragraphs[-1]
-    for run in last_para.runs:
-        for child in run._element:
+    for run in last_p.iterchildren(qn('w:r')):
+        for child in run:
             if child.tag == qn('w:br') and child.get(qn('w:type')) == "page":
                 return True  # Page break found
 
     return False  # No page break found, so not at the top of a page.
 
-# Merge all generated documents while preserving bookmarks and hyperlinks
+# Remove empty paragraphs from the end of the body, touching only the k elements removed
+def trim_trailing_blank_paragraphs(document):
+    body = document.element.body
+    tail = body.sectPr.getprevious() if body.sectPr is not None else (body[-1] if len(body) else None)
+    while tail is not None and tail.tag == qn('w:p') and not Paragraph(tail, document._body).text.strip():
+        previous = tail.getprevious()
+        body.remove(tail)  # ✅ Delete empty paragraphs
+        tail = previous
+
+# Give a table the grid style if it lost its style, keeping the report table styles the parts referenced
+def default_table_style(tbl):
+    if tbl.tag == qn('w:tbl') and tbl.tblPr.style is None:
+        tbl.tblPr.style = 'TableGrid'
+
+# Legacy python-docx merge (the package-level merge in docx_merge.py also carries images and links across)
 def merge_documents(output_file, parts):
     master = Document(parts[0])  # Start with the first document
-    composer = Composer(master)
+    ensure_report_styles(master)
+    for element in master.element.body.iterchildren(qn('w:tbl')):
+        default_table_style(element)
 
     for part in parts[1:]:
         # Remove trailing blank pages before adding a new section
-        while master.paragraphs and not master.paragraphs[-1].text.strip():
-            p = master.paragraphs[-1]
-            master._element.body.remove(p._element)  # ✅ Delete empty paragraphs
-
-    if not is_cursor_at_top_of_page(master):
-        master.add_page_break()
+        trim_trailing_blank_paragraphs(master)
 
-    doc_to_append = Document(part)
+        if not is_cursor_at_top_of_page(master):
+            master.add_page_break()
 
-    # Instead of using composer.append(), manually append elements to preserve hyperlinks
-    for element in doc_to_append.element.body:
-        master.element.body.append(element)  # ✅ Preserves bookmarks and hyperlinks
+        doc_to_append = Document(part)
 
-    # Reapply table style if lost
-    for table in master.tables:
-        table.style = 'Table Grid'
+        # Instead of using composer.append(), manually append elements to preserve hyperlinks
+        # Body content goes before the master's section properties; the part's own sectPr is dropped
+        master_sectPr = master.element.body.sectPr
+        for element in list(doc_to_append.element.body):
+            if element.tag == qn('w:sectPr'):
+                continue
+            default_table_style(element)
+            master_sectPr.addprevious(element)  # ✅ Preserves bookmarks and hyperlinks
 
     master.save(output_file)
     print(f"Final document '{output_file}' created successfully!")
 
-# Execute the merge
-merge_documents(output_file, [
-    "part_1.docx",  # ✅ Title pages
-    "part_2.docx",  # ✅ FP Index 
-    "part_3.docx",  # ✅ GP Index 
-    "part_4.docx",   # ✅ First Publications & Granted Patents
-])
+def parse_packing(value):
+    """'greedy' for both detail sections, or per section as 'fp=greedy,gp=category'."""
+    if "=" not in value:
+        modes = {"fp": value, "gp": value}
+    else:
+        modes = dict(item.split("=", 1) for item in value.split(","))
+    for key, mode in modes.items():
+        if key not in ("fp", "gp") or mode not in PACKING_MODES:
+            raise argparse.ArgumentTypeError(f"invalid packing {value!r}; use one of {', '.join(PACKING_MODES)}, optionally as fp=...,gp=...")
+    return modes
+
+def parse_rebuild(values, parser):
+    """Section names for --rebuild, given as part numbers (2), file names (part_2.docx) or 'all'."""
+    names = []
+    for value in values:
+        if value == "all":
+            return ["all"]
+        number = value.removeprefix("part_").removesuffix(".docx")
+        if not number.isdigit() or not 1 <= int(number) <= len(sections):
+            parser.error(f"--rebuild: unknown part {value!r}; use 1-{len(sections)}, part_N.docx or all")
+        names.append(sections[int(number) - 1][0])
+    return names
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the patent watch report.")
+    parser.add_argument("excel_path", nargs="?", default=excel_path)
+    parser.add_argument("--output", default=output_file)
+    parser.add_argument("--template", default=template_file)
+    parser.add_argument("--no-cache", action="store_true", help="Parse the workbook even if a cached copy exists")
+    parser.add_argument("--offline", action="store_true", help="Serve images only from the on-disk image cache")
+    parser.add_argument("--no-image-cache", action="store_true", help="Download every image without the on-disk image cache")
+    parser.add_argument("--no-fragment-cache", action="store_true", help="Render every record table instead of reusing unchanged ones from earlier runs")
+    parser.add_argument("--deadline", type=float, default=None, help="Stop downloading images after this many seconds")
+    parser.add_argument("--per-host-limit", type=int, default=4, help="Concurrent image requests allowed per host")
+    parser.add_argument("--parts", action="store_true", help="Build sections as separate documents in parallel, then merge")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for --parts (default: one per section, up to CPU count)")
+    parser.add_argument("--stream", action="store_true", help="Stream the detail pages to disk record by record (implies --parts)")
+    parser.add_argument("--build-dir", default=None, metavar="DIR",
+                        help="Keep the parts in DIR and rebuild only those whose sheets, template, generator code or options changed (implies --parts)")
+    parser.add_argument("--rebuild", nargs="+", default=[], metavar="PART",
+                        help="With --build-dir, rebuild these parts regardless (part numbers, file names or 'all')")
+    parser.add_argument("--image-dpi", type=int, default=DEFAULT_DPI, help=f"Resolution images are downscaled to for their display width (default {DEFAULT_DPI})")
+    parser.add_argument("--no-image-processing", action="store_true", help="Embed images as downloaded, without downscaling")
+    parser.add_argument("--packing", type=parse_packing, default=None,
+                        help=f"Detail page packing ({', '.join(PACKING_MODES)}), or per section as fp=greedy,gp=category")
+    parser.add_argument("--timings", action="store_true", help="Time each stage and write a JSON summary next to the output")
+    parser.add_argument("--profile", metavar="DIR", default=None, help="Also dump a cProfile .pstats file per stage into DIR (implies --timings)")
+    parser.add_argument("--timings-file", default=None, help="Where to write the JSON timing summary (default: <output>.timings.json)")
+    parser.add_argument("--memory", action="store_true", help="Record resident memory and its high-water mark per stage (implies --timings)")
+    parser.add_argument("--trace-memory", type=int, nargs="?", const=10, default=0, metavar="N",
+                        help="Trace each top-level stage with tracemalloc and report its N top allocating lines (default 10; implies --memory)")
+    parser.add_argument("--bounded-memory", action="store_true",
+                        help="Drop image bytes once embedded, release columns no later section reads and build parts one at a time (implies --stream)")
+    parser.add_argument("--memory-ceiling", type=float, default=None, metavar="MB",
+                        help="Stop with an error when a process's resident memory goes over this many MB")
+    args = parser.parse_args()
+    if (args.memory_ceiling or args.memory or args.trace_memory) and current_rss() is None:
+        if args.memory_ceiling:
+            parser.error("--memory-ceiling cannot be enforced: resident memory cannot be read on this platform (install psutil)")
+        print("Warning: resident memory cannot be read on this platform (install psutil); memory columns will be empty")
+
+    instrumented = args.timings or args.profile or args.memory or args.trace_memory
+    if instrumented:
+        configure_instrumentation(profile_dir=args.profile, memory=args.memory, trace_top=args.trace_memory)
+    configure_memory_budget(bounded=args.bounded_memory, ceiling_mb=args.memory_ceiling)
+
+    configure_fetch_client(deadline=args.deadline, per_host_limit=args.per_host_limit)
+    if args.no_image_cache or args.offline:
+        configure_image_cache(enabled=not args.no_image_cache, offline=args.offline)
+    if args.no_fragment_cache:
+        configure_fragment_cache(enabled=False)
+    configure_image_processing(dpi=args.image_dpi, enabled=not args.no_image_processing)
+    if args.packing:
+        configure_detail_packing(first_publications=args.packing.get("fp"), granted_patents=args.packing.get("gp"))
+
+    stream = args.stream or args.bounded_memory
+    # Settings that change a part's contents, so a --build-dir build rebuilds parts when they change.
+    # Packing is recorded as the modes in effect, so naming the default is not a change.
+    packing = dict(zip(("fp", "gp"), detail_packing_settings()))
+    options = {"packing": packing, "image_dpi": args.image_dpi, "image_processing": not args.no_image_processing}
+    try:
+        if args.parts or stream or args.build_dir:
+            build_report_parts(args.excel_path, args.template, args.output, workers=args.workers,
+                               use_cache=not args.no_cache, stream=stream, build_dir=args.build_dir,
+                               options=options, rebuild=parse_rebuild(args.rebuild, parser))
+        else:
+            build_report(args.excel_path, args.template, args.output, use_cache=not args.no_cache)
+    except MemoryCeilingExceeded as e:
+        parser.exit(2, f"error: {e}\n")
+    finally:
+        # Written even when the build stops, to show which stage the memory went to
+        if instrumented:
+            log_summary()
+            write_summary(args.timings_file or f"{args.output}.timings.json")
+
+if __name__ == "__main__":
+    main()
 
 # import subprocess
 # from docx import Document
@@ -0,0 +1,155 @@
+import gc
+import logging
+import os
+import sys
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# Process Memory
+# ------------------------------
+
+MB = 1024 * 1024
+
+_page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+if sys.platform == 'win32':
+    import ctypes
+    from ctypes import wintypes
+
+    class _ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [
+            ('cb', wintypes.DWORD),
+            ('PageFaultCount', wintypes.DWORD),
+            ('PeakWorkingSetSize', ctypes.c_size_t),
+            ('WorkingSetSize', ctypes.c_size_t),
+            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+            ('PagefileUsage', ctypes.c_size_t),
+            ('PeakPagefileUsage', ctypes.c_size_t),
+        ]
+
+    _get_current_process = ctypes.WinDLL('kernel32').GetCurrentProcess
+    _get_current_process.restype = wintypes.HANDLE
+    _get_process_memory_info = ctypes.WinDLL('psapi').GetProcessMemoryInfo
+    _get_process_memory_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(_ProcessMemoryCounters), wintypes.DWORD]
+    _get_process_memory_info.restype = wintypes.BOOL
+
+    def _working_set():
+        """(current, peak) working set of this process in bytes, or None if the call fails."""
+        counters = _ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        if not _get_process_memory_info(_get_current_process(), ctypes.byref(counters), counters.cb):
+            return None
+        return counters.WorkingSetSize, counters.PeakWorkingSetSize
+else:
+    def _working_set():
+        return None
+
+
+def current_rss():
+    """Resident set size (working set on Windows) of this process in bytes, or None where it cannot be read."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _page_size
+    except (OSError, IndexError, ValueError):
+        pass
+    working_set = _working_set()
+    if working_set is not None:
+        return working_set[0]
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def peak_rss():
+    """High-water resident set size of this process in bytes, or None where unavailable."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024  # Linux reports KiB
+    working_set = _working_set()
+    if working_set is not None:
+        return working_set[1]
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return getattr(psutil.Process().memory_info(), 'peak_wset', None)
+
+
+def memory_usage():
+    """(current, peak) resident set size in bytes; either may be None."""
+    return current_rss(), peak_rss()
+
+
+# ------------------------------
+# Bounded-Memory Mode
+# ------------------------------
+
+class MemoryCeilingExceeded(MemoryError):
+    """The process grew past the configured memory ceiling."""
+
+
+_bounded = False
+_ceiling = None  # Bytes
+
+
+def configure_memory_budget(bounded=False, ceiling_mb=None):
+    """
+    Turn bounded-memory rendering on or off and set the ceiling (in MB of resident memory
+    per process) that check_memory() enforces; None disables the ceiling.
+    """
+    global _bounded, _ceiling
+    _bounded = bounded
+    _ceiling = int(ceiling_mb * MB) if ceiling_mb else None
+
+
+def memory_budget_settings():
+    """(bounded, ceiling_mb), for handing the configuration to worker processes."""
+    return _bounded, _ceiling / MB if _ceiling else None
+
+
+def bounded_memory():
+    return _bounded
+
+
+def check_memory(stage):
+    """Raise MemoryCeilingExceeded when resident memory is over the ceiling; free when none is set."""
+    if _ceiling is None:
+        return
+    rss = current_rss()
+    if rss is None or rss <= _ceiling:
+        return
+    gc.collect()  # Garbage cycles may be all that is over
+    rss = current_rss()
+    if rss > _ceiling:
+        advice = "raise --memory-ceiling" if _bounded else "use --bounded-memory or raise --memory-ceiling"
+        raise MemoryCeilingExceeded(
+            f"{stage}: process {os.getpid()} is using {rss / MB:,.0f} MB, over the "
+            f"{_ceiling / MB:,.0f} MB memory ceiling; {advice}"
+        )
+
+
+def release_image(images, url):
+    """In bounded mode, drop an image's bytes from the prefetched images once it is embedded."""
+    if _bounded and images is not None:
+        images.pop(url, None)
+
+
+def release_columns(df, columns):
+    """In bounded mode, drop columns no later section reads from a DataFrame (in place)."""
+    if not _bounded:
+        return
+    present = [column for column in columns if column in df.columns]
+    if present:
+        df.drop(columns=present, inplace=True)
+        logger.debug(f"Released columns {', '.join(present)}")
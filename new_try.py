@@ -8,6 +8,7 @@ from docx.oxml import OxmlElement, parse_xml
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 from docx.enum.table import WD_CELL_VERTICAL_ALIGNMENT
 import requests
+from image_fetch import get_image_bytes
 from io import BytesIO
 from PIL import Image
 from datetime import datetime
@@ -22,7 +23,7 @@ def resize_image(image_stream, fixed_height=4.5):
     aspect_ratio = original_width / original_height
     new_height = int(fixed_height * 1440)
     new_width = int(new_height * aspect_ratio)
-    resized_img = img.resize((new_width, new_height), Image.ANTIALIAS)
+    resized_img = img.resize((new_width, new_height), Image.LANCZOS)
     return resized_img, new_width, new_height
 
 def set_cell_margins(cell, top=20, start=20, bottom=20, end=20):
@@ -257,9 +258,7 @@ def process_records(df, headings):
         if family_number and not sheet1_df[sheet1_df['Family number'] == family_number].empty:
             image_link = sheet1_df.loc[sheet1_df['Family number'] == family_number, 'Image'].values[0]
             try:
-                response = requests.get(image_link)
-                response.raise_for_status()
-                image_stream = BytesIO(response.content)
+                image_stream = BytesIO(get_image_bytes(image_link))  # Served from the image cache when fresh
                 p = image_cell.paragraphs[0]
                 p.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
                 run = p.add_run()
@@ -0,0 +1,87 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# Detail Page Packing
+# ------------------------------
+
+ONE_PER_PAGE = 'one-per-page'  # Every record starts a new page (the original layout)
+GREEDY = 'greedy'              # Records share a page while the next one fits, in sheet order
+CATEGORY = 'category'          # Like greedy, but a new category always starts a new page
+PACKING_MODES = (ONE_PER_PAGE, GREEDY, CATEGORY)
+
+
+class PagePlan:
+    """Page assignment for a run of records: breaks[i] is True when record i starts a new page."""
+
+    def __init__(self, breaks, pages, baseline_pages, mode):
+        self.breaks = breaks
+        self.pages = pages
+        self.baseline_pages = baseline_pages
+        self.mode = mode
+
+    @property
+    def pages_saved(self):
+        return self.baseline_pages - self.pages
+
+    def summary(self, label='Records'):
+        return (f"{label}: {len(self.breaks)} records on {self.pages} pages with {self.mode} packing "
+                f"({self.pages_saved} fewer than one per page)")
+
+
+def _layout(heights, page_height, first_page_used, page_header, gap, starts_page):
+    """Walk the records in order; returns (breaks, pages). Records are never split: one
+    taller than a page flows over as many pages as it needs, and packing carries on from
+    where it ends on its last page."""
+    breaks = np.zeros(len(heights), dtype=bool)
+    used, pages = first_page_used, 1
+    for i, height in enumerate(heights):
+        if i > 0:
+            if starts_page(i) or used + gap + height > page_height:
+                breaks[i] = True
+                pages += 1
+                used = page_header
+            else:
+                used += gap
+        used += height
+        while used > page_height:
+            pages += 1
+            used -= page_height
+    return breaks, pages
+
+
+def pack_records(heights, page_height, mode=ONE_PER_PAGE, categories=None, first_page_used=0.0,
+                 page_header=0.0, gap=0.0):
+    """
+    Assign records (in their given order) to pages.
+
+    heights: measured record heights; page_height: usable page height (same units)
+    first_page_used: space taken on the first page before the first record (section heading)
+    page_header: space taken at the top of every page a break starts (the <<INDEX line)
+    gap: space between two records sharing a page (the paragraph that keeps tables apart)
+    categories: per-record category labels, required for CATEGORY mode
+    """
+    if mode not in PACKING_MODES:
+        raise ValueError(f"Unknown packing mode {mode!r}; expected one of {', '.join(PACKING_MODES)}")
+    heights = np.asarray(heights, dtype=float)
+
+    def every_record(i):
+        return True
+
+    def new_category(i):
+        return categories[i] != categories[i - 1]
+
+    def never(i):
+        return False
+
+    baseline = _layout(heights, page_height, first_page_used, page_header, gap, every_record)
+    if mode == ONE_PER_PAGE:
+        breaks, pages = baseline
+    else:
+        if mode == CATEGORY and categories is None:
+            raise ValueError("Category packing needs the record categories")
+        breaks, pages = _layout(heights, page_height, first_page_used, page_header, gap,
+                                new_category if mode == CATEGORY else never)
+    return PagePlan(breaks, pages, baseline[1], mode)
@@ -0,0 +1,97 @@
+import copy
+import pandas as pd
+from docx.shared import Inches
+from docx.enum.table import WD_ALIGN_VERTICAL
+from docx.oxml.ns import qn
+from docx.table import Table, _Cell
+from docx.text.paragraph import Paragraph
+from bookmarks import get_bookmark_registry
+
+# ------------------------------
+# Record Table Stamping
+# ------------------------------
+
+LEFT_COLUMN_WIDTH = Inches(1.38)
+RIGHT_COLUMN_WIDTH = Inches(5.61)
+
+
+class RecordTableStamper:
+    """
+    Renders the 2-column detail table for a record from a compiled prototype.
+    The layout (style, grid, widths, labels, alignment) is built once with python-docx;
+    each record deep-copies the prototype and only fills in the value runs.
+    When `bookmark_field` is given, each table is bookmarked under that field's value
+    so the index links land on it.
+    """
+
+    def __init__(self, document, headers, link_field='Patent Link', bookmark_field=None):
+        self.document = document
+        self.headers = list(headers)
+        self.link_row = self.headers.index(link_field) if link_field in self.headers else None
+        self.link_field = link_field
+        self.bookmark_field = bookmark_field
+
+        # Build the prototype in the target document so styles resolve the same way
+        table = document.add_table(rows=0, cols=2)
+        table.style = 'Table Grid'
+        table.columns[0].width = LEFT_COLUMN_WIDTH
+        table.columns[1].width = RIGHT_COLUMN_WIDTH
+
+        for header in self.headers:
+            row_cells = table.add_row().cells
+            row_cells[0].text = header
+            row_cells[0].vertical_alignment = WD_ALIGN_VERTICAL.TOP
+            row_cells[1].text = ""
+            row_cells[1].vertical_alignment = WD_ALIGN_VERTICAL.TOP
+
+        image_cells = table.add_row().cells
+        image_cells[0].text = "Image"
+        image_cells[0].vertical_alignment = WD_ALIGN_VERTICAL.TOP
+
+        self._tbl = table._tbl
+        self._image_tr = self._tbl.tr_lst[-1]
+        self._tbl.remove(self._image_tr)
+        self._tbl.getparent().remove(self._tbl)
+
+    def _body_element(self):
+        return self.document.element.body
+
+    def values(self, record):
+        """The text each value cell shows for a record (before the link cell becomes a hyperlink)."""
+        texts = []
+        for header in self.headers:
+            value = record.get(header, "")
+            texts.append(str(value) if pd.notna(value) else "")
+        return texts
+
+    def bookmark(self, record):
+        """The number a record's table is bookmarked under, or None."""
+        number = record.get(self.bookmark_field) if self.bookmark_field else None
+        return number if number is not None and pd.notna(number) else None
+
+    def stamp(self, record):
+        """Append a filled copy of the prototype for one record and return it as a Table."""
+        tbl = copy.deepcopy(self._tbl)
+
+        # The value run is the only run in each row's right-hand cell
+        for tr, text in zip(tbl.tr_lst, self.values(record)):
+            value_run = next(tr.tc_lst[1].iter(qn('w:r')))
+            value_run.text = text
+
+        self._body_element()._insert_tbl(tbl)
+
+        number = self.bookmark(record)
+        if number is not None:
+            get_bookmark_registry(self.document).add(tbl.tr_lst[0].tc_lst[0].p_lst[0], number)
+        return Table(tbl, self.document._body)
+
+    def link_paragraph(self, table):
+        """Paragraph holding the link value, for swapping in a hyperlink."""
+        tc = table._tbl.tr_lst[self.link_row].tc_lst[1]
+        return Paragraph(tc.p_lst[0], table._parent)
+
+    def add_image_row(self, table):
+        """Append the 'Image' row and return its right-hand cell."""
+        tr = copy.deepcopy(self._image_tr)
+        table._tbl.append(tr)
+        return _Cell(tr.tc_lst[1], table)
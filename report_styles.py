@@ -0,0 +1,96 @@
+import sys
+from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+
+# ------------------------------
+# Report Style Registry
+# ------------------------------
+
+# Style names used by the builders; python-docx resolves them to the style IDs below
+REPORT_TABLE = 'PW Report Table'      # Single black borders on every edge, 10pt single-spaced text in every cell
+TABLE_HEADER = 'PW Table Header'      # 10pt bold centered (index header rows)
+CATEGORY_ROW = 'PW Category Row'      # 10pt bold left ('> CATEGORY' rows)
+CELL_CENTERED = 'PW Cell Centered'    # 10pt centered (company, category and value tables)
+DETAIL_TEXT = 'PW Detail Text'        # 10pt Calibri, indented like List Paragraph (detail table cells)
+INTERNAL_LINK = 'Hyperlink'           # Blue underlined link runs
+
+_BORDERS = ''.join(
+    f'<w:{edge} w:val="single" w:sz="4" w:space="0" w:color="000000"/>'
+    for edge in ['top', 'left', 'bottom', 'right', 'insideH', 'insideV']
+)
+
+# Style ID -> w:style definition, added to styles.xml when the document lacks it
+REPORT_STYLES = {
+    'PWReportTable': (
+        f'<w:style {nsdecls("w")} w:type="table" w:customStyle="1" w:styleId="PWReportTable">'
+        f'<w:name w:val="{REPORT_TABLE}"/><w:basedOn w:val="TableNormal"/>'
+        '<w:pPr><w:spacing w:after="0" w:line="240" w:lineRule="auto"/></w:pPr>'  # As Table Grid
+        '<w:rPr><w:sz w:val="20"/></w:rPr>'
+        f'<w:tblPr><w:tblBorders>{_BORDERS}</w:tblBorders></w:tblPr>'
+        '</w:style>'
+    ),
+    'PWTableHeader': (
+        f'<w:style {nsdecls("w")} w:type="paragraph" w:customStyle="1" w:styleId="PWTableHeader">'
+        f'<w:name w:val="{TABLE_HEADER}"/><w:basedOn w:val="Normal"/><w:qFormat/>'
+        '<w:pPr><w:jc w:val="center"/></w:pPr>'
+        '<w:rPr><w:b/><w:sz w:val="20"/></w:rPr>'
+        '</w:style>'
+    ),
+    'PWCategoryRow': (
+        f'<w:style {nsdecls("w")} w:type="paragraph" w:customStyle="1" w:styleId="PWCategoryRow">'
+        f'<w:name w:val="{CATEGORY_ROW}"/><w:basedOn w:val="Normal"/><w:qFormat/>'
+        '<w:pPr><w:jc w:val="left"/></w:pPr>'
+        '<w:rPr><w:b/><w:sz w:val="20"/></w:rPr>'
+        '</w:style>'
+    ),
+    'PWCellCentered': (
+        f'<w:style {nsdecls("w")} w:type="paragraph" w:customStyle="1" w:styleId="PWCellCentered">'
+        f'<w:name w:val="{CELL_CENTERED}"/><w:basedOn w:val="Normal"/><w:qFormat/>'
+        '<w:pPr><w:jc w:val="center"/></w:pPr>'
+        '<w:rPr><w:sz w:val="20"/></w:rPr>'
+        '</w:style>'
+    ),
+    'PWDetailText': (
+        f'<w:style {nsdecls("w")} w:type="paragraph" w:customStyle="1" w:styleId="PWDetailText">'
+        f'<w:name w:val="{DETAIL_TEXT}"/><w:basedOn w:val="Normal"/><w:qFormat/>'
+        '<w:pPr><w:ind w:left="720"/><w:contextualSpacing/></w:pPr>'
+        '<w:rPr><w:rFonts w:ascii="Calibri" w:hAnsi="Calibri"/><w:sz w:val="20"/></w:rPr>'
+        '</w:style>'
+    ),
+    'Hyperlink': (
+        f'<w:style {nsdecls("w")} w:type="character" w:styleId="Hyperlink">'
+        f'<w:name w:val="{INTERNAL_LINK}"/><w:basedOn w:val="DefaultParagraphFont"/><w:unhideWhenUsed/>'
+        '<w:rPr><w:color w:val="0000FF"/><w:u w:val="single"/></w:rPr>'
+        '</w:style>'
+    ),
+}
+
+
+def ensure_report_styles(document):
+    """Add any report style the document's styles.xml is missing; safe to call repeatedly."""
+    styles = document.styles.element
+    for style_id, xml in REPORT_STYLES.items():
+        if styles.get_by_id(style_id) is None:
+            styles.append(parse_xml(xml))
+    return document
+
+
+def set_table_style(table, style_name=REPORT_TABLE):
+    """Reference a report table style instead of writing w:tblBorders and run sizes into the table."""
+    ensure_report_styles(table.part.document)
+    table.style = style_name
+
+
+# ------------------------------
+# Script Execution
+# ------------------------------
+
+if __name__ == "__main__":
+    # Bake the registry into a template: python report_styles.py basic_page_template.docx [output.docx]
+    template_file = sys.argv[1]
+    output_file = sys.argv[2] if len(sys.argv) > 2 else template_file
+
+    document = ensure_report_styles(Document(template_file))
+    document.save(output_file)
+    print(f"Report styles written to {output_file}")
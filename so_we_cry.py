@@ -12,6 +12,9 @@ import logging
 import requests
 from io import BytesIO
 from PIL import Image
+from workbook_loader import load_workbook
+from image_resolver import get_image_resolver
+from report_styles import ensure_report_styles, set_table_style, REPORT_TABLE
 
 
 # Set up logging
@@ -29,15 +32,10 @@ def add_hyperlink(paragraph, text, url):
     run = OxmlElement('w:r')
     rPr = OxmlElement('w:rPr')
     
-    # Add underline
-    underline = OxmlElement('w:u')
-    underline.set(qn('w:val'), 'single')
-    rPr.append(underline)
-    
-    # Add blue color
-    color = OxmlElement('w:color')
-    color.set(qn('w:val'), '0000FF')
-    rPr.append(color)
+    # Blue underline from the shared hyperlink character style
+    rStyle = OxmlElement('w:rStyle')
+    rStyle.set(qn('w:val'), 'Hyperlink')
+    rPr.append(rStyle)
     
     run.append(rPr)
     t = OxmlElement('w:t')
@@ -53,22 +51,8 @@ def set_column_widths(table, left_width, right_width):
         row.cells[1].width = right_width
 
 def add_table_borders(table):
-    """Add borders to a table."""
-    tbl = table._tbl  # Get the table XML element
-    for cell in tbl.iter(qn('w:tc')):
-        tcPr = cell.find(qn('w:tcPr'))
-        if tcPr is None:
-            tcPr = OxmlElement('w:tcPr')
-            cell.insert(0, tcPr)
-        tcBorders = OxmlElement('w:tcBorders')
-        for border_name in ['top', 'left', 'bottom', 'right']:
-            border = OxmlElement(f'w:{border_name}')
-            border.set(qn('w:val'), 'single')
-            border.set(qn('w:sz'), '4')  # Border size
-            border.set(qn('w:space'), '0')
-            border.set(qn('w:color'), '000000')  # Black color
-            tcBorders.append(border)
-        tcPr.append(tcBorders)
+    """Add borders to a table through the bordered table style instead of per-cell w:tcBorders."""
+    set_table_style(table, REPORT_TABLE)
 
 def create_first_publications_section(document, df, df_images):
     """Create the First Publications section in the document."""
@@ -148,11 +132,7 @@ def create_first_publications_section(document, df, df_images):
             add_hyperlink(pdf_para, "Link", row['Patent Link'])
         
         # Lookup Image URL from Sheet1 using Family number
-        image_url = None
-        if "Family number" in row and pd.notna(row["Family number"]):
-            image_row = df_images[df_images['Family number'] == row['Family number']]
-            if not image_row.empty:
-                image_url = image_row.iloc[0]['Image']
+        image_url = get_image_resolver(df_images).resolve(row)
 
         # Insert Image Row Below Abstract
         if image_url:
@@ -254,11 +234,7 @@ def process_record(document, record, headers, df_images, mode="first"):
         add_hyperlink(pdf_para, "Link", record['Patent Link'])
     
     # Lookup Image URL from Sheet1 using Family number
-    image_url = None
-    if "Family number" in record and pd.notna(record["Family number"]):
-        image_row = df_images[df_images['Family number'] == record['Family number']]
-        if not image_row.empty:
-            image_url = image_row.iloc[0]['Image']
+    image_url = get_image_resolver(df_images).resolve(record)
 
     # Insert Image Row Below Abstract
     if image_url:
@@ -270,13 +246,14 @@ def main():
     try:
         # Load Excel sheets
         excel_path = sys.argv[1] if len(sys.argv) > 1 else r'C:\Users\Ayman\Documents\Abhijit_mail_attachments\Test_PW.xlsm'
-        df_fp = pd.read_excel(excel_path, sheet_name="First Publication")
-        df_granted = pd.read_excel(excel_path, sheet_name="Granted")
-        df_images = pd.read_excel(excel_path, sheet_name="Sheet1")
+        sheets = load_workbook(excel_path, ["First Publication", "Granted", "Sheet1"])
+        df_fp = sheets["First Publication"]
+        df_granted = sheets["Granted"]
+        df_images = sheets["Sheet1"]
         
         # Load the template document
         template_file = "basic_page_template.docx"
-        document = Document(template_file)
+        document = ensure_report_styles(Document(template_file))
         
         # Create the First Publications section
         create_first_publications_section(document, df_fp, df_images)
@@ -14,6 +14,12 @@ import os
 import logging
 import urllib.parse
 import tempfile  # Added for temporary file handling
+from workbook_loader import load_workbook
+from image_fetch import collect_image_urls, prefetch_images
+from image_processing import normalize_image, normalize_images
+from http_client import get_fetch_client
+from image_resolver import get_image_resolver
+from report_styles import ensure_report_styles, DETAIL_TEXT
 
 # Enhanced logging setup
 logging.basicConfig(
@@ -36,13 +42,19 @@ class PatentDocumentFormatter:
     PAGE_WIDTH = Twips(12240)
     PAGE_HEIGHT = Twips(15840)
     MARGIN = Twips(1440)
+    IMAGE_REQUEST_HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+        'Accept': 'image/jpeg,image/png,image/*'
+    }
     
     def __init__(self, template_path):
+        self.images = {}  # Prefetched image bytes keyed by cleaned URL
         try:
             if not os.path.exists(template_path):
                 raise FileNotFoundError(f"Template file not found: {template_path}")
             self.doc = Document(template_path)
             self._setup_document_properties()
+            ensure_report_styles(self.doc)
             logger.info("Document formatter initialized successfully")
         except Exception as e:
             logger.error(f"Error initializing document formatter: {e}")
@@ -141,6 +153,17 @@ class PatentDocumentFormatter:
         hyperlink.append(run._element)
         paragraph._p.append(hyperlink)
 
+    @staticmethod
+    def clean_image_url(image_url):
+        """Percent-encode the path and query of an image URL"""
+        parsed_url = urllib.parse.urlparse(image_url)
+        return urllib.parse.urlunparse(
+            parsed_url._replace(
+                path=urllib.parse.quote(parsed_url.path),
+                query=urllib.parse.quote(parsed_url.query, safe='=&')
+            )
+        )
+
     def process_image(self, image_url, max_width):
         """
         Download, resize, and return an image for insertion in Word.
@@ -152,48 +175,27 @@ class PatentDocumentFormatter:
 
         try:
             # Clean and encode the URL properly
-            parsed_url = urllib.parse.urlparse(image_url)
-            cleaned_url = urllib.parse.urlunparse(
-                parsed_url._replace(
-                    path=urllib.parse.quote(parsed_url.path),
-                    query=urllib.parse.quote(parsed_url.query, safe='=&')
-                )
-            )
+            cleaned_url = self.clean_image_url(image_url)
 
-            logger.debug(f"Fetching image from: {cleaned_url}")
-
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                'Accept': 'image/jpeg,image/png,image/*'
-            }
-
-            # Use a named temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
-                temp_path = tmp_file.name  # Get the temporary file path
-                
-                response = requests.get(cleaned_url, timeout=30, headers=headers, stream=True)
+            if self.images.get(cleaned_url):
+                # Already downloaded (and normalized) by the prefetch stage
+                content = self.images[cleaned_url]
+            else:
+                logger.debug(f"Fetching image from: {cleaned_url}")
+                response = get_fetch_client().get(cleaned_url, headers=self.IMAGE_REQUEST_HEADERS)
                 response.raise_for_status()
+                content = response.content
 
-                for chunk in response.iter_content(chunk_size=8192):
-                    tmp_file.write(chunk)
-            
-            # Open the image and close it immediately after processing
-            with Image.open(temp_path) as img:
-                if img.mode in ('RGBA', 'LA'):
-                    background = Image.new('RGB', img.size, 'white')
-                    background.paste(img, mask=img.split()[-1])
-                    img = background
-
-                aspect_ratio = img.width / img.height
-                new_width = min(max_width.inches * 72, img.width)
-                new_height = new_width / aspect_ratio
-
-                img = img.resize((int(new_width), int(new_height)), Image.LANCZOS)
+            # Downscale to the column width, keeping the source format when Word can show it
+            content = normalize_image(content, max_width.inches)
+            with Image.open(BytesIO(content)) as img:
+                suffix = '.jpg' if img.format == 'JPEG' else f'.{img.format.lower()}'
 
-                # Save the processed image back to the temporary file
-                img.save(temp_path, format='JPEG', quality=95, optimize=True)
+            # Use a named temporary file
+            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+                tmp_file.write(content)
 
-            return temp_path  # Return the temporary file path
+            return tmp_file.name  # Return the temporary file path
 
         except requests.exceptions.SSLError as e:
             logger.error(f"SSL Error while fetching image: {e}")
@@ -257,14 +259,13 @@ class PatentDocumentFormatter:
         tcPr.append(margins_xml)
         self.set_cell_border(cell)
         
+        # Calibri 10pt comes from the detail text style rather than every run
+        detail_style = self.doc.styles[DETAIL_TEXT]
         for paragraph in cell.paragraphs:
-            paragraph.style = self.doc.styles['ListParagraph']
+            paragraph.style = detail_style
             paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
-            for run in paragraph.runs:
-                run.font.name = 'Calibri'
-                run.font.size = self.STANDARD_FONT_SIZE
 
-    def create_patent_table(self, data_row, family_to_image, remaining_space):
+    def create_patent_table(self, data_row, image_resolver, remaining_space):
         """Creates a patent table ensuring proper spacing and avoiding page breaks."""
         try:
             fields = [
@@ -276,8 +277,7 @@ class PatentDocumentFormatter:
             table = self.doc.add_table(rows=len(fields), cols=2)
             table.allow_autofit = False
             
-            family_number = data_row.get("Family number")
-            image_url = family_to_image.get(family_number, None)  # Get image URL using family number
+            image_url = image_resolver.resolve(data_row)  # Hashed lookup by family number, then publication/patent no
             
             for i, field in enumerate(fields):
                 try:
@@ -326,33 +326,34 @@ class PatentDocumentFormatter:
                 raise FileNotFoundError(f"Excel file not found: {excel_path}")
                 
             logger.info(f"Starting document creation from {excel_path}")
-            xl = pd.ExcelFile(excel_path)
-            
-            # Verify required sheets exist
-            required_sheets = ["First Publication", "Granted", "Sheet1"]
-            missing_sheets = [sheet for sheet in required_sheets if sheet not in xl.sheet_names]
-            if missing_sheets:
-                raise ValueError(f"Missing required sheets: {', '.join(missing_sheets)}")
+            # Open the workbook once; the loader verifies the required sheets exist
+            sheets = load_workbook(excel_path, ["First Publication", "Granted", "Sheet1"])
+            first_pub_df = sheets["First Publication"]
+            granted_df = sheets["Granted"]
+            images_df = sheets["Sheet1"]
             
-            first_pub_df = xl.parse("First Publication")
-            granted_df = xl.parse("Granted")
-            images_df = xl.parse("Sheet1")
+            # Hashed Sheet1 lookup built once for all records
+            image_resolver = get_image_resolver(images_df)
             
-            # Create Family Number to Image URL Mapping
-            family_to_image = dict(zip(images_df["Family number"], images_df["Image"]))
+            # Download every image concurrently before building tables
+            image_urls = collect_image_urls(images_df, first_pub_df) + collect_image_urls(images_df, granted_df)
+            self.images = prefetch_images([self.clean_image_url(url) for url in image_urls], headers=self.IMAGE_REQUEST_HEADERS)
+            self.images = normalize_images(self.images, self.RIGHT_COLUMN_WIDTH.inches)
             
             self.add_section_heading("FIRST PUBLICATIONS")
             for idx, row in first_pub_df.iterrows():
                 logger.debug(f"Processing First Publication row {idx}")
-                self.create_patent_table(row, family_to_image, self.PAGE_HEIGHT.twips - self.MARGIN.twips)
+                self.create_patent_table(row, image_resolver, self.PAGE_HEIGHT.twips - self.MARGIN.twips)
                 self.doc.add_page_break()
             
             self.add_section_heading("GRANTED PATENTS")
             for idx, row in granted_df.iterrows():
                 logger.debug(f"Processing Granted Patent row {idx}")
-                self.create_patent_table(row, family_to_image, self.PAGE_HEIGHT.twips - self.MARGIN.twips)
+                self.create_patent_table(row, image_resolver, self.PAGE_HEIGHT.twips - self.MARGIN.twips)
                 self.doc.add_page_break()
             
+            image_resolver.report_missing()
+            
             # Ensure output directory exists
             os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
             
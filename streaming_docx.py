@@ -0,0 +1,259 @@
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from docx import Document
+from docx.image.image import Image as DocxImage
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.oxml import serialize_part_xml
+from docx.oxml.ns import qn
+from docx.oxml.shape import CT_Inline
+from docx.shared import Emu
+from lxml import etree
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# Streaming DOCX Writer
+# ------------------------------
+
+DOCUMENT_PART = 'word/document.xml'
+DOCUMENT_RELS = 'word/_rels/document.xml.rels'
+STYLES_PART = 'word/styles.xml'
+CONTENT_TYPES = '[Content_Types].xml'
+
+PACKAGE_RELS_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+CONTENT_TYPES_NS = 'http://schemas.openxmlformats.org/package/2006/content-types'
+
+_XMLNS_DECLARATION = re.compile(rb' xmlns(?::([\w.-]+))?="([^"]*)"')
+
+# Media formats that are already compressed; deflating them again costs time for no space
+STORED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+
+
+def media_compression(name, default=zipfile.ZIP_DEFLATED):
+    """Zip compression for a package member: stored for compressed images, `default` otherwise."""
+    return zipfile.ZIP_STORED if name.rsplit('.', 1)[-1].lower() in STORED_EXTENSIONS else default
+
+
+def root_namespaces(element):
+    """Namespace declarations of a root element as {prefix bytes: uri bytes}, for serialize_element."""
+    return {(prefix.encode() if prefix else None): uri.encode() for prefix, uri in element.nsmap.items()}
+
+
+def serialize_element(element, root_ns):
+    """
+    Serialize a body element for splicing under a root that already declares `root_ns`.
+    lxml repeats every in-scope namespace on a subtree's root; the declarations the
+    root already carries are dropped, any others are kept.
+    """
+    xml = etree.tostring(element, encoding='UTF-8')
+    end = xml.index(b'>')
+    head = _XMLNS_DECLARATION.sub(
+        lambda m: b'' if root_ns.get(m.group(1)) == m.group(2) else m.group(0),
+        xml[:end]
+    )
+    return head + xml[end:]
+
+
+def scaled_dimensions(native_cx, native_cy, width=None, height=None):
+    """Picture extent in EMU, scaling a missing side to keep the aspect ratio (as python-docx does)."""
+    if width is None and height is None:
+        return Emu(native_cx), Emu(native_cy)
+    if width is None:
+        width = round(native_cx * float(height) / float(native_cy))
+    if height is None:
+        height = round(native_cy * float(width) / float(native_cx))
+    return Emu(width), Emu(height)
+
+
+class StreamingDocxWriter:
+    """
+    Writes a .docx whose body is streamed into word/document.xml as it is produced.
+
+    `document` is a scratch python-docx Document opened on the template: builders add
+    paragraphs and tables to it as usual, and `flush()` serializes the body elements
+    into the zip entry and drops them, so only the current record stays in memory.
+    Hyperlinks and pictures must go through `relate_hyperlink` / `add_picture` so their
+    relationships and media are written to the output package. Template parts are
+    copied byte-for-byte, apart from styles.xml (which carries any styles registered on
+    the scratch document) and the document relationships and content types, which
+    get the new entries appended.
+    """
+
+    def __init__(self, template_path, output_path, compression=zipfile.ZIP_DEFLATED):
+        self.template_path = template_path
+        self.output_path = output_path
+        self.document = Document(template_path)
+        self.bytes_written = 0
+        self.elements_written = 0
+
+        self._template = zipfile.ZipFile(template_path)
+        self._zip = zipfile.ZipFile(output_path, 'w', compression=compression)
+        self._media_dir = tempfile.mkdtemp(prefix='docx_media_')
+        self._media = {}  # sha256 -> (rId, part name, staged path, (ext, content type, native cx, native cy))
+        self._hyperlinks = {}  # url -> rId
+        self._new_rels = []  # (rId, type, target, external)
+
+        rels = etree.fromstring(self._template.read(DOCUMENT_RELS))
+        used_ids = [int(rel.get('Id')[3:]) for rel in rels if re.fullmatch(r'rId\d+', rel.get('Id', ''))]
+        self._next_rid = max(used_ids, default=0) + 1
+        self._next_shape_id = max(
+            (int(value) for value in self.document.element.body.xpath('.//wp:docPr/@id') if value.isdigit()),
+            default=0
+        ) + 1
+
+        # Template parts that are not rewritten go straight across
+        for info in self._template.infolist():
+            if info.filename not in (DOCUMENT_PART, DOCUMENT_RELS, STYLES_PART, CONTENT_TYPES):
+                self._zip.writestr(info, self._template.read(info.filename))
+
+        # Everything before the first body child comes verbatim from the template
+        template_xml = self._template.read(DOCUMENT_PART)
+        body_start = re.search(rb'<w:body>', template_xml)
+        if body_start is None:
+            raise ValueError(f"{template_path} has no <w:body> in {DOCUMENT_PART}")
+        self._root_ns = root_namespaces(self.document.element)
+
+        self._stream = self._zip.open(DOCUMENT_PART, 'w', force_zip64=True)
+        self._write(template_xml[:body_start.end()])
+
+    # ------------------------------
+    # Body streaming
+    # ------------------------------
+
+    def _write(self, data):
+        self._stream.write(data)
+        self.bytes_written += len(data)
+
+    def flush(self):
+        """Stream every body element produced so far (except the sectPr) and release it."""
+        body = self.document.element.body
+        for element in list(body):
+            if element.tag == qn('w:sectPr'):
+                continue
+            self._write(serialize_element(element, self._root_ns))
+            body.remove(element)
+            self.elements_written += 1
+
+    def write_fragment(self, xml):
+        """Stream already-serialized body elements (e.g. a cached record table) after the pending ones."""
+        self.flush()
+        self._write(xml)
+        self.elements_written += 1
+
+    # ------------------------------
+    # Relationships and media
+    # ------------------------------
+
+    def _add_rel(self, reltype, target, external=False):
+        rId = f'rId{self._next_rid}'
+        self._next_rid += 1
+        self._new_rels.append((rId, reltype, target, external))
+        return rId
+
+    def relate_hyperlink(self, url):
+        """Return the relationship ID for an external hyperlink, adding it once per URL."""
+        rId = self._hyperlinks.get(url)
+        if rId is None:
+            rId = self._hyperlinks[url] = self._add_rel(RT.HYPERLINK, url, external=True)
+        return rId
+
+    def relate_image(self, blob):
+        """
+        Relationship ID, part name and native size (EMU) of an image. The image bytes are
+        staged on disk and written to word/media once per distinct image.
+        """
+        digest = hashlib.sha256(blob).hexdigest()
+        if digest not in self._media:
+            image = DocxImage.from_blob(blob)
+            partname = f'media/stream_image{len(self._media) + 1}.{image.ext}'
+            staged = os.path.join(self._media_dir, digest)
+            with open(staged, 'wb') as f:
+                f.write(blob)
+            rId = self._add_rel(RT.IMAGE, partname)
+            # Keep only what the header told us, not the image bytes
+            self._media[digest] = (rId, partname, staged, (image.ext, image.content_type, image.width, image.height))
+
+        rId, partname, _, (_, _, native_cx, native_cy) = self._media[digest]
+        return rId, partname, native_cx, native_cy
+
+    def next_shape_id(self):
+        """A document-unique drawing ID (wp:docPr/@id)."""
+        shape_id = self._next_shape_id
+        self._next_shape_id += 1
+        return shape_id
+
+    def add_picture(self, run, blob, width=None, height=None):
+        """Add an inline picture to a run, like Run.add_picture."""
+        rId, partname, native_cx, native_cy = self.relate_image(blob)
+        cx, cy = scaled_dimensions(native_cx, native_cy, width, height)
+        inline = CT_Inline.new_pic_inline(self.next_shape_id(), rId, os.path.basename(partname), cx, cy)
+        run._r.add_drawing(inline)
+        return inline
+
+    # ------------------------------
+    # Package completion
+    # ------------------------------
+
+    def _document_rels(self):
+        rels = etree.fromstring(self._template.read(DOCUMENT_RELS))
+        for rId, reltype, target, external in self._new_rels:
+            rel = etree.SubElement(rels, f'{{{PACKAGE_RELS_NS}}}Relationship', Id=rId, Type=reltype, Target=target)
+            if external:
+                rel.set('TargetMode', 'External')
+        return etree.tostring(rels, xml_declaration=True, encoding='UTF-8', standalone=True)
+
+    def _content_types(self):
+        types = etree.fromstring(self._template.read(CONTENT_TYPES))
+        defaults = {el.get('Extension', '').lower() for el in types if el.tag == f'{{{CONTENT_TYPES_NS}}}Default'}
+        for _, _, _, (ext, content_type, _, _) in self._media.values():
+            if ext.lower() not in defaults:
+                types.insert(0, etree.Element(f'{{{CONTENT_TYPES_NS}}}Default', Extension=ext, ContentType=content_type))
+                defaults.add(ext.lower())
+        return etree.tostring(types, xml_declaration=True, encoding='UTF-8', standalone=True)
+
+    def close(self):
+        """Finish document.xml, then write media, relationships, styles and content types."""
+        with span("write package", images=len(self._media)):
+            self.flush()
+            self._write(serialize_element(self.document.element.body.sectPr, self._root_ns) + b'</w:body></w:document>')
+            self._stream.close()
+
+            for _, partname, staged, _ in self._media.values():
+                self._zip.write(staged, f'word/{partname}', compress_type=media_compression(partname, self._zip.compression))
+            self._zip.writestr(DOCUMENT_RELS, self._document_rels())
+            self._zip.writestr(STYLES_PART, serialize_part_xml(self.document.styles.element))
+            self._zip.writestr(CONTENT_TYPES, self._content_types())
+
+            self._zip.close()
+            self._template.close()
+            shutil.rmtree(self._media_dir, ignore_errors=True)
+            logger.info(f"Streamed {self.elements_written} body elements ({self.bytes_written} bytes) "
+                        f"and {len(self._media)} images to {self.output_path}")
+
+    def __enter__(self):
+        return self
+
+    def discard(self):
+        """Abandon the package: close the open files and remove the partial output."""
+        self._stream.close()
+        self._zip.close()
+        self._template.close()
+        shutil.rmtree(self._media_dir, ignore_errors=True)
+        if isinstance(self.output_path, (str, os.PathLike)) and os.path.exists(self.output_path):
+            os.remove(self.output_path)
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.discard()
+            return
+        try:
+            self.close()
+        except BaseException:
+            self.discard()
+            raise
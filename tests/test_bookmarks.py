@@ -0,0 +1,72 @@
+from docx import Document
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from bookmarks import anchor_name, find_broken_links, get_bookmark_registry, MAX_BOOKMARK_NAME
+
+
+def add_internal_link(document, anchor):
+    paragraph = document.add_paragraph()
+    hyperlink = OxmlElement('w:hyperlink')
+    hyperlink.set(qn('w:anchor'), anchor)
+    paragraph._p.append(hyperlink)
+
+
+# ------------------------------
+# anchor_name
+# ------------------------------
+
+def test_anchor_name_prefixes_and_replaces_unsafe_characters():
+    assert anchor_name('EP 1234567 A1') == 'pub_EP_1234567_A1'
+    assert anchor_name('WO/2024-01.5') == 'pub_WO_2024_01_5'
+
+
+def test_anchor_name_strips_whitespace_and_accepts_numbers():
+    assert anchor_name('  US123  ') == 'pub_US123'
+    assert anchor_name(987) == 'pub_987'
+
+
+def test_anchor_name_is_idempotent():
+    name = anchor_name('EP 1234567 A1')
+    assert anchor_name(name) == name
+
+
+def test_anchor_name_is_cut_to_word_limit():
+    name = anchor_name('X' * 100)
+    assert len(name) == MAX_BOOKMARK_NAME
+    assert name.startswith('pub_')
+
+
+# ------------------------------
+# find_broken_links
+# ------------------------------
+
+def test_find_broken_links_counts_anchors_without_bookmarks():
+    document = Document()
+    target = document.add_paragraph('EP1')
+    get_bookmark_registry(document).add(target._p, 'EP1')
+    add_internal_link(document, anchor_name('EP1'))
+    add_internal_link(document, anchor_name('EP2'))
+    add_internal_link(document, anchor_name('EP2'))
+
+    assert find_broken_links(document) == {'pub_EP2': 2}
+
+
+def test_find_broken_links_ignores_external_links():
+    document = Document()
+    paragraph = document.add_paragraph()
+    hyperlink = OxmlElement('w:hyperlink')
+    hyperlink.set(qn('r:id'), 'rId99')
+    paragraph._p.append(hyperlink)
+
+    assert find_broken_links(document) == {}
+
+
+def test_find_broken_links_reads_a_saved_package(tmp_path):
+    document = Document()
+    get_bookmark_registry(document).add(document.add_paragraph('EP1')._p, 'EP1')
+    add_internal_link(document, 'pub_EP1')
+    add_internal_link(document, 'pub_missing')
+    path = tmp_path / 'links.docx'
+    document.save(path)
+
+    assert find_broken_links(str(path)) == {'pub_missing': 1}
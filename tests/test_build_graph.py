@@ -0,0 +1,48 @@
+import os
+import pandas as pd
+from build_graph import BuildGraph, BuildTarget
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'basic_page_template.docx')
+
+
+def build_section(document, sheets):
+    pass
+
+
+def make_target(values=(1, 2), options=None):
+    return BuildTarget('Section', 'part_1.docx', {'Sheet': pd.DataFrame({'a': list(values)})}, TEMPLATE,
+                       [build_section], options)
+
+
+def build(graph, target, failed_images=0):
+    with open(graph.path(target), 'wb') as f:
+        f.write(b'part')
+    graph.built(target, graph.reason(target), 0.1, failed_images)
+
+
+def test_unchanged_part_is_current(tmp_path):
+    graph = BuildGraph(str(tmp_path))
+    assert graph.reason(make_target()) == "no previous build"
+    build(graph, make_target())
+    assert BuildGraph(str(tmp_path)).reason(make_target()) is None
+
+
+def test_changed_sheet_or_options_make_a_part_stale(tmp_path):
+    graph = BuildGraph(str(tmp_path))
+    build(graph, make_target(options={'packing': {'fp': 'greedy'}}))
+    graph = BuildGraph(str(tmp_path))
+    assert graph.reason(make_target(values=(1, 3), options={'packing': {'fp': 'greedy'}})) == "sheet Sheet changed"
+    assert graph.reason(make_target(options={'packing': {'fp': 'category'}})) == "options changed"
+
+
+def test_part_built_with_failed_images_is_stale(tmp_path):
+    graph = BuildGraph(str(tmp_path))
+    build(graph, make_target(), failed_images=3)
+    assert BuildGraph(str(tmp_path)).reason(make_target()) == "3 images failed to download last time"
+
+
+def test_missing_part_file_is_stale(tmp_path):
+    graph = BuildGraph(str(tmp_path))
+    build(graph, make_target())
+    os.remove(graph.path(make_target()))
+    assert graph.reason(make_target()) == "part_1.docx is missing"
@@ -0,0 +1,196 @@
+import os
+import zipfile
+from io import BytesIO
+import pandas as pd
+import pytest
+from docx import Document
+from docx.oxml.ns import qn
+from PIL import Image
+import fragment_cache
+import image_fetch
+from bookmarks import get_bookmark_registry
+from first_publications_pages_generator import (
+    add_publication_detail_sections, create_patent_table, stream_publication_detail_sections
+)
+from fragment_cache import FragmentStore, RecordFragments
+from record_stamp import RecordTableStamper
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'basic_page_template.docx')
+HEADERS = ["Serial No", "Publication No", "Title", "Patent Link", "Abstract"]
+
+
+def png(color):
+    buffer = BytesIO()
+    Image.new('RGB', (120, 80), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+IMAGES = {'http://img/F1.png': png((200, 30, 30)), 'http://img/F2.png': png((30, 200, 30))}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """A fragment store in tmp_path, and images served locally ('http://img/F3.png' fails)."""
+    def get_image_bytes(url, headers=None):
+        if url not in IMAGES:
+            raise LookupError(f"no such image {url}")
+        return IMAGES[url]
+
+    monkeypatch.setattr(image_fetch, 'get_image_bytes', get_image_bytes)
+    monkeypatch.setattr(image_fetch, '_image_cache', None)
+    monkeypatch.setattr(image_fetch, '_image_cache_enabled', False)
+    store = FragmentStore(cache_dir=str(tmp_path / 'fragments'))
+    monkeypatch.setattr(fragment_cache, '_fragment_store', store)
+    monkeypatch.setattr(fragment_cache, '_fragment_cache_enabled', True)
+    yield store
+    store.close()
+
+
+def hits(store, monkeypatch):
+    """Count the fragment store lookups that find a fragment."""
+    found = []
+    get = store.get
+
+    def counting_get(key):
+        cached = get(key)
+        found.append(cached is not None)
+        return cached
+
+    monkeypatch.setattr(store, 'get', counting_get)
+    return found
+
+
+def sheets():
+    def records(number_column, prefix):
+        return pd.DataFrame({
+            "Serial No": [1, 2, 3],
+            "Family number": ["F1", "F2", "F3"],
+            number_column: [f"{prefix}1", f"{prefix}2", f"{prefix}3"],
+            "Title": ["Widget", "Gadget", "Gizmo"],
+            "Category": ["A", "A", "B"],
+            "Patent Link": ["http://example.com/1", "http://example.com/2", None],
+            "Abstract": ["First abstract.", "Second abstract.", "Third abstract."],
+        })
+
+    return {
+        "First Publication": records("Publication No", "EP"),
+        "Granted": records("Patent No", "US"),
+        "Sheet1": pd.DataFrame({"Family number": ["F1", "F2", "F3"],
+                                "Image": [*IMAGES, 'http://img/F3.png']}),
+    }
+
+
+def document_xml(source):
+    with zipfile.ZipFile(source) as package:
+        return package.read('word/document.xml')
+
+
+def build_in_memory():
+    document = Document(TEMPLATE)
+    add_publication_detail_sections(document, sheets())
+    buffer = BytesIO()
+    document.save(buffer)
+    return document_xml(buffer)
+
+
+def build_streamed(path):
+    stream_publication_detail_sections(sheets(), TEMPLATE, str(path))
+    return document_xml(path)
+
+
+# ------------------------------
+# Cold and warm builds
+# ------------------------------
+
+def test_warm_in_memory_build_matches_cold_build(store, monkeypatch):
+    cold = build_in_memory()
+    found = hits(store, monkeypatch)
+    warm = build_in_memory()
+    # Two records per section are replayed; the one whose image failed is rendered again
+    assert found.count(True) == 4
+    assert warm == cold
+
+
+def test_warm_streamed_build_matches_cold_build(store, monkeypatch, tmp_path):
+    cold = build_streamed(tmp_path / 'cold.docx')
+    found = hits(store, monkeypatch)
+    warm = build_streamed(tmp_path / 'warm.docx')
+    assert found.count(True) == 4
+    assert warm == cold
+
+
+def test_record_whose_image_failed_is_not_captured(store):
+    document = Document(TEMPLATE)
+    stamper = RecordTableStamper(document, HEADERS, bookmark_field="Publication No")
+    fragments = RecordFragments(document, ["test"], store=store)
+    record = {"Serial No": 3, "Family number": "F3", "Publication No": "EP3", "Title": "Gizmo"}
+    create_patent_table(document, record, HEADERS, sheets()["Sheet1"], None, stamper, fragments=fragments)
+    fragments.flush()
+
+    assert fragments.rendered == 0
+    assert store._db.execute('SELECT COUNT(*) FROM fragments').fetchone()[0] == 0
+
+
+# ------------------------------
+# Replay
+# ------------------------------
+
+def test_replay_strips_a_bookmark_already_in_the_document(store):
+    record = {"Serial No": 1, "Family number": "F1", "Publication No": "EP1", "Title": "Widget"}
+    df_images = sheets()["Sheet1"]
+
+    first = Document(TEMPLATE)
+    fragments = RecordFragments(first, ["test"], store=store)
+    create_patent_table(first, record, HEADERS, df_images, None,
+                        RecordTableStamper(first, HEADERS, bookmark_field="Publication No"), fragments=fragments)
+    fragments.flush()
+
+    second = Document(TEMPLATE)
+    get_bookmark_registry(second).add(second.add_paragraph('EP1')._p, 'EP1')
+    fragments = RecordFragments(second, ["test"], store=store)
+    table = create_patent_table(second, record, HEADERS, df_images, None,
+                                RecordTableStamper(second, HEADERS, bookmark_field="Publication No"), fragments=fragments)
+
+    assert table is None and fragments.reused == 1
+    body = second.element.body
+    names = [el.get(qn('w:name')) for el in body.iter(qn('w:bookmarkStart'))]
+    assert names.count('pub_EP1') == 1
+    assert len(list(body.iter(qn('w:bookmarkEnd')))) == len(names)
+    assert len(list(body[-2].iter(qn('a:blip')))) == 1  # The replayed table, before the sectPr
+
+
+def test_replayed_fragment_goes_before_the_section_properties(store):
+    document = Document(TEMPLATE)
+    fragments = RecordFragments(document, ["test"], store=store)
+    table = document.add_table(rows=1, cols=1)
+    table.cell(0, 0).text = 'cached'
+    key = fragments.key(['cached'])
+    fragments.capture(key, [table._tbl])
+    fragments.flush()
+
+    assert fragments.replay(key)
+    body = document.element.body
+    assert body[-1].tag == qn('w:sectPr')
+    assert body[-2].tag == qn('w:tbl') and body[-2] is not table._tbl
+
+
+# ------------------------------
+# Keys
+# ------------------------------
+
+def test_key_changes_with_values_image_and_scope(store):
+    document = Document(TEMPLATE)
+    fragments = RecordFragments(document, ["FIRST PUBLICATIONS"], store=store)
+    key = fragments.key(['EP1', 'Widget'])
+
+    assert fragments.key(['EP1', 'Widget']) == key
+    assert fragments.key(['EP1', 'Gadget']) != key
+    assert fragments.key(['EP1', 'Widget'], IMAGES['http://img/F1.png']) != key
+    assert RecordFragments(document, ["GRANTED PATENTS"], store=store).key(['EP1', 'Widget']) != key
+
+
+def test_no_key_without_a_store(monkeypatch):
+    monkeypatch.setattr(fragment_cache, '_fragment_cache_enabled', False)
+    fragments = RecordFragments(Document(TEMPLATE), ["test"])
+    assert fragments.key(['EP1']) is None
+    assert not fragments.replay(None)
@@ -0,0 +1,98 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from http_client import DeadlineExceededError, FetchClient, HostUnavailableError
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Replies with the statuses queued for a path, then 200; '/slow' stalls before answering."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, time.monotonic()))
+        if self.path == '/slow':
+            time.sleep(2)
+        queued = server.replies.get(self.path)
+        status, headers = queued.pop(0) if queued else (200, {})
+        body = b'ok' if status == 200 else b''
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    httpd.daemon_threads = True
+    httpd.requests, httpd.replies = [], {}
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f'http://127.0.0.1:{httpd.server_address[1]}'
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_retries_503_then_succeeds(server):
+    server.replies['/flaky'] = [(503, {}), (503, {})]
+    client = FetchClient(backoff_factor=0.01)
+    response = client.get(server.url + '/flaky')
+
+    assert response.status_code == 200 and response.content == b'ok'
+    assert len(server.requests) == 3
+    assert client._host_failures[server.url[7:]] == 0
+
+
+def test_retry_after_is_honoured(server):
+    server.replies['/busy'] = [(429, {'Retry-After': '1'})]
+    FetchClient(backoff_factor=0.01).get(server.url + '/busy')
+
+    (_, first), (_, second) = server.requests
+    assert second - first >= 1
+
+
+def test_final_429_raises_and_counts_as_a_failure(server):
+    server.replies['/limited'] = [(429, {})] * 3
+    client = FetchClient(retries=2, backoff_factor=0.01, failure_threshold=1)
+    with pytest.raises(requests.HTTPError):
+        client.get(server.url + '/limited')
+
+    assert len(server.requests) == 3
+    with pytest.raises(HostUnavailableError):
+        client.get(server.url + '/other')
+
+
+def test_deadline_stops_retries(server):
+    server.replies['/down'] = [(503, {'Retry-After': '5'})] * 4
+    client = FetchClient(deadline=1)
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceededError):
+        client.get(server.url + '/down')
+
+    assert time.monotonic() - start < 1
+    assert len(server.requests) == 1
+
+
+def test_timeout_cut_short_by_the_deadline_does_not_disable_the_host(server):
+    client = FetchClient(retries=0, deadline=0.5, failure_threshold=1)  # The timeout ends the last attempt
+    with pytest.raises(DeadlineExceededError):
+        client.get(server.url + '/slow')
+
+    assert client._host_failures[server.url[7:]] == 0
+
+
+def test_client_settings_reproduce_the_client():
+    client = FetchClient(retries=1, per_host_limit=2, deadline=60)
+    settings = client.settings()
+
+    assert settings['retries'] == 1 and settings['per_host_limit'] == 2
+    assert 0 < settings['deadline'] <= 60
+    assert FetchClient(**settings).deadline is not None
@@ -0,0 +1,69 @@
+import os
+import time
+from types import SimpleNamespace
+from image_cache import ImageCache, ORPHAN_GRACE
+
+RESPONSE = SimpleNamespace(headers={'ETag': '"v1"'})
+
+
+def store(cache, url, content):
+    cache._store(url, content, RESPONSE)
+
+
+def blob_files(cache_dir):
+    return sorted(name for _, _, names in os.walk(os.path.join(cache_dir, 'blobs')) for name in names)
+
+
+def age(path, seconds):
+    old = time.time() - seconds
+    os.utime(path, (old, old))
+
+
+def test_flush_keeps_entries_flushed_by_another_process(tmp_path):
+    first, second = ImageCache(str(tmp_path)), ImageCache(str(tmp_path))
+    store(first, 'http://img/a', b'a' * 10)
+    store(second, 'http://img/b', b'b' * 10)
+    first.flush()
+    second.flush()
+
+    assert set(ImageCache(str(tmp_path))._index) == {'http://img/a', 'http://img/b'}
+
+
+def test_flush_keeps_the_more_recently_used_entry(tmp_path):
+    first, second = ImageCache(str(tmp_path)), ImageCache(str(tmp_path))
+    store(first, 'http://img/a', b'old')
+    store(second, 'http://img/a', b'new')
+    second.flush()
+    first._index['http://img/a']['last_used'] -= 100
+    first.flush()
+
+    cache = ImageCache(str(tmp_path))
+    assert cache._read_blob(cache._index['http://img/a']['digest']) == b'new'
+
+
+def test_unindexed_blobs_are_removed_once_old_enough(tmp_path):
+    killed = ImageCache(str(tmp_path))
+    store(killed, 'http://img/lost', b'lost')  # Never flushed, as if the run was killed
+    running = ImageCache(str(tmp_path))
+    store(running, 'http://img/new', b'new')  # Stored but not yet flushed by another run
+    lost = killed._blob_path(killed._index['http://img/lost']['digest'])
+    age(lost, ORPHAN_GRACE + 60)
+
+    cache = ImageCache(str(tmp_path))
+    store(cache, 'http://img/kept', b'kept')
+    cache.flush()
+
+    assert not os.path.exists(lost)
+    assert os.path.exists(running._blob_path(running._index['http://img/new']['digest']))
+    assert len(blob_files(str(tmp_path))) == 2
+
+
+def test_flush_evicts_least_recently_used_past_max_bytes(tmp_path):
+    cache = ImageCache(str(tmp_path), max_bytes=25)
+    for i, name in enumerate('abc'):
+        store(cache, f'http://img/{name}', name.encode() * 10)
+        cache._index[f'http://img/{name}']['last_used'] = 1000 + i
+    cache.flush()
+
+    assert set(ImageCache(str(tmp_path))._index) == {'http://img/b', 'http://img/c'}
+    assert len(blob_files(str(tmp_path))) == 2
@@ -0,0 +1,63 @@
+import pytest
+import image_fetch
+from image_fetch import ImageWindow
+
+
+@pytest.fixture
+def downloads(monkeypatch):
+    """Record every prefetch_images call instead of downloading."""
+    calls = []
+
+    def prefetch_images(urls, max_workers=None, headers=None):
+        calls.append(list(urls))
+        return {url: url.encode() for url in urls}
+
+    monkeypatch.setattr(image_fetch, 'prefetch_images', prefetch_images)
+    return calls
+
+
+def read(window, url, release=False):
+    content = window.get(url) if url in window else None
+    if release:
+        window.pop(url)
+    return content
+
+
+@pytest.mark.parametrize('release', [False, True])
+def test_repeated_urls_do_not_reload_earlier_windows(downloads, release):
+    # 200 first publications, then 200 granted patents of which every 10th shares an FP image
+    fp = [f'http://img/fp{i}' for i in range(200)]
+    granted = [fp[i] if i % 10 == 0 else f'http://img/gp{i}' for i in range(200)]
+    window = ImageWindow(fp + granted, window=64)
+
+    for url in fp + granted:
+        assert read(window, url, release) == url.encode()
+
+    assert len(downloads) == 7  # 400 occurrences in windows of 64
+    assert sum(len(urls) for urls in downloads) == 400
+
+
+def test_popped_url_is_served_again_later_in_the_same_window(downloads):
+    window = ImageWindow(['a', 'b', 'a'], window=64)
+    assert read(window, 'a', release=True) == b'a'
+    assert read(window, 'b', release=True) == b'b'
+    assert read(window, 'a', release=True) == b'a'
+    assert 'a' not in window  # Every occurrence has been read
+    assert len(downloads) == 1
+
+
+def test_url_without_a_later_occurrence_is_not_served(downloads):
+    window = ImageWindow([f'u{i}' for i in range(10)], window=4)
+    assert read(window, 'u9') == b'u9'
+    assert 'u1' not in window  # Falls back to fetch_image() instead of reloading a window
+    assert 'missing' not in window
+    assert len(downloads) == 1
+
+
+def test_transform_runs_once_per_window(downloads):
+    transformed = []
+    window = ImageWindow(['a', 'b', 'c'], window=2,
+                         transform=lambda images: transformed.append(list(images)) or images)
+    for url in ['a', 'b', 'c']:
+        read(window, url)
+    assert transformed == [['a', 'b'], ['c']]
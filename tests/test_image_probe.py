@@ -0,0 +1,80 @@
+import struct
+from io import BytesIO
+import pytest
+from PIL import Image
+from image_probe import image_dimensions, probe_file, probe_image
+
+
+def encode(fmt, size=(37, 21), **options):
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+def with_segment(jpeg, marker, payload):
+    """Insert a segment with `payload` straight after the SOI marker."""
+    return jpeg[:2] + bytes([0xFF, marker]) + struct.pack('>H', len(payload) + 2) + payload + jpeg[2:]
+
+
+def sof_offset(jpeg):
+    for marker in (b'\xff\xc0', b'\xff\xc2'):
+        if marker in jpeg:
+            return jpeg.index(marker)
+    raise AssertionError('no SOF marker')
+
+
+@pytest.mark.parametrize('fmt, options, expected', [
+    ('PNG', {}, 'PNG'),
+    ('GIF', {}, 'GIF'),
+    ('JPEG', {}, 'JPEG'),
+    ('JPEG', {'progressive': True}, 'JPEG'),
+])
+def test_probe_reads_format_and_size(fmt, options, expected):
+    assert probe_file(BytesIO(encode(fmt, **options))) == (expected, 37, 21)
+
+
+def test_probe_skips_a_large_exif_segment():
+    exif = b'Exif\x00\x00' + b'\x00' * 60000
+    jpeg = with_segment(with_segment(encode('JPEG'), 0xE2, b'ICC_PROFILE\x00' + b'\x01' * 3000), 0xE1, exif)
+    assert probe_file(BytesIO(jpeg)) == ('JPEG', 37, 21)
+
+
+def test_probe_reads_only_up_to_the_frame_header():
+    jpeg = with_segment(encode('JPEG'), 0xE1, b'Exif\x00\x00' + b'\x00' * 60000)
+    f = BytesIO(jpeg)
+    probe_file(f)
+    assert f.tell() == sof_offset(jpeg) + 9
+
+
+def test_probe_tolerates_fill_bytes_before_markers():
+    jpeg = encode('JPEG')
+    sof = sof_offset(jpeg)
+    padded = jpeg[:2] + b'\xff\xff\xff' + jpeg[2:sof] + b'\xff\xff' + jpeg[sof:]
+    assert probe_file(BytesIO(padded)) == ('JPEG', 37, 21)
+
+
+def test_probe_needs_only_the_bytes_up_to_the_frame_header():
+    jpeg = encode('JPEG')
+    assert image_dimensions(jpeg[:sof_offset(jpeg) + 9]) == (37, 21)
+
+
+@pytest.mark.parametrize('cut', [
+    lambda sof: 2,        # SOI only
+    lambda sof: 5,        # Inside the first segment's length
+    lambda sof: sof,      # Every segment before the frame, but not the frame
+    lambda sof: sof + 6,  # Frame header cut short
+])
+def test_truncated_jpeg_gives_none(cut):
+    jpeg = encode('JPEG')
+    assert probe_image(jpeg[:cut(sof_offset(jpeg))]) is None
+
+
+def test_truncated_png_and_gif_give_none():
+    assert probe_image(encode('PNG')[:20]) is None
+    assert probe_image(encode('GIF')[:8]) is None
+
+
+def test_unknown_format_and_empty_bytes_give_none():
+    assert probe_image(b'BM' + b'\x00' * 40) is None
+    assert probe_image(b'') is None
+    assert image_dimensions(None) is None
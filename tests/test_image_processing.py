@@ -0,0 +1,50 @@
+from io import BytesIO
+import pytest
+from PIL import Image
+import image_processing
+from image_processing import DEFAULT_DPI, configure_image_processing, prepare_image
+
+
+@pytest.fixture(autouse=True)
+def default_settings():
+    yield
+    configure_image_processing(dpi=DEFAULT_DPI)
+
+
+def png(size):
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def size_of(content):
+    with Image.open(BytesIO(content)) as img:
+        return img.size
+
+
+def test_image_is_downscaled_to_its_display_width():
+    assert size_of(prepare_image(png((2000, 1000)), 2)) == (2 * DEFAULT_DPI, DEFAULT_DPI)
+
+
+def test_small_reductions_are_not_resampled():
+    content = png((int(2 * DEFAULT_DPI / 0.95), 100))
+    assert prepare_image(content, 2) is content
+
+
+def test_normalized_bytes_are_normalized_again_for_a_smaller_width():
+    normalized = prepare_image(png((2000, 1000)), 2)
+    assert prepare_image(normalized, 2) is normalized
+    assert size_of(prepare_image(normalized, 1)) == (DEFAULT_DPI, DEFAULT_DPI // 2)
+
+
+def test_normalized_bytes_are_normalized_again_at_a_lower_dpi():
+    normalized = prepare_image(png((2000, 1000)), 2)
+    configure_image_processing(dpi=100)
+    assert size_of(prepare_image(normalized, 2)) == (200, 100)
+
+
+def test_disabled_processing_keeps_bytes():
+    content = png((2000, 1000))
+    configure_image_processing(enabled=False)
+    assert prepare_image(content, 2) is content
+    assert image_processing.normalize_images({'u': content}, 2) == {'u': content}
@@ -0,0 +1,41 @@
+import argparse
+import pytest
+from main_main import parse_packing, parse_rebuild, sections
+
+
+# ------------------------------
+# --packing
+# ------------------------------
+
+def test_parse_packing_applies_one_mode_to_both_sections():
+    assert parse_packing('greedy') == {'fp': 'greedy', 'gp': 'greedy'}
+
+
+def test_parse_packing_per_section():
+    assert parse_packing('fp=greedy,gp=category') == {'fp': 'greedy', 'gp': 'category'}
+    assert parse_packing('gp=category') == {'gp': 'category'}
+
+
+@pytest.mark.parametrize('value', ['tight', 'fp=tight', 'xx=greedy', 'fp=greedy,gp=one'])
+def test_parse_packing_rejects_unknown_modes_and_sections(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_packing(value)
+
+
+# ------------------------------
+# --rebuild
+# ------------------------------
+
+def test_parse_rebuild_accepts_numbers_and_file_names():
+    parser = argparse.ArgumentParser()
+    assert parse_rebuild(['2', 'part_4.docx'], parser) == [sections[1][0], sections[3][0]]
+
+
+def test_parse_rebuild_all_wins():
+    assert parse_rebuild(['1', 'all'], argparse.ArgumentParser()) == ['all']
+
+
+@pytest.mark.parametrize('value', ['0', str(len(sections) + 1), 'part_x.docx', 'FP index'])
+def test_parse_rebuild_rejects_unknown_parts(value):
+    with pytest.raises(SystemExit):
+        parse_rebuild([value], argparse.ArgumentParser())
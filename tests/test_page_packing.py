@@ -0,0 +1,54 @@
+import pytest
+from page_packing import pack_records, CATEGORY, GREEDY, ONE_PER_PAGE
+
+
+def test_one_per_page_breaks_before_every_record_but_the_first():
+    plan = pack_records([2, 2, 2], page_height=10)
+    assert plan.breaks.tolist() == [False, True, True]
+    assert plan.pages == 3
+    assert plan.pages_saved == 0
+
+
+def test_greedy_fills_a_page_until_the_next_record_does_not_fit():
+    plan = pack_records([3, 3, 3, 3], page_height=7, mode=GREEDY)
+    assert plan.breaks.tolist() == [False, False, True, False]
+    assert plan.pages == 2
+    assert plan.baseline_pages == 4
+    assert plan.pages_saved == 2
+
+
+def test_greedy_counts_heading_gaps_and_page_headers():
+    # 1 + 3 + 1 + 3 = 8 fits on the first page; the third record needs a new page,
+    # where the 2-unit header leaves room for it but not for a fourth after the gap
+    plan = pack_records([3, 3, 3, 3], page_height=8, mode=GREEDY, first_page_used=1, page_header=2, gap=1)
+    assert plan.breaks.tolist() == [False, False, True, True]
+    assert plan.pages == 3
+
+
+def test_record_taller_than_a_page_flows_over_and_packing_continues_after_it():
+    # 15 units end 1 unit into the third page, leaving room for the next record there
+    plan = pack_records([15, 1, 6], page_height=7, mode=GREEDY)
+    assert plan.breaks.tolist() == [False, False, True]
+    assert plan.pages == 4
+
+
+def test_category_packing_starts_each_category_on_a_new_page():
+    plan = pack_records([1, 1, 1, 1], page_height=10, mode=CATEGORY, categories=['A', 'A', 'B', 'B'])
+    assert plan.breaks.tolist() == [False, False, True, False]
+    assert plan.pages == 2
+
+
+def test_category_packing_needs_categories():
+    with pytest.raises(ValueError):
+        pack_records([1, 1], page_height=10, mode=CATEGORY)
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        pack_records([1], page_height=10, mode='tight')
+
+
+def test_summary_reports_pages_saved():
+    plan = pack_records([1, 1, 1], page_height=10, mode=GREEDY)
+    assert plan.summary('FP') == f"FP: 3 records on 1 pages with {GREEDY} packing (2 fewer than one per page)"
+    assert pack_records([], page_height=10, mode=ONE_PER_PAGE).pages == 1
@@ -0,0 +1,178 @@
+import logging
+import math
+import os
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# Font Metrics
+# ------------------------------
+
+UNITS_PER_EM = 2048
+LINE_HEIGHT_EM = 2500 / UNITS_PER_EM  # Calibri usWinAscent + usWinDescent, what Word uses for single spacing
+
+# Fonts tried in order; Carlito is metric-compatible with Calibri
+FONT_PATHS = [
+    r'C:\Windows\Fonts\calibri.ttf',
+    '/Library/Fonts/Microsoft/Calibri.ttf',
+    '/usr/share/fonts/truetype/crosextra/Carlito-Regular.ttf',
+    '/usr/share/fonts/crosextra/Carlito-Regular.ttf',
+]
+
+# Calibri advance widths (font units) for printable ASCII, used when no font file is found
+CALIBRI_ASCII_WIDTHS = dict(zip(
+    ' !"#$%&\'()*+,-./0123456789:;<=>?@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\\]^_`abcdefghijklmnopqrstuvwxyz{|}~',
+    [463, 548, 820, 1038, 1038, 1472, 1394, 451, 621, 621, 1038, 1038, 511, 627, 517, 792,
+     1038, 1038, 1038, 1038, 1038, 1038, 1038, 1038, 1038, 1038, 548, 548, 1038, 1038, 1038, 941,
+     1870, 1185, 1114, 1092, 1260, 1000, 941, 1292, 1276, 516, 653, 1064, 861, 1751, 1322, 1356,
+     1058, 1378, 1112, 941, 998, 1314, 1162, 1822, 1063, 998, 959, 627, 792, 627, 1038, 1020,
+     587, 981, 1076, 866, 1076, 1019, 625, 964, 1076, 470, 490, 931, 470, 1636, 1076, 1080,
+     1076, 1076, 714, 801, 686, 1076, 925, 1464, 887, 927, 809, 638, 943, 638, 1038]
+))
+DEFAULT_WIDTH = 1038  # Digits' width, a safe guess for glyphs outside the table
+
+
+class FontMetrics:
+    """Glyph advance widths in em, looked up once per character and once per word."""
+
+    def __init__(self, glyph_width, source):
+        self.source = source
+        self._glyph_width = glyph_width  # char -> width in font units
+        self._chars = {}
+        self._words = {}
+        self.space = self.char_width(' ')
+
+    @classmethod
+    def load(cls, font_paths=FONT_PATHS):
+        """Read widths from the first Calibri-compatible font found, else the built-in Calibri table."""
+        from PIL import ImageFont
+        for path in font_paths:
+            if os.path.exists(path):
+                try:
+                    font = ImageFont.truetype(path, size=UNITS_PER_EM)
+                    return cls(font.getlength, path)
+                except OSError as e:
+                    logger.warning(f"Could not read font {path}: {e}")
+        return cls(lambda ch: CALIBRI_ASCII_WIDTHS.get(ch, DEFAULT_WIDTH), 'built-in Calibri widths')
+
+    def char_width(self, ch):
+        width = self._chars.get(ch)
+        if width is None:
+            width = self._chars[ch] = self._glyph_width(ch) / UNITS_PER_EM
+        return width
+
+    def word_width(self, word):
+        width = self._words.get(word)
+        if width is None:
+            width = self._words[word] = sum(self.char_width(ch) for ch in word)
+        return width
+
+    def text_widths(self, texts):
+        """Width in em of each string, from one pass over the code points of all of them."""
+        lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+        codes = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32)
+        # Width table indexed by code point, filled only for the characters present
+        present = np.zeros(int(codes.max(initial=0)) + 1, dtype=bool)
+        present[codes] = True
+        table = np.zeros(len(present))
+        for code in np.flatnonzero(present):
+            table[code] = self.char_width(chr(code))
+        cumulative = np.concatenate(([0.0], np.cumsum(table[codes])))
+        ends = np.cumsum(lengths)
+        return cumulative[ends] - cumulative[ends - lengths]
+
+    def line_count(self, text, width_em):
+        """Lines Word needs for `text` wrapped greedily at word boundaries within `width_em`."""
+        words, space = self._words, self.space
+        lines = 0
+        for paragraph in text.split('\n'):
+            lines += 1
+            line = None
+            for word in paragraph.split():
+                w = words.get(word)
+                if w is None:
+                    w = self.word_width(word)
+                if line is not None and line + space + w <= width_em:
+                    line += space + w
+                    continue
+                if line is not None:
+                    lines += 1
+                if w > width_em:
+                    # A word wider than the cell breaks across lines by characters
+                    lines += math.ceil(w / width_em) - 1
+                    w = w % width_em
+                line = w
+        return lines
+
+    def wrapped_line_counts(self, texts, width_in, size_pt):
+        """
+        Line counts for a column of texts at a text width in inches. Every text whose total
+        width fits on one line is settled from the summed widths; only longer texts are wrapped.
+        """
+        texts = pd.Series(texts).fillna('').astype(str)
+        width_em = width_in * 72 / size_pt
+        total = self.text_widths(texts.tolist())
+        counts = np.ones(len(texts), dtype=int)
+        for i in np.flatnonzero((total > width_em) | texts.str.contains('\n', regex=False).to_numpy()):
+            counts[i] = self.line_count(texts.iat[i], width_em)
+        return counts
+
+
+_metrics = None
+
+
+def get_font_metrics():
+    """Return the shared font metrics, loading the font only once."""
+    global _metrics
+    if _metrics is None:
+        _metrics = FontMetrics.load()
+        logger.info(f"Measuring text with {_metrics.source}")
+    return _metrics
+
+
+# ------------------------------
+# Table Measurement
+# ------------------------------
+
+def line_height(size_pt):
+    """Single-spaced line height in inches."""
+    return size_pt * LINE_HEIGHT_EM / 72
+
+
+def paragraph_height(size_pt=11, line_multiple=276 / 240, space_after_pt=10):
+    """Height in inches of a one-line paragraph in the template's Normal style (1.15 lines, 10pt after)."""
+    return line_height(size_pt) * line_multiple + space_after_pt / 72
+
+
+def fitted_image_height(size, max_width, max_height):
+    """Height in inches of an image scaled to max_width and capped at max_height."""
+    if not size or not size[0]:
+        return max_height
+    width, height = size
+    return min(max_height, max_width * height / width)
+
+
+def measure_table_heights(df, fields, label_width, value_width, size_pt=11, cell_margin=0.15,
+                          row_padding=0.0, image_heights=None, metrics=None):
+    """
+    Heights in inches of the 2-column record table of every row of `df`, measured one
+    column at a time before rendering. Each row is as tall as the taller of its label and
+    value cells; `image_heights` (inches, 0 for no image) adds an 'Image' row below.
+    """
+    metrics = metrics or get_font_metrics()
+    line = line_height(size_pt)
+    heights = np.zeros(len(df))
+
+    for field in fields:
+        label_lines = metrics.wrapped_line_counts([field], label_width - cell_margin, size_pt)[0]
+        values = df[field] if field in df.columns else pd.Series([''] * len(df))
+        value_lines = metrics.wrapped_line_counts(values, value_width - cell_margin, size_pt)
+        heights += np.maximum(label_lines, value_lines) * line + row_padding
+
+    if image_heights is not None:
+        image_heights = np.asarray(image_heights, dtype=float)
+        # The picture goes in a second paragraph after the cell's empty first one
+        heights += np.where(image_heights > 0, line + image_heights + row_padding, 0.0)
+    return heights
@@ -1,4 +1,3 @@
-import pandas as pd
 from docx import Document
 from docx.shared import Pt, Inches
 from docx.oxml import OxmlElement
@@ -7,26 +6,17 @@ from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_UNDERLINE
 from docx.enum.table import WD_ALIGN_VERTICAL
 import sys
 import math
+from workbook_loader import load_workbook
+from category_index import get_category_index
+from report_styles import ensure_report_styles, set_table_style, REPORT_TABLE, CELL_CENTERED
 
 # ------------------------------
 # Helper Functions
 # ------------------------------
 
 def set_table_borders(table):
-    """Apply black borders to all sides of a table."""
-    tbl = table._tbl
-    tblPr = tbl.tblPr
-    borders = OxmlElement('w:tblBorders')
-
-    for border_name in ['top', 'left', 'bottom', 'right', 'insideH', 'insideV']:
-        border = OxmlElement(f'w:{border_name}')
-        border.set(qn('w:val'), 'single')
-        border.set(qn('w:sz'), '4')  # Border thickness
-        border.set(qn('w:space'), '0')  # No spacing
-        border.set(qn('w:color'), '000000')  # Black color
-        borders.append(border)
-
-    tblPr.append(borders)
+    """Apply black borders to all sides of a table through the bordered table style."""
+    set_table_style(table, REPORT_TABLE)
 
 
 def set_row_height_exact(row, height_in_inches):
@@ -40,14 +30,12 @@ def set_row_height_exact(row, height_in_inches):
 
 
 def set_cell_size_and_alignment(table, cell_height=0.28, cell_width=Inches(1.38)):
-    """Set cell width, height, and alignment for all table cells."""
+    """Set cell width, height, and vertical alignment for all table cells (text is centered by its style)."""
     for row in table.rows:
         set_row_height_exact(row, cell_height)  # Ensure consistent row height
         for cell in row.cells:
             cell.width = cell_width
             cell.vertical_alignment = WD_ALIGN_VERTICAL.CENTER
-            for paragraph in cell.paragraphs:
-                paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
     table.alignment = WD_ALIGN_PARAGRAPH.RIGHT
 
 
@@ -58,13 +46,13 @@ def set_cell_size_and_alignment(table, cell_height=0.28, cell_width=Inches(1.38)
 def create_company_table(document, first_row_data, second_row_data):
     """Create a company table with a fixed row height of 0.37 inches."""
     table = document.add_table(rows=2, cols=6)
+    centered = document.styles[CELL_CENTERED]
 
     # Fill first row
     for i, company in enumerate(first_row_data):
         cell = table.rows[0].cells[i]
         cell.text = company
-        cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
-        cell.paragraphs[0].runs[0].font.size = Pt(10)
+        cell.paragraphs[0].style = centered
 
     # Merge last two cells in first row if data is <6 items
     if len(first_row_data) < 6:
@@ -74,8 +62,7 @@ def create_company_table(document, first_row_data, second_row_data):
     for i, company in enumerate(second_row_data):
         cell = table.rows[1].cells[i]
         cell.text = company
-        cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
-        cell.paragraphs[0].runs[0].font.size = Pt(10)
+        cell.paragraphs[0].style = centered
 
     # Apply styles
     set_table_borders(table)
@@ -114,9 +101,21 @@ def add_patent_section_links(document):
 # Main Processing Functions
 # ------------------------------
 
-def create_patent_watch_doc(excel_path, output_path, template_path):
+def create_patent_watch_doc(excel_path, output_path, template_path, sheets=None):
     """Generate the Patent Watch document from Excel data using a template."""
+    if sheets is None:
+        sheets = load_workbook(excel_path, ['FP', 'Grant'])
+
     document = Document(template_path)
+    add_patent_watch_pages(document, sheets)
+
+    # Save Document
+    document.save(output_path)
+
+
+def add_patent_watch_pages(document, sheets):
+    """Append the title and category index pages to an existing document."""
+    ensure_report_styles(document)
 
     # Add Title
     title_paragraph = document.add_paragraph('2445_2446 - PATENT WATCH – (04-NOV-2024 to 15-NOV-2024)')
@@ -153,13 +152,8 @@ def create_patent_watch_doc(excel_path, output_path, template_path):
     # Load Category Data from Excel
     # ------------------------------
 
-    df_fp = pd.read_excel(excel_path, sheet_name='FP')
-    df_fp.columns = df_fp.columns.str.strip()
-    df_fp['Category'] = df_fp['Category'].astype(str).str.strip()
-
-    df_grant = pd.read_excel(excel_path, sheet_name='Grant')
-    df_grant.columns = df_grant.columns.str.strip()
-    df_grant['Category'] = df_grant['Category'].astype(str).str.strip()
+    df_fp = sheets['FP']
+    df_grant = sheets['Grant']
 
     categories = ['Seafloor', 'Land', 'Marine', 'Microseismic & Multiphysics',
                   'Processing', 'Reservoir', 'Geology', 'Data Management & Computing']
@@ -182,9 +176,6 @@ def create_patent_watch_doc(excel_path, output_path, template_path):
     for category in categories_group2:
         process_category(document, category, df_fp, df_grant)
 
-    # Save Document
-    document.save(output_path)
-
 
 # ------------------------------
 # Process Category Function
@@ -198,8 +189,8 @@ def process_category(document, category, df_fp, df_grant):
     bullet_run.font.size = Pt(10)
     bullet_run.bold = True
 
-    fp_values = df_fp[df_fp['Category'].str.lower().str.contains(category.lower(), na=False)]['Publication No'].tolist()
-    grant_values = df_grant[df_grant['Category'].str.lower().str.contains(category.lower(), na=False)]['Patent No'].tolist()
+    fp_values = get_category_index(df_fp).column(category, 'Publication No')
+    grant_values = get_category_index(df_grant).column(category, 'Patent No')
 
     values = fp_values + grant_values
 
@@ -207,13 +198,13 @@ def process_category(document, category, df_fp, df_grant):
         num_rows = math.ceil(len(values) / 4)
         value_table = document.add_table(rows=num_rows, cols=4)
         value_table.autofit = True
+        centered_id = document.styles[CELL_CENTERED].style_id
 
-        for idx, value in enumerate(values):
-            row_idx, col_idx = divmod(idx, 4)
-            cell = value_table.rows[row_idx].cells[col_idx]
-            cell.text = str(value)
-            cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
-            apply_font_size(cell)
+        # Read each row's cells once and point the paragraphs at the centered style by ID
+        for row_idx, row in enumerate(value_table.rows):
+            for cell, value in zip(row.cells, values[row_idx * 4:row_idx * 4 + 4]):
+                cell.text = str(value)
+                cell.paragraphs[0]._p.style = centered_id
 
         set_table_borders(value_table)
         set_cell_size_and_alignment(value_table, cell_height=0.28)
@@ -225,15 +216,6 @@ def process_category(document, category, df_fp, df_grant):
     document.add_paragraph()  # Line break after each category
 
 
-def apply_font_size(cell, font_size=10):
-    """Ensure the font size is set correctly inside a table cell."""
-    try:
-        cell.paragraphs[0].runs[0].font.size = Pt(font_size)
-    except IndexError:
-        run = cell.paragraphs[0].add_run()
-        run.font.size = Pt(font_size)
-
-
 # ------------------------------
 # Script Execution
 # ------------------------------
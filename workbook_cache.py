@@ -0,0 +1,150 @@
+import pandas as pd
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# Cache Settings
+# ------------------------------
+
+DEFAULT_CACHE_DIR = os.environ.get('PATENT_WATCH_CACHE_DIR', '.workbook_cache')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # 512 MB across all cached workbooks
+MANIFEST_NAME = 'manifest.json'
+
+
+def cache_disabled():
+    """Return True when the cache is bypassed through the environment."""
+    return os.environ.get('PATENT_WATCH_NO_CACHE', '').lower() in ('1', 'true', 'yes')
+
+
+def workbook_key(excel_path):
+    """Build the cache key from the workbook's content hash and modification time."""
+    digest = hashlib.sha256()
+    with open(excel_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    digest.update(str(os.stat(excel_path).st_mtime_ns).encode())
+    return digest.hexdigest()
+
+
+def _sheet_filename(sheet_name):
+    """Turn a sheet name like 'First Publication' into a safe file stem."""
+    return re.sub(r'[^A-Za-z0-9_-]+', '_', sheet_name)
+
+
+def _dir_size(path):
+    total = 0
+    for entry in os.scandir(path):
+        if entry.is_file():
+            total += entry.stat().st_size
+    return total
+
+
+# ------------------------------
+# Workbook Cache
+# ------------------------------
+
+class WorkbookCache:
+    """On-disk cache of parsed workbook sheets, stored as Feather files with LRU eviction."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _read_manifest(self, key):
+        try:
+            with open(os.path.join(self._entry_dir(key), MANIFEST_NAME), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_manifest(self, key, manifest):
+        path = os.path.join(self._entry_dir(key), MANIFEST_NAME)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def get(self, key, sheet_names):
+        """Return cached sheets for the key, or None unless every requested sheet is cached."""
+        manifest = self._read_manifest(key)
+        if manifest is None or any(sheet not in manifest['sheets'] for sheet in sheet_names):
+            return None
+
+        sheets = {}
+        try:
+            for sheet in sheet_names:
+                info = manifest['sheets'][sheet]
+                path = os.path.join(self._entry_dir(key), info['file'])
+                if info['format'] == 'feather':
+                    sheets[sheet] = pd.read_feather(path)
+                else:
+                    sheets[sheet] = pd.read_pickle(path)
+        except Exception as e:
+            logger.warning(f"Discarding unreadable cache entry {key}: {e}")
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            return None
+
+        manifest['last_used'] = time.time()
+        self._write_manifest(key, manifest)
+        return sheets
+
+    def put(self, key, sheets, source_path=None):
+        """Store parsed sheets under the key, then evict old entries past the size cap."""
+        entry_dir = self._entry_dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+        manifest = self._read_manifest(key) or {'source': source_path, 'sheets': {}}
+
+        for sheet, df in sheets.items():
+            stem = _sheet_filename(sheet)
+            try:
+                # Feather keeps columns in Arrow format so reloading skips Excel parsing entirely
+                filename = stem + '.feather'
+                df.reset_index(drop=True).to_feather(os.path.join(entry_dir, filename))
+                file_format = 'feather'
+            except Exception as e:
+                # Mixed-type object columns (or a missing pyarrow) fall back to pickle
+                logger.debug(f"Feather unavailable for sheet '{sheet}', using pickle: {e}")
+                filename = stem + '.pkl'
+                df.to_pickle(os.path.join(entry_dir, filename))
+                file_format = 'pickle'
+            manifest['sheets'][sheet] = {'file': filename, 'format': file_format}
+
+        manifest['last_used'] = time.time()
+        self._write_manifest(key, manifest)
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        if not os.path.isdir(self.cache_dir):
+            return
+
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_dir():
+                continue
+            manifest = self._read_manifest(entry.name) or {}
+            entries.append((manifest.get('last_used', 0), entry.name, _dir_size(entry.path)))
+
+        total = sum(size for _, _, size in entries)
+        for _, key, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            total -= size
+            logger.info(f"Evicted cached workbook {key[:12]} ({size} bytes)")
+
+    def clear(self):
+        """Remove every cached workbook."""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
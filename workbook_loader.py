@@ -0,0 +1,66 @@
+import os
+import pandas as pd
+import logging
+from instrumentation import span
+from memory_budget import check_memory
+from workbook_cache import WorkbookCache, cache_disabled, workbook_key
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# Workbook Sheets
+# ------------------------------
+
+# Every sheet the report generators read from the patent watch workbook
+SHEET_NAMES = ['FP', 'Grant', 'First Publication', 'Granted', 'Sheet1']
+
+
+def clean_sheet(df):
+    """Strip column names and normalize the 'Category' column once."""
+    df.columns = df.columns.str.strip()
+    if 'Category' in df.columns:
+        df['Category'] = df['Category'].fillna('').astype(str).str.strip()
+    return df
+
+
+def parse_workbook(excel_path, sheet_names):
+    """Open the workbook once and parse the requested sheets in a single pass."""
+    with span("parse Excel", bytes=os.path.getsize(excel_path)) as timing, pd.ExcelFile(excel_path) as xl:
+        missing_sheets = [sheet for sheet in sheet_names if sheet not in xl.sheet_names]
+        if missing_sheets:
+            raise ValueError(f"Missing required sheets: {', '.join(missing_sheets)}")
+
+        sheets = {sheet: clean_sheet(xl.parse(sheet)) for sheet in sheet_names}
+        timing.add(sheets=len(sheets), rows=sum(len(df) for df in sheets.values()))
+        return sheets
+
+
+def load_workbook(excel_path, sheet_names=None, use_cache=True, cache=None):
+    """
+    Return a dict of sheet name -> cleaned DataFrame, shared by every section builder.
+    Parsed sheets are cached on disk by workbook hash; pass use_cache=False to bypass it.
+    """
+    sheet_names = list(sheet_names or SHEET_NAMES)
+    with span("load workbook"):
+        sheets = _load_workbook(excel_path, sheet_names, use_cache, cache)
+    check_memory("load workbook")
+    return sheets
+
+
+def _load_workbook(excel_path, sheet_names, use_cache, cache):
+    if not use_cache or cache_disabled():
+        sheets = parse_workbook(excel_path, sheet_names)
+        logger.info(f"Loaded {len(sheets)} sheets from {excel_path}")
+        return sheets
+
+    cache = cache or WorkbookCache()
+    key = workbook_key(excel_path)
+    sheets = cache.get(key, sheet_names)
+    if sheets is not None:
+        logger.info(f"Loaded {len(sheets)} sheets from cache for {excel_path}")
+        return sheets
+
+    sheets = parse_workbook(excel_path, sheet_names)
+    cache.put(key, sheets, source_path=str(excel_path))
+    logger.info(f"Loaded {len(sheets)} sheets from {excel_path} (cached)")
+    return sheets